@@ -0,0 +1,88 @@
+import base64
+import datetime
+import json
+from typing import Dict, List, Optional, Tuple
+
+from flask import request
+from sqlalchemy import and_, func, or_, select
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class PageRequestError(ValueError):
+    """Bad sort, order, limit or cursor parameter."""
+
+
+def encode_cursor(sort_value, last_id: int) -> str:
+    if isinstance(sort_value, datetime.datetime):
+        sort_value = {'dt': sort_value.isoformat()}
+    payload = json.dumps([sort_value, last_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[object, int]:
+    try:
+        sort_value, last_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if isinstance(sort_value, dict):
+            sort_value = datetime.datetime.fromisoformat(sort_value['dt'])
+        return sort_value, int(last_id)
+    except (ValueError, TypeError, KeyError):
+        raise PageRequestError('Invalid cursor')
+
+
+def page_args(sort_columns: Dict[str, object], default_sort: str) -> dict:
+    """Read sort, order, cursor and limit from the query string, validating against sort_columns."""
+    sort = request.args.get('sort', default_sort)
+    if sort not in sort_columns:
+        raise PageRequestError(f"sort must be one of: {', '.join(sort_columns)}")
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise PageRequestError('order must be asc or desc')
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return {
+        'sort': sort,
+        'sort_column': sort_columns[sort],
+        'descending': order == 'desc',
+        'cursor': request.args.get('cursor') or None,
+        'limit': max(1, min(limit, MAX_PAGE_SIZE)),
+    }
+
+
+def keyset_page(query, sort_column, id_column, descending: bool = True, cursor: Optional[str] = None,
+                limit: int = DEFAULT_PAGE_SIZE) -> Tuple[List, Optional[str]]:
+    """
+    One page of `query` ordered by (sort_column, id_column), starting after `cursor`.
+    Seeks past the previous page's last key instead of using OFFSET, so with an index on
+    (sort_column, id) every page costs the same however deep it is. Returns (rows, next_cursor).
+    """
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        after = (lambda col, value: col < value) if descending else (lambda col, value: col > value)
+        if sort_column is id_column:
+            query = query.filter(after(id_column, last_id))
+        else:
+            # Seek from the last row's stored sort value, not the decoded one: a bound datetime is
+            # not always formatted like the stored value (SQLite's CURRENT_TIMESTAMP has no
+            # fraction), and then the equality branch misses and the last row comes back again.
+            # The decoded value is only used if that row has since been deleted.
+            stored = select(sort_column).where(id_column == last_id).correlate(None).scalar_subquery()
+            sort_value = func.coalesce(stored, sort_value)
+            query = query.filter(or_(after(sort_column, sort_value),
+                                     and_(sort_column == sort_value, after(id_column, last_id))))
+
+    if sort_column is id_column:
+        ordering = [id_column.desc() if descending else id_column.asc()]
+    elif descending:
+        ordering = [sort_column.desc(), id_column.desc()]
+    else:
+        ordering = [sort_column.asc(), id_column.asc()]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), last.id)
+    return rows, next_cursor
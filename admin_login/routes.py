@@ -1,9 +1,117 @@
-from flask import Blueprint, render_template, url_for, redirect, flash
-from models import User, FarmProfile, Recommendation
+import datetime
+
+from flask import Blueprint, Response, render_template, url_for, redirect, flash, request, jsonify, stream_with_context
+from models import db, User, FarmProfile, Recommendation
 from flask_login import login_required, current_user
+from farm.batch import get_batch_runner
+from farm.bulk_import import DUPLICATE_RADIUS_M, describe_issue, import_farms, import_format, read_farm_rows
+from query_profiles import ADMIN_FARM_LIST, ADMIN_RECOMMENDATION_LIST
+from services.export import EXPORT_MEDIA_TYPES, export_stream
+from services.rollups import ROLLUP_PRECISION, query_rollups
+from services.spatial import farm_cells, farms_by_climate_cell, farms_in_bbox, farms_within, nearest_farms
+from .pagination import PageRequestError, keyset_page, page_args
 
 admin_bp = Blueprint('admin_login', __name__, url_prefix='/admin')
 
+USER_SORTS = {'id': User.id, 'username': User.username}
+FARM_SORTS = {'created_at': FarmProfile.created_at, 'id': FarmProfile.id}
+RECOMMENDATION_SORTS = {'created_at': Recommendation.created_at, 'id': Recommendation.id}
+
+
+def _user_query():
+    query = User.query
+    q = request.args.get('q', '').strip()
+    if q:
+        # prefix match so the unique username/email indexes can serve it
+        # autoescape: % and _ in the search text match literally rather than as LIKE wildcards
+        query = query.filter(User.username.startswith(q, autoescape=True) | User.email.startswith(q, autoescape=True))
+    role = request.args.get('role')
+    if role in ('admin', 'user'):
+        query = query.filter(User.is_admin.is_(role == 'admin'))
+    return query
+
+
+def _farm_query():
+    query = FarmProfile.query.options(*ADMIN_FARM_LIST)
+    q = request.args.get('q', '').strip()
+    if q:
+        query = query.filter(FarmProfile.location_name.startswith(q, autoescape=True))
+    soil_type = request.args.get('soil_type', '').strip()
+    if soil_type:
+        query = query.filter(FarmProfile.soil_type == soil_type)
+    user_id = request.args.get('user_id', type=int)
+    if user_id:
+        query = query.filter(FarmProfile.user_id == user_id)
+    return query
+
+
+def _recommendation_query():
+    query = Recommendation.query.options(*ADMIN_RECOMMENDATION_LIST)
+    if not request.args.get('history', type=int):
+        query = query.filter(Recommendation.is_current)
+    crop = request.args.get('crop', '').strip()
+    if crop:
+        query = query.filter(Recommendation.crop_name == crop)
+    soil_type = request.args.get('soil_type', '').strip()
+    if soil_type:
+        query = query.filter(Recommendation.soil_type == soil_type)
+    min_score = request.args.get('min_score', type=float)
+    if min_score is not None:
+        query = query.filter(Recommendation.ai_score >= min_score)
+    farm_id = request.args.get('farm_id', type=int)
+    if farm_id:
+        query = query.filter(Recommendation.farm_id == farm_id)
+    user_id = request.args.get('user_id', type=int)
+    if user_id:
+        query = query.filter(Recommendation.farm.has(FarmProfile.user_id == user_id))
+    return query
+
+
+def _user_json(u):
+    return {'id': u.id, 'username': u.username, 'email': u.email, 'is_admin': bool(u.is_admin)}
+
+
+def _farm_json(f):
+    return {
+        'id': f.id,
+        'owner': {'id': f.owner.id, 'username': f.owner.username, 'email': f.owner.email},
+        'location_name': f.location_name,
+        'soil_type': f.soil_type,
+        'latitude': f.latitude,
+        'longitude': f.longitude,
+        'created_at': f.created_at.isoformat() if f.created_at else None,
+    }
+
+
+def _recommendation_json(r):
+    return {
+        'id': r.id,
+        'farm_id': r.farm_id,
+        'owner': r.farm.owner.username,
+        'crop_name': r.crop_name,
+        'soil_type': r.soil_type,
+        'ai_score': r.ai_score,
+        'market_demand_score': r.market_demand_score,
+        'profitability_estimate': r.profitability_estimate,
+        'created_at': r.created_at.isoformat() if r.created_at else None,
+    }
+
+
+def _page(query, sorts, default_sort, id_column):
+    args = page_args(sorts, default_sort)
+    return keyset_page(query, args['sort_column'], id_column, args['descending'], args['cursor'], args['limit'])
+
+
+def _json_page(query, sorts, default_sort, id_column, serialize):
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    try:
+        rows, next_cursor = _page(query(), sorts, default_sort, id_column)
+    except PageRequestError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': [serialize(row) for row in rows], 'next_cursor': next_cursor})
+
+
 @admin_bp.route('/users')
 @login_required
 def users():
@@ -11,8 +119,8 @@ def users():
         flash('Admin access required', 'danger')
         return redirect(url_for('home'))
     try:
-        users = User.query.order_by(User.id.desc()).all()
-        return render_template('admin_login/users.html', users=users)
+        users, next_cursor = _page(_user_query(), USER_SORTS, 'id', User.id)
+        return render_template('admin_login/users.html', users=users, next_cursor=next_cursor)
     except Exception as e:
         flash(f'Error loading users: {str(e)}', 'danger')
         return redirect(url_for('home'))
@@ -25,13 +133,43 @@ def farms():
         flash('Admin access required', 'danger')
         return redirect(url_for('home'))
     try:
-        farms = FarmProfile.query.order_by(FarmProfile.created_at.desc()).all()
-        return render_template('admin_login/farms.html', farms=farms)
+        farms, next_cursor = _page(_farm_query(), FARM_SORTS, 'created_at', FarmProfile.id)
+        return render_template('admin_login/farms.html', farms=farms, next_cursor=next_cursor)
     except Exception as e:
         flash(f'Error loading farms: {str(e)}', 'danger')
         return redirect(url_for('home'))
 
 
+@admin_bp.route('/farms/import', methods=['POST'])
+@login_required
+def import_farms_upload():
+    """Import farms for one owner from an uploaded CSV or GeoJSON file, optionally queueing recommendations."""
+    if not current_user.is_admin:
+        flash('Admin access required', 'danger')
+        return redirect(url_for('home'))
+    upload = request.files.get('file')
+    owner = db.session.get(User, request.form.get('user_id', type=int) or 0)
+    if upload is None or not upload.filename or owner is None:
+        flash('Choose a CSV or GeoJSON file and an existing owner user id.', 'warning')
+        return redirect(url_for('admin_login.farms'))
+    try:
+        stats = import_farms(read_farm_rows(upload.stream, import_format(upload.filename)), owner.id,
+                             duplicate_radius_m=request.form.get('duplicate_radius_m', DUPLICATE_RADIUS_M, type=float))
+    except ValueError as e:
+        flash(f'Import failed: {str(e)}', 'danger')
+        return redirect(url_for('admin_login.farms'))
+    problems = '; '.join(describe_issue(issue) for issue in stats['issues'][:5])
+    flash(f"Imported {stats['imported']} of {stats['rows']} farms for {owner.username} "
+          f"({stats['invalid']} invalid, {stats['duplicates']} duplicates, {stats['rows_per_s']} rows/s)."
+          + (f' {problems}' if problems else ''), 'success' if stats['imported'] else 'warning')
+    if request.form.get('generate') and stats['farm_ids']:
+        if get_batch_runner().start(farm_ids=stats['farm_ids']):
+            flash('Recommendation refresh started for the imported farms.', 'success')
+        else:
+            flash('A batch recommendation refresh is already running; refresh the imported farms later.', 'warning')
+    return redirect(url_for('admin_login.farms'))
+
+
 @admin_bp.route('/recommendations')
 @login_required
 def recommendations():
@@ -39,8 +177,165 @@ def recommendations():
         flash('Admin access required', 'danger')
         return redirect(url_for('home'))
     try:
-        recs = Recommendation.query.order_by(Recommendation.created_at.desc()).limit(200).all()
-        return render_template('admin_login/recommendations.html', recs=recs)
+        recs, next_cursor = _page(_recommendation_query(), RECOMMENDATION_SORTS, 'created_at', Recommendation.id)
+        return render_template('admin_login/recommendations.html', recs=recs, next_cursor=next_cursor)
     except Exception as e:
         flash(f'Error loading recommendations: {str(e)}', 'danger')
         return redirect(url_for('home'))
+
+
+@admin_bp.route('/recommendations/refresh', methods=['POST'])
+@login_required
+def refresh_recommendations():
+    if not current_user.is_admin:
+        flash('Admin access required', 'danger')
+        return redirect(url_for('home'))
+    soil_type = request.form.get('soil_type', '').strip() or None
+    user_id = request.form.get('user_id', type=int)
+    if get_batch_runner().start(soil_type=soil_type, user_id=user_id):
+        flash('Batch recommendation refresh started.', 'success')
+    else:
+        flash('A batch recommendation refresh is already running.', 'warning')
+    return redirect(url_for('admin_login.recommendations'))
+
+
+@admin_bp.route('/recommendations/refresh/status')
+@login_required
+def refresh_recommendations_status():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    return jsonify(get_batch_runner().status)
+
+
+@admin_bp.route('/api/users')
+@login_required
+def users_api():
+    return _json_page(_user_query, USER_SORTS, 'id', User.id, _user_json)
+
+
+@admin_bp.route('/api/farms')
+@login_required
+def farms_api():
+    return _json_page(_farm_query, FARM_SORTS, 'created_at', FarmProfile.id, _farm_json)
+
+
+@admin_bp.route('/api/recommendations')
+@login_required
+def recommendations_api():
+    return _json_page(_recommendation_query, RECOMMENDATION_SORTS, 'created_at', Recommendation.id,
+                      _recommendation_json)
+
+
+MAX_SPATIAL_RESULTS = 5000
+
+
+def _coordinate_args(*names):
+    """Required float query parameters, in order; raises ValueError naming a missing one."""
+    values = [request.args.get(name, type=float) for name in names]
+    missing = [name for name, value in zip(names, values) if value is None]
+    if missing:
+        raise ValueError(f"missing or invalid: {', '.join(missing)}")
+    return values
+
+
+def _optional_bbox():
+    if 'min_lat' not in request.args:
+        return None
+    return tuple(_coordinate_args('min_lat', 'min_lon', 'max_lat', 'max_lon'))
+
+
+@admin_bp.route('/api/farms/near')
+@login_required
+def farms_near_api():
+    """Farms within radius_km of lat/lon, or the k nearest when no radius is given, nearest first."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    limit = max(1, min(request.args.get('limit', 100, type=int), MAX_SPATIAL_RESULTS))
+    query = FarmProfile.query.options(*ADMIN_FARM_LIST)
+    try:
+        lat, lon = _coordinate_args('lat', 'lon')
+        radius_km = request.args.get('radius_km', type=float)
+        if radius_km is None:
+            hits = nearest_farms(lat, lon, k=min(request.args.get('k', 10, type=int), limit), query=query)
+        else:
+            hits = farms_within(lat, lon, radius_km, query=query, limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': [dict(_farm_json(farm), distance_km=round(distance, 3)) for farm, distance in hits]})
+
+
+@admin_bp.route('/api/farms/bbox')
+@login_required
+def farms_bbox_api():
+    """Farms inside a bounding box (min_lat, min_lon, max_lat, max_lon), by id."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    limit = max(1, min(request.args.get('limit', 1000, type=int), MAX_SPATIAL_RESULTS))
+    try:
+        farms = farms_in_bbox(*_coordinate_args('min_lat', 'min_lon', 'max_lat', 'max_lon'),
+                              query=FarmProfile.query.options(*ADMIN_FARM_LIST), limit=limit + 1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': [_farm_json(farm) for farm in farms[:limit]], 'truncated': len(farms) > limit})
+
+
+@admin_bp.route('/api/farms/cells')
+@login_required
+def farm_cells_api():
+    """
+    Farm counts per cell for map clustering: by=geohash (default, &precision=1-9) or
+    by=climate (NASA POWER cells, with member farm ids). Optional bounding box filter.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    try:
+        bbox = _optional_bbox()
+        if request.args.get('by', 'geohash') == 'climate':
+            cells = farms_by_climate_cell(bbox)
+        else:
+            cells = farm_cells(request.args.get('precision', 5, type=int), bbox)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'cells': cells})
+
+
+@admin_bp.route('/api/rollups')
+@login_required
+def rollups_api():
+    """
+    Regional aggregates of current recommendations from the rollup table, e.g.
+    ?group_by=region,soil_type&region_precision=3 or ?group_by=region,crop_name&month_from=2025-01.
+    Filters: region (geohash prefix), soil_type, crop_name, month_from, month_to (YYYY-MM).
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    group_by = [dimension for dimension in request.args.get('group_by', 'region,soil_type').split(',') if dimension]
+    filters = {name: request.args[name] for name in ('region', 'soil_type', 'crop_name') if request.args.get(name)}
+    try:
+        rows = query_rollups(group_by, request.args.get('region_precision', ROLLUP_PRECISION, type=int),
+                             request.args.get('month_from'), request.args.get('month_to'), filters,
+                             limit=max(1, min(request.args.get('limit', 1000, type=int), MAX_SPATIAL_RESULTS)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'group_by': group_by, 'rows': rows})
+
+
+@admin_bp.route('/api/export/<dataset>')
+@login_required
+def export_api(dataset):
+    """
+    Stream a whole dataset (farms, recommendations or market) as ?format=csv (default),
+    ndjson or parquet. Other query parameters filter it, e.g.
+    /admin/api/export/recommendations?format=ndjson&soil_type=Loam&history=1.
+    """
+    if not current_user.is_admin:
+        return jsonify({'error': 'Admin access required'}), 403
+    fmt = request.args.get('format', 'csv')
+    filters = {name: value for name, value in request.args.items() if name != 'format'}
+    try:
+        chunks = export_stream(dataset, fmt, filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    filename = f"{dataset}-{datetime.date.today().isoformat()}.{fmt}"
+    return Response(stream_with_context(chunks), mimetype=EXPORT_MEDIA_TYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
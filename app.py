@@ -6,6 +6,11 @@ from models import db, User
 from auth import auth_bp
 from admin_login.routes import admin_bp
 from farm import farm_bp
+from farm.jobs import init_job_queue
+from farm.batch import init_batch_runner
+from farm.page_cache import init_page_cache
+from cli import register_commands
+from services.market import configure_market_provider
 from flask_login import LoginManager, login_required
 
 load_dotenv()
@@ -37,6 +42,12 @@ def create_app():
     def load_user(user_id):
         return db.session.get(User, int(user_id))
 
+    configure_market_provider(app)
+    init_job_queue(app)
+    init_batch_runner(app)
+    init_page_cache(app)
+    register_commands(app)
+
     # register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
@@ -0,0 +1,111 @@
+"""
+Bulk farm import benchmark: writes a synthetic farms CSV (2% near-duplicates of earlier rows,
+1% unknown soil types), imports it into a scratch SQLite database with and without the
+duplicate check, and compares the duplicates found with an independent grid search.
+
+    python bench_import.py                  # 100k rows
+    python bench_import.py --rows 20000 --seed 7
+"""
+import argparse
+import csv
+import math
+import os
+import random
+import resource
+import tempfile
+import time
+
+from farm.bulk_import import DUPLICATE_RADIUS_M, import_farms, read_farm_rows, validate_farm_row
+
+SOILS = ('Loam', 'Clay', 'Sandy', 'Silty', 'Peaty', 'Chalky')
+DUPLICATE_SHARE = 0.02
+BAD_SOIL_SHARE = 0.01
+
+
+def write_farms_csv(path: str, rows: int, seed: int) -> None:
+    """Farms spread over India; a near-duplicate lies within 25 m of an earlier row."""
+    rng = random.Random(seed)
+    points = []
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['latitude', 'longitude', 'soil_type', 'location_name'])
+        for i in range(rows):
+            if points and rng.random() < DUPLICATE_SHARE:
+                lat, lon = rng.choice(points)
+                lat, lon = lat + rng.uniform(-0.0002, 0.0002), lon + rng.uniform(-0.0002, 0.0002)
+            else:
+                lat, lon = rng.uniform(8.0, 35.0), rng.uniform(68.0, 97.0)
+                points.append((lat, lon))
+            soil = 'Gravel' if rng.random() < BAD_SOIL_SHARE else rng.choice(SOILS)
+            writer.writerow([f'{lat:.6f}', f'{lon:.6f}', soil, f'Farm {i}'])
+
+
+def _distance_m(lat1, lon1, lat2, lon2) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371008.8 * math.asin(math.sqrt(a))
+
+
+def count_duplicates(path: str, radius_m: float = DUPLICATE_RADIUS_M) -> int:
+    """Valid rows within radius_m of an earlier accepted row, found on a plain lat/lon grid."""
+    cell = 0.001  # degrees; wider than the radius at these latitudes, so neighbours are enough
+    grid = {}
+    duplicates = 0
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            values, error = validate_farm_row(row)
+            if error:
+                continue
+            lat, lon = values['latitude'], values['longitude']
+            i, j = int(lat // cell), int(lon // cell)
+            near = (point for di in (-1, 0, 1) for dj in (-1, 0, 1) for point in grid.get((i + di, j + dj), ()))
+            if any(_distance_m(lat, lon, *point) <= radius_m for point in near):
+                duplicates += 1
+            else:
+                grid.setdefault((i, j), []).append((lat, lon))
+    return duplicates
+
+
+def run_import(path: str, workdir: str, duplicate_radius_m: float) -> dict:
+    """Import the file into a fresh database, as a fresh user."""
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, f'bench-{duplicate_radius_m:g}.db')}"
+    from app import create_app
+    from models import db, User
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@example.com')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+        with open(path, 'rb') as f:
+            return import_farms(read_farm_rows(f, 'csv'), user.id, duplicate_radius_m=duplicate_radius_m)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'farms.csv')
+        write_farms_csv(path, args.rows, args.seed)
+        for radius in (DUPLICATE_RADIUS_M, 0.0):
+            started = time.perf_counter()
+            stats = run_import(path, workdir, radius)
+            elapsed = time.perf_counter() - started
+            label = f'de-duplicated within {radius:g} m' if radius else 'no duplicate check'
+            print(f"{label}: {stats['rows']} rows in {elapsed:.1f}s ({stats['rows'] / elapsed:,.0f} rows/s), "
+                  f"{stats['imported']} imported, {stats['invalid']} invalid, {stats['duplicates']} duplicates")
+            if radius:
+                expected = count_duplicates(path, radius)
+                print(f"  independent grid check: {expected} duplicates "
+                      f"({'match' if expected == stats['duplicates'] else 'MISMATCH'})")
+    # ru_maxrss is in kilobytes on Linux
+    print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import click
+from flask.cli import with_appcontext
+
+from farm.batch import refresh_recommendations
+from farm.bulk_import import (DUPLICATE_RADIUS_M, IMPORT_BATCH_SIZE, IMPORT_FORMATS, describe_issue, import_farms,
+                              import_format, read_farm_rows)
+from farm.context import MARKET_CROPS
+from farm.generation import HISTORY_KEEP_DAYS, HISTORY_KEEP_RUNS, prune_recommendation_history
+from migrations import apply_migrations, pending_migrations
+from models import db, User
+from services.export import EXPORT_DATASETS, EXPORT_FORMATS, export_stream
+from services.rollups import rebuild_rollups
+from services.market import DEFAULT_MARKET_REGION, load_market_prices_csv, refresh_market_store
+
+
+def _refresh_progress(stats):
+    click.echo(f"{stats['processed']}/{stats['farms']} farms ({stats['unchanged']} unchanged), "
+               f"{stats['cells']} climate cells, {stats['recommendations']} recommendations, "
+               f"{stats['elapsed_s']}s ({stats['farms_per_s']} farms/s)")
+
+
+@click.command('refresh-recommendations')
+@click.option('--soil-type', help='Only farms with this soil type.')
+@click.option('--user-id', type=int, help='Only farms owned by this user.')
+@click.option('--farm-id', 'farm_ids', type=int, multiple=True, help='Only these farms (repeatable).')
+@click.option('--processes', type=int, default=None, help='Scoring processes (default: CPU count, 0 = inline).')
+@click.option('--force', is_flag=True, help='Regenerate farms whose inputs are unchanged since their last run.')
+@with_appcontext
+def refresh_recommendations_command(soil_type, user_id, farm_ids, processes, force):
+    """Recompute recommendations for all (or filtered) farms."""
+    stats = refresh_recommendations(soil_type=soil_type, user_id=user_id, farm_ids=list(farm_ids) or None,
+                                    processes=processes, progress=_refresh_progress, force=force)
+    click.echo(f"Done: refreshed {stats['processed']} farms in {stats['elapsed_s']}s")
+
+
+@click.command('prune-recommendation-history')
+@click.option('--keep-runs', type=int, default=HISTORY_KEEP_RUNS, show_default=True,
+              help='Newest runs kept per farm.')
+@click.option('--keep-days', type=int, default=HISTORY_KEEP_DAYS, show_default=True,
+              help='Beyond those, keep the last run of each month for this many days.')
+@with_appcontext
+def prune_recommendation_history_command(keep_runs, keep_days):
+    """Compact old recommendation runs for every farm."""
+    deleted = prune_recommendation_history(keep_runs=keep_runs, keep_days=keep_days)
+    click.echo(f"Deleted {deleted} recommendation runs")
+
+
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups_command():
+    """Recompute the regional recommendation rollups from current recommendations."""
+    keys = rebuild_rollups(db.session.connection())
+    db.session.commit()
+    click.echo(f"Rebuilt {keys} rollup rows")
+
+
+@click.command('import-farms')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user-id', type=int, required=True, help='Owner of the imported farms.')
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), help='Default: from the file extension.')
+@click.option('--batch-size', type=int, default=IMPORT_BATCH_SIZE, show_default=True,
+              help='Farms inserted per transaction.')
+@click.option('--duplicate-radius-m', type=float, default=DUPLICATE_RADIUS_M, show_default=True,
+              help='Skip farms this close to an existing one (0 to import everything).')
+@click.option('--generate', is_flag=True, help='Compute recommendations for the imported farms afterwards.')
+@click.option('--processes', type=int, default=None, help='Scoring processes for --generate.')
+@with_appcontext
+def import_farms_command(path, user_id, fmt, batch_size, duplicate_radius_m, generate, processes):
+    """Bulk-import farm profiles from a CSV or GeoJSON file."""
+    if db.session.get(User, user_id) is None:
+        raise click.BadParameter(f'no user with id {user_id}', param_hint='--user-id')
+    try:
+        fmt = fmt or import_format(path)
+    except ValueError as e:
+        raise click.UsageError(str(e))
+
+    def progress(stats):
+        click.echo(f"{stats['rows']} rows: {stats['imported']} imported, {stats['invalid']} invalid, "
+                   f"{stats['duplicates']} duplicates, {stats['elapsed_s']}s ({stats['rows_per_s']} rows/s)")
+
+    with open(path, 'rb') as f:
+        try:
+            stats = import_farms(read_farm_rows(f, fmt), user_id, batch_size, duplicate_radius_m, progress)
+        except ValueError as e:  # malformed GeoJSON document
+            raise click.UsageError(str(e))
+    for issue in stats['issues']:
+        click.echo(describe_issue(issue), err=True)
+    click.echo(f"Done: imported {stats['imported']} of {stats['rows']} rows in {stats['elapsed_s']}s "
+               f"({stats['rows_per_s']} rows/s)")
+    if generate and stats['farm_ids']:
+        refresh_recommendations(farm_ids=stats['farm_ids'], processes=processes, progress=_refresh_progress)
+
+
+@click.command('export')
+@click.argument('dataset', type=click.Choice(list(EXPORT_DATASETS)))
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='csv', show_default=True)
+@click.option('--output', '-o', default='-', show_default=True, help='File to write, - for stdout.')
+@click.option('--filter', 'filters', multiple=True, metavar='NAME=VALUE',
+              help='Filter rows, e.g. soil_type=Loam or since=2025-01-01 (repeatable).')
+@with_appcontext
+def export_command(dataset, fmt, output, filters):
+    """Stream farms, recommendations or market stats to CSV, NDJSON or Parquet."""
+    pairs = [f.split('=', 1) for f in filters]
+    if any(len(pair) != 2 for pair in pairs):
+        raise click.BadParameter('expected NAME=VALUE', param_hint='--filter')
+    try:
+        chunks = export_stream(dataset, fmt, dict(pairs))
+    except ValueError as e:
+        raise click.UsageError(str(e))
+    written = 0
+    with click.open_file(output, 'wb') as out:
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+    if output != '-':
+        click.echo(f"Wrote {written} bytes of {dataset} to {output}")
+
+
+@click.command('load-market-prices')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--region', default=DEFAULT_MARKET_REGION, show_default=True,
+              help='Region for rows without a region column.')
+@with_appcontext
+def load_market_prices_command(path, region):
+    """Load daily crop prices from a CSV (crop, date, price[, region])."""
+    count = load_market_prices_csv(path, default_region=region)
+    click.echo(f"Loaded {count} market prices from {path}")
+
+
+@click.command('refresh-market')
+@click.option('--region', default=DEFAULT_MARKET_REGION, show_default=True)
+@with_appcontext
+def refresh_market_command(region):
+    """Pull today's prices from the market provider and precompute stats (run daily)."""
+    added = refresh_market_store(MARKET_CROPS, region)
+    click.echo(f"Computed market stats for {added} crops in {region}")
+
+
+@click.command('db-upgrade')
+@click.option('--dry-run', is_flag=True, help='List pending migrations without applying them.')
+@with_appcontext
+def db_upgrade_command(dry_run):
+    """Apply pending schema migrations to an existing database."""
+    if dry_run:
+        for version, description, _ in pending_migrations():
+            click.echo(f"{version}  {description}")
+        return
+    applied = apply_migrations()
+    click.echo(f"Applied {len(applied)} migration(s)" + (f": {', '.join(applied)}" if applied else ''))
+
+
+def register_commands(app):
+    app.cli.add_command(refresh_recommendations_command)
+    app.cli.add_command(prune_recommendation_history_command)
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(import_farms_command)
+    app.cli.add_command(load_market_prices_command)
+    app.cli.add_command(refresh_market_command)
+    app.cli.add_command(db_upgrade_command)
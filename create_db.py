@@ -1,11 +1,15 @@
 from app import create_app
 from models import db, User
+from migrations import apply_migrations
 from werkzeug.security import generate_password_hash
 
 app = create_app()
 
 with app.app_context():
     db.create_all()
+    # create_all skips tables that already exist; bring them up to date
+    for version in apply_migrations():
+        print(f"Applied migration {version}")
     if not User.query.filter_by(username='admin').first():
         admin = User(username='admin', email='admin@example.com', is_admin=True)
         admin.password_hash = generate_password_hash('adminpass')
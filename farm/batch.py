@@ -0,0 +1,198 @@
+import datetime
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+from flask import current_app
+
+from models import db, FarmProfile
+from services.climate import (CLIMATE_WINDOW_DAYS, climate_cell_key, fetch_climate_window,
+                              summarize_climate_for_agriculture)
+from services.market import fetch_market_prices
+from .context import MARKET_CROPS
+from .generation import (FarmRun, build_recommendation_runs, current_inputs_hashes, inputs_hash,
+                         market_fingerprint, store_recommendation_runs)
+
+
+BATCH_CHUNK_SIZE = 500  # farms scored and written per transaction
+FARM_ID_CHUNK_SIZE = 10000  # ids per IN (...) when refreshing listed farms
+CLIMATE_FETCH_THREADS = 8
+
+# Worker-process state, set once per process by _init_worker
+_worker_market: Dict = {}
+
+
+def _init_worker(market: dict) -> None:
+    global _worker_market
+    _worker_market = market
+
+
+def _score_farms(farms: List[tuple]) -> List[FarmRun]:
+    return build_recommendation_runs(farms, _worker_market)
+
+
+def _cell_climate_summary(app, latitude: float, longitude: float) -> Optional[dict]:
+    end = datetime.date.today()
+    start = end - datetime.timedelta(days=CLIMATE_WINDOW_DAYS)
+    with app.app_context():
+        try:
+            return summarize_climate_for_agriculture(fetch_climate_window(latitude, longitude, start, end))
+        except Exception as e:
+            db.session.rollback()
+            logging.warning(f"Climate data unavailable for cell {climate_cell_key(latitude, longitude)}: {str(e)}")
+            return None
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _changed(chunk: List[tuple], market_digest: str) -> List[tuple]:
+    """The farms of a chunk whose inputs differ from their latest run."""
+    current = current_inputs_hashes(farm[0] for farm in chunk)
+    return [farm for farm in chunk
+            if current.get(farm[0]) != inputs_hash(farm[1], farm[2], farm[3], farm[4], market_digest)]
+
+
+def refresh_recommendations(soil_type: Optional[str] = None, user_id: Optional[int] = None,
+                            farm_ids: Optional[List[int]] = None, processes: Optional[int] = None,
+                            progress: Optional[Callable[[dict], None]] = None, force: bool = False) -> dict:
+    """
+    Recompute recommendations for every farm matching the filters.
+    Climate is fetched once per grid cell, market data once per run, each chunk is scored as
+    (farms x crops) matrices spread over a process pool (processes=0 scores inline) and rows
+    are bulk-inserted per chunk. Farms whose inputs match their latest run are skipped
+    unless force is set.
+    Must run inside an app context; returns run statistics.
+    """
+    app = current_app._get_current_object()
+    started = time.monotonic()
+
+    query = FarmProfile.query.with_entities(FarmProfile.id, FarmProfile.soil_type,
+                                            FarmProfile.latitude, FarmProfile.longitude)
+    if soil_type:
+        query = query.filter(FarmProfile.soil_type == soil_type)
+    if user_id:
+        query = query.filter(FarmProfile.user_id == user_id)
+    if farm_ids:
+        # chunked so imports of many thousands of farms stay under the driver's bind-parameter limit
+        farms = [farm for ids in _chunks(sorted(set(farm_ids)), FARM_ID_CHUNK_SIZE)
+                 for farm in query.filter(FarmProfile.id.in_(ids)).order_by(FarmProfile.id)]
+    else:
+        farms = query.order_by(FarmProfile.id).all()
+
+    stats = {'farms': len(farms), 'cells': 0, 'processed': 0, 'unchanged': 0, 'recommendations': 0,
+             'elapsed_s': 0.0, 'farms_per_s': 0.0}
+
+    def report():
+        stats['elapsed_s'] = round(time.monotonic() - started, 2)
+        stats['farms_per_s'] = round(stats['processed'] / stats['elapsed_s'], 1) if stats['elapsed_s'] else 0.0
+        if progress:
+            progress(dict(stats))
+
+    if not farms:
+        report()
+        return stats
+
+    # One climate fetch per grid cell, shared by every farm inside it
+    cells = defaultdict(list)
+    for farm in farms:
+        cells[climate_cell_key(farm.latitude, farm.longitude)].append(farm)
+    stats['cells'] = len(cells)
+    with ThreadPoolExecutor(max_workers=CLIMATE_FETCH_THREADS) as pool:
+        futures = {key: pool.submit(_cell_climate_summary, app, members[0].latitude, members[0].longitude)
+                   for key, members in cells.items()}
+        climate_by_cell = {key: future.result() for key, future in futures.items()}
+    report()
+
+    try:
+        market = fetch_market_prices(MARKET_CROPS)
+    except Exception as e:
+        logging.warning(f"Market data unavailable for batch refresh: {str(e)}")
+        market = {}
+
+    work = [(farm.id, farm.soil_type, farm.latitude, farm.longitude,
+             climate_by_cell[climate_cell_key(farm.latitude, farm.longitude)]) for farm in farms]
+    processes = os.cpu_count() if processes is None else processes
+    market_digest = market_fingerprint(market)
+
+    def changed(chunk: List[tuple]) -> List[tuple]:
+        if force:
+            return chunk
+        farms_to_score = _changed(chunk, market_digest)
+        stats['unchanged'] += len(chunk) - len(farms_to_score)
+        return farms_to_score
+
+    def write(chunk_farms: List[tuple], chunk_runs: List[FarmRun]) -> None:
+        stats['recommendations'] += store_recommendation_runs(chunk_runs)
+        stats['processed'] += len(chunk_farms)
+        report()
+
+    if processes and len(work) > BATCH_CHUNK_SIZE:
+        # spawn rather than fork: this may run from a thread of a live web process
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker, initargs=(market,)) as pool:
+            for chunk in _chunks(work, BATCH_CHUNK_SIZE):
+                farms_to_score = changed(chunk)
+                # each worker scores a slice of the chunk as one matrix
+                slices = _chunks(farms_to_score, max(1, -(-len(farms_to_score) // processes)))
+                write(chunk, [rows for part in pool.map(_score_farms, slices) for rows in part])
+    else:
+        _init_worker(market)
+        for chunk in _chunks(work, BATCH_CHUNK_SIZE):
+            farms_to_score = changed(chunk)
+            write(chunk, _score_farms(farms_to_score) if farms_to_score else [])
+
+    report()
+    logging.info(f"Refreshed recommendations for {stats['processed']} farms in {stats['cells']} climate cells "
+                 f"({stats['unchanged']} unchanged, {stats['recommendations']} rows, {stats['farms_per_s']} farms/s)")
+    return stats
+
+
+class BatchRefreshRunner:
+    """Runs one batch refresh at a time in the background and keeps its latest progress."""
+
+    def __init__(self, app):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='batch-refresh')
+        self.status = {'state': 'idle'}
+        self._lock = threading.Lock()
+
+    def start(self, **filters) -> bool:
+        """Start a refresh unless one is already running; returns whether it started."""
+        with self._lock:
+            if self.status.get('state') == 'running':
+                return False
+            shown = {name: f'{len(value)} farms' if name == 'farm_ids' else value for name, value in filters.items()}
+            self.status = {'state': 'running', 'filters': shown,
+                           'started_at': datetime.datetime.utcnow().isoformat()}
+        self.executor.submit(self._run, filters)
+        return True
+
+    def _update(self, stats: dict) -> None:
+        self.status = {**self.status, **stats}
+
+    def _run(self, filters: dict) -> None:
+        with self.app.app_context():
+            try:
+                stats = refresh_recommendations(progress=self._update, **filters)
+                self.status = {**self.status, **stats, 'state': 'completed'}
+            except Exception as e:
+                logging.error(f"Batch recommendation refresh failed: {str(e)}", exc_info=True)
+                db.session.rollback()
+                self.status = {**self.status, 'state': 'failed', 'error': str(e)}
+            self.status['finished_at'] = datetime.datetime.utcnow().isoformat()
+
+
+def init_batch_runner(app) -> None:
+    app.extensions['batch_refresh'] = BatchRefreshRunner(app)
+
+
+def get_batch_runner() -> BatchRefreshRunner:
+    return current_app.extensions['batch_refresh']
@@ -0,0 +1,201 @@
+"""
+Bulk farm import from CSV or GeoJSON.
+
+Rows are validated as they are read, checked for duplicates against existing farms (and
+earlier rows of the same import) within DUPLICATE_RADIUS_M, and inserted IMPORT_BATCH_SIZE
+at a time in one transaction per batch, so memory stays flat however large the file is and
+a failure keeps the batches already committed.
+
+CSV headers are case-insensitive: latitude (or lat), longitude (or lon, lng), soil_type (or
+soil) and an optional location_name (or name). GeoJSON is a FeatureCollection of Point
+features carrying the same properties.
+"""
+import csv
+import io
+import json
+import logging
+import math
+import os
+import time
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from models import db, FarmProfile
+from services.crop_knowledge import KNOWLEDGE_BASE
+from services.geohash import encode_geohash
+from services.spatial import PointIndex
+from .page_cache import invalidate_user_pages
+
+
+IMPORT_FORMATS = ('csv', 'geojson')
+IMPORT_BATCH_SIZE = 1000  # farms validated, de-duplicated and inserted per transaction
+DUPLICATE_RADIUS_M = 50.0  # a new farm this close to another one is taken to be the same farm
+MAX_REPORTED_ISSUES = 100
+
+_SOILS = {soil.lower(): soil for soil in KNOWLEDGE_BASE.soils}
+_ALIASES = {'lat': 'latitude', 'lon': 'longitude', 'lng': 'longitude', 'soil': 'soil_type',
+            'name': 'location_name'}
+
+# (line number, or feature number for GeoJSON; field values)
+ImportRow = Tuple[int, Dict[str, object]]
+
+
+def _fields(values: Dict) -> Dict[str, object]:
+    fields = {}
+    for key, value in values.items():
+        if key is not None:
+            key = str(key).strip().lower()
+            fields[_ALIASES.get(key, key)] = value
+    return fields
+
+
+def read_csv(stream: IO[str]) -> Iterator[ImportRow]:
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, _fields(row)
+
+
+def read_geojson(stream: IO[str]) -> Iterator[ImportRow]:
+    """Features of a FeatureCollection. The document is parsed whole; validation and inserts still run in batches."""
+    data = json.load(stream)
+    features = data.get('features') if isinstance(data, dict) else None
+    if not isinstance(features, list):
+        raise ValueError('GeoJSON must be a FeatureCollection')
+    for number, feature in enumerate(features, 1):
+        feature = feature if isinstance(feature, dict) else {}
+        fields = _fields(feature.get('properties') or {})
+        geometry = feature.get('geometry') or {}
+        coordinates = geometry.get('coordinates')
+        if geometry.get('type') == 'Point' and isinstance(coordinates, list) and len(coordinates) >= 2:
+            fields['longitude'], fields['latitude'] = coordinates[:2]
+        yield number, fields
+
+
+def import_format(filename: str) -> str:
+    """Import format for a file name, by extension."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.geojson', '.json'):
+        return 'geojson'
+    raise ValueError(f"cannot tell the format of {filename!r}; expected one of: {', '.join(IMPORT_FORMATS)}")
+
+
+def read_farm_rows(stream: IO[bytes], fmt: str) -> Iterator[ImportRow]:
+    """Rows of a binary CSV or GeoJSON stream, such as an upload or an open file."""
+    if fmt not in IMPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    return read_csv(text) if fmt == 'csv' else read_geojson(text)
+
+
+def validate_farm_row(fields: Dict[str, object]) -> Tuple[Optional[dict], Optional[str]]:
+    """(FarmProfile column values, None) for a valid row, else (None, the problem)."""
+    values = {}
+    for name, low, high in (('latitude', -90.0, 90.0), ('longitude', -180.0, 180.0)):
+        raw = fields.get(name)
+        if raw is None or str(raw).strip() == '':
+            return None, f'{name} is required'
+        try:
+            value = float(raw)
+        except (TypeError, ValueError):
+            return None, f'{name} is not a number: {raw!r}'
+        if not math.isfinite(value) or not low <= value <= high:
+            return None, f'{name} must be between {low:g} and {high:g}'
+        values[name] = value
+    soil_type = _SOILS.get(str(fields.get('soil_type') or '').strip().lower())
+    if soil_type is None:
+        return None, f"soil_type must be one of: {', '.join(KNOWLEDGE_BASE.soils)}"
+    values['soil_type'] = soil_type
+    values['location_name'] = str(fields.get('location_name') or '').strip()[:255] or None
+    return values, None
+
+
+def describe_issue(issue: dict) -> str:
+    """One-line description of an entry of import_farms()['issues']."""
+    if 'error' in issue:
+        return f"line {issue['line']}: {issue['error']}"
+    other = issue['duplicate_of']
+    other = f'farm {other}' if isinstance(other, int) else other
+    return f"line {issue['line']}: duplicate of {other} ({issue['distance_m']} m away)"
+
+
+def _batches(rows: Iterable[ImportRow], size: int) -> Iterator[List[ImportRow]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_farms(rows: Iterable[ImportRow], user_id: int, batch_size: int = IMPORT_BATCH_SIZE,
+                 duplicate_radius_m: float = DUPLICATE_RADIUS_M,
+                 progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Validate, de-duplicate and insert farms owned by user_id (duplicate_radius_m=0 turns the
+    duplicate check off). Must run inside an app context. Returns import statistics: counts,
+    the first MAX_REPORTED_ISSUES problems by line, and the ids of the farms created.
+    """
+    started = time.monotonic()
+    stats = {'rows': 0, 'imported': 0, 'invalid': 0, 'duplicates': 0, 'elapsed_s': 0.0, 'rows_per_s': 0.0,
+             'issues': [], 'farm_ids': []}
+
+    def issue(line: int, **details) -> None:
+        if len(stats['issues']) < MAX_REPORTED_ISSUES:
+            stats['issues'].append({'line': line, **details})
+
+    def report():
+        stats['elapsed_s'] = round(time.monotonic() - started, 2)
+        stats['rows_per_s'] = round(stats['rows'] / stats['elapsed_s'], 1) if stats['elapsed_s'] else 0.0
+        if progress:
+            progress({key: value for key, value in stats.items() if key not in ('issues', 'farm_ids')})
+
+    for batch in _batches(rows, max(1, batch_size)):
+        valid = []
+        for line, fields in batch:
+            stats['rows'] += 1
+            values, error = validate_farm_row(fields)
+            if error:
+                stats['invalid'] += 1
+                issue(line, error=error)
+            else:
+                valid.append((line, values))
+
+        accepted = []
+        if duplicate_radius_m > 0 and valid:
+            # earlier batches are committed, so the database covers them as well as existing farms
+            index = PointIndex(duplicate_radius_m / 1000)
+            index.load_farms((values['latitude'], values['longitude']) for _, values in valid)
+            for line, values in valid:
+                hit = index.nearest(values['latitude'], values['longitude'])
+                if hit is None:
+                    index.add(f'line {line}', values['latitude'], values['longitude'])
+                    accepted.append(values)
+                else:
+                    stats['duplicates'] += 1
+                    issue(line, duplicate_of=hit[0], distance_m=round(hit[1] * 1000, 1))
+        else:
+            accepted = [values for _, values in valid]
+
+        if accepted:
+            # Core insert: ORM flush events do not run, so the geohash is set here
+            stats['farm_ids'] += db.session.execute(
+                insert(FarmProfile).returning(FarmProfile.id, sort_by_parameter_order=True),
+                [dict(values, user_id=user_id, geohash=encode_geohash(values['latitude'], values['longitude']))
+                 for values in accepted],
+            ).scalars().all()
+            db.session.commit()
+            stats['imported'] += len(accepted)
+        report()
+
+    report()
+    stats['issues'].sort(key=lambda issue: issue['line'])
+    if stats['imported']:
+        invalidate_user_pages(user_id)
+    logging.info(f"Imported {stats['imported']} of {stats['rows']} farms for user {user_id} "
+                 f"({stats['invalid']} invalid, {stats['duplicates']} duplicates, {stats['rows_per_s']} rows/s)")
+    return stats
@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from flask import current_app, g
+
+from models import db, FarmProfile
+from services.climate import climate_cell_key, get_farm_climate_summary
+from services.market import DEFAULT_MARKET_REGION, fetch_market_prices
+
+
+MARKET_CROPS = ['Wheat', 'Maize', 'Rice', 'Millet', 'Soybean', 'Chickpea', 'Lentil', 'Mustard', 'Cotton']
+
+# Upper bound on how long a page waits for each source before degrading to "unavailable"
+CLIMATE_FETCH_TIMEOUT = 25.0
+MARKET_FETCH_TIMEOUT = 10.0
+
+# After a climate cell or the market feed fails or times out, requests skip it for this long
+# and degrade straight away rather than each waiting out the timeout on a pool thread
+FETCH_FAILURE_BACKOFF = 60.0
+
+# Shared by all requests so concurrent fetches don't each spin up threads
+_fetch_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix='data-fetch')
+
+
+def _in_app_context(app, fn: Callable, *args):
+    with app.app_context():
+        try:
+            return fn(*args)
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+class FailureBackoff:
+    """Sources that failed recently, shared by all requests, with the error to report meanwhile."""
+
+    def __init__(self, seconds: float = FETCH_FAILURE_BACKOFF):
+        self.seconds = seconds
+        self._failed: Dict[Hashable, Tuple[float, str]] = {}
+        self._lock = threading.Lock()
+
+    def blocked(self, source: Hashable) -> Optional[str]:
+        """The recent error if `source` is still backing off, else None."""
+        with self._lock:
+            entry = self._failed.get(source)
+            if entry is None:
+                return None
+            failed_at, error = entry
+            remaining = self.seconds - (time.monotonic() - failed_at)
+            if remaining <= 0:
+                del self._failed[source]
+                return None
+        return f'{error} (not retried for another {remaining:.0f}s)'
+
+    def failed(self, source: Hashable, error: str) -> None:
+        with self._lock:
+            self._failed[source] = (time.monotonic(), error)
+
+    def succeeded(self, source: Hashable) -> None:
+        with self._lock:
+            self._failed.pop(source, None)
+
+
+_backoff = FailureBackoff()
+
+
+def _climate_source(profile) -> tuple:
+    return 'climate', climate_cell_key(profile.latitude, profile.longitude)
+
+
+_MARKET_SOURCE = ('market', DEFAULT_MARKET_REGION)
+
+
+def _load_climate_summary(profile_id: int) -> Optional[dict]:
+    # Runs on a pool thread with its own session, so reload the profile there
+    return get_farm_climate_summary(db.session.get(FarmProfile, profile_id))
+
+
+class FarmDataContext:
+    """
+    Climate, market and static-table lookups shared by every helper handling one request.
+    Each source is fetched at most once; failures are remembered so callers can report
+    them, and the data falls back to None / {} like the routes always did. A source that
+    failed for any request is skipped by all of them for FETCH_FAILURE_BACKOFF seconds.
+    """
+
+    def __init__(self):
+        self._climate: Dict[int, Optional[dict]] = {}
+        self._market: Optional[dict] = None
+        self._memo: Dict[Hashable, object] = {}
+        self.errors: Dict[Hashable, str] = {}
+
+    def prefetch(self, profile) -> None:
+        """
+        Fetch the farm's climate and the market snapshot concurrently, so the caller waits
+        for the slower source rather than both in turn. A source that fails or exceeds its
+        timeout is recorded as unavailable.
+        """
+        app = current_app._get_current_object()
+        started = time.monotonic()
+        pending = []
+        climate_source = _climate_source(profile)
+        if profile.id not in self._climate and not self._backing_off(('climate', profile.id), climate_source):
+            pending.append((('climate', profile.id), climate_source, CLIMATE_FETCH_TIMEOUT,
+                            _fetch_pool.submit(_in_app_context, app, _load_climate_summary, profile.id)))
+        if self._market is None and not self._backing_off('market', _MARKET_SOURCE):
+            pending.append(('market', _MARKET_SOURCE, MARKET_FETCH_TIMEOUT,
+                            _fetch_pool.submit(_in_app_context, app, fetch_market_prices, MARKET_CROPS)))
+
+        for source, backoff_source, timeout, future in pending:
+            try:
+                result = future.result(timeout=max(0.0, timeout - (time.monotonic() - started)))
+                _backoff.succeeded(backoff_source)
+            except FutureTimeout:
+                result = self._failed(source, f'timed out after {timeout:.0f}s', backoff_source)
+            except Exception as e:
+                result = self._failed(source, str(e), backoff_source)
+            if source == 'market':
+                self._market = result if result is not None else {}
+            else:
+                self._climate[profile.id] = result
+
+    def _backing_off(self, source: Hashable, backoff_source: Hashable) -> bool:
+        """Record `source` as unavailable without fetching it if its backoff_source failed recently."""
+        error = _backoff.blocked(backoff_source)
+        if error is None:
+            return False
+        self.errors[source] = error
+        if source == 'market':
+            self._market = {}
+        else:
+            self._climate[source[1]] = None
+        return True
+
+    def _failed(self, source: Hashable, error: str, backoff_source: Optional[Hashable] = None) -> None:
+        logging.warning(f"{source} data unavailable: {error}")
+        self.errors[source] = error
+        if backoff_source is not None:
+            _backoff.failed(backoff_source, error)
+        return None
+
+    def climate_summary(self, profile) -> Optional[dict]:
+        climate_source = _climate_source(profile)
+        if profile.id not in self._climate and not self._backing_off(('climate', profile.id), climate_source):
+            try:
+                self._climate[profile.id] = get_farm_climate_summary(profile)
+                _backoff.succeeded(climate_source)
+            except Exception as e:
+                db.session.rollback()
+                self._climate[profile.id] = self._failed(('climate', profile.id), str(e), climate_source)
+        return self._climate[profile.id]
+
+    def climate_error(self, profile) -> Optional[str]:
+        return self.errors.get(('climate', profile.id))
+
+    def market(self) -> dict:
+        if self._market is None and not self._backing_off('market', _MARKET_SOURCE):
+            try:
+                self._market = fetch_market_prices(MARKET_CROPS)
+                _backoff.succeeded(_MARKET_SOURCE)
+            except Exception as e:
+                self._failed('market', str(e), _MARKET_SOURCE)
+                self._market = {}
+        return self._market
+
+    def market_error(self) -> Optional[str]:
+        return self.errors.get('market')
+
+    def memo(self, key: Hashable, factory: Callable[[], object]):
+        """Compute a derived table once per request."""
+        if key not in self._memo:
+            self._memo[key] = factory()
+        return self._memo[key]
+
+
+def get_request_context() -> FarmDataContext:
+    """The FarmDataContext for the current request (or app context, for background work)."""
+    if 'farm_data' not in g:
+        g.farm_data = FarmDataContext()
+    return g.farm_data
@@ -0,0 +1,230 @@
+import datetime
+import hashlib
+import json
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, insert
+
+from models import db, FarmProfile, Recommendation, RecommendationRun
+from services.crop_knowledge import KNOWLEDGE_BASE
+from services.rollups import add_run_deltas, apply_rollup_deltas, current_rollup_deltas
+from services.scoring import score_farms
+from .context import get_request_context
+
+
+# (RecommendationRun column values, [Recommendation column values]) for one farm
+FarmRun = Tuple[dict, List[dict]]
+
+# Bump when scoring or the stored row layout changes, so unchanged inputs still regenerate
+GENERATION_VERSION = 1
+
+# History kept per farm: the newest runs, then the last run of each month up to a year back
+HISTORY_KEEP_RUNS = 10
+HISTORY_KEEP_DAYS = 365
+_DELETE_BATCH = 500
+
+
+def market_fingerprint(market: dict) -> str:
+    """Digest of a market snapshot; computed once per run and folded into each farm's inputs hash."""
+    return hashlib.sha256(json.dumps(market, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def inputs_hash(soil_type: str, latitude: float, longitude: float, climate_summary: Optional[dict],
+                market_digest: str) -> str:
+    """Fingerprint of everything a farm's recommendations are computed from."""
+    payload = json.dumps([GENERATION_VERSION, soil_type, latitude, longitude, climate_summary, market_digest],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def build_recommendation_run(farm_id: int, soil_type: str, latitude: float, longitude: float,
+                             climate_summary: Optional[dict], market: dict, limit: int = 5) -> FarmRun:
+    """
+    Score crops for one farm and return the run snapshot plus Recommendation column values
+    for the top `limit`. Pure function of its arguments so batch runs can call it from worker processes.
+    """
+    return build_recommendation_runs([(farm_id, soil_type, latitude, longitude, climate_summary)],
+                                     market, limit)[0]
+
+
+def build_recommendation_runs(farms: Sequence[tuple], market: dict, limit: int = 5) -> List[FarmRun]:
+    """
+    Runs for many (farm_id, soil_type, latitude, longitude, climate_summary) tuples, scored
+    together in one pass, in input order. Climate, market, soil and coordinates go on the
+    run once; each recommendation row only carries what differs per crop.
+    """
+    scores = score_farms([farm[1] for farm in farms], [farm[4] for farm in farms], market)
+    market_digest = market_fingerprint(market)
+    results = []
+    for i, (farm_id, soil_type, latitude, longitude, climate_summary) in enumerate(farms):
+        rows = []
+        run_market = {}
+        for r in scores.recommendations(i, limit):
+            market_info = r.get('market_info', {})
+            latest_price = market_info.get('latest_price', 0)
+            demand_index = market_info.get('demand_index', 0.5)
+            if market_info:
+                run_market[r['crop_name']] = market_info
+
+            # Calculate profitability estimate
+            base_yield = 2.5  # tons per hectare (average)
+            cost_per_hectare = latest_price * 0.4  # 40% of market price as cost
+            revenue_per_hectare = latest_price * base_yield
+            profit_estimate = revenue_per_hectare - cost_per_hectare
+
+            rows.append({
+                'farm_id': farm_id,
+                'crop_name': r['crop_name'],
+                'market_demand_score': demand_index,
+                'profitability_estimate': profit_estimate,
+                'cost_estimate': cost_per_hectare,
+                'ecological_impact': KNOWLEDGE_BASE.ecological_impact(r['crop_name']),
+                'rationale': r['rationale'],
+                'ai_score': r['score'],
+                'soil_type': soil_type,
+                'data': None,
+            })
+        run = {
+            'farm_id': farm_id,
+            'inputs_hash': inputs_hash(soil_type, latitude, longitude, climate_summary, market_digest),
+            'soil_type': soil_type,
+            'latitude': latitude,
+            'longitude': longitude,
+            'climate': climate_summary,
+            'market': run_market,
+            **RecommendationRun.typed_columns(climate_summary, run_market),
+        }
+        results.append((run, rows))
+    return results
+
+
+def current_inputs_hashes(farm_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+    """Inputs hash of each farm's latest run, for the farms that have one."""
+    latest = (db.session.query(func.max(RecommendationRun.id))
+              .filter(RecommendationRun.farm_id.in_(list(farm_ids)))
+              .group_by(RecommendationRun.farm_id))
+    return dict(db.session.query(RecommendationRun.farm_id, RecommendationRun.inputs_hash)
+                .filter(RecommendationRun.id.in_(latest)))
+
+
+def _lock_farms(farm_ids: Sequence[int]) -> None:
+    """
+    Lock the farms' rows until commit, in id order so concurrent writers cannot deadlock.
+    Writers of the same farm queue here, so the current rows read for the rollup deltas are
+    the ones the UPDATE retires and a farm never ends up with two current runs.
+    """
+    (db.session.query(FarmProfile.id).filter(FarmProfile.id.in_(farm_ids))
+     .order_by(FarmProfile.id).with_for_update().all())
+
+
+def store_recommendation_runs(runs: Sequence[FarmRun]) -> int:
+    """
+    Store a new run for every farm in `runs` in a single transaction: lock the farms, one
+    UPDATE retiring the farms' current recommendations to history, one multi-row INSERT for the runs and one
+    executemany for the rows, then move the regional rollups from the retired rows to the
+    new ones and prune history past the retention policy.
+    Returns the number of recommendations stored.
+    """
+    if not runs:
+        return 0
+    farm_ids = [run['farm_id'] for run, _ in runs]
+    conn = db.session.connection()
+    now = datetime.datetime.utcnow()
+    runs = [(dict(run, created_at=now), [dict(row, created_at=now) for row in rows]) for run, rows in runs]
+    _lock_farms(farm_ids)
+    deltas = current_rollup_deltas(conn, farm_ids)
+    (Recommendation.query.filter(Recommendation.farm_id.in_(farm_ids), Recommendation.is_current)
+     .update({'is_current': False}, synchronize_session=False))
+
+    run_ids = db.session.execute(
+        insert(RecommendationRun).returning(RecommendationRun.id, sort_by_parameter_order=True),
+        [run for run, _ in runs],
+    ).scalars().all()
+    rows = [dict(row, run_id=run_id) for run_id, (_, farm_rows) in zip(run_ids, runs) for row in farm_rows]
+    if rows:
+        db.session.execute(insert(Recommendation), rows)
+    apply_rollup_deltas(conn, add_run_deltas(deltas, runs))
+    prune_recommendation_history(farm_ids, commit=False)
+    db.session.commit()
+    return len(rows)
+
+
+def _expired_runs(runs: List[Tuple[int, datetime.datetime]], keep_runs: int,
+                  cutoff: datetime.datetime) -> List[int]:
+    """Ids to drop from one farm's runs (newest first): past the newest keep_runs, keep one per month until cutoff."""
+    expired = []
+    months = set()
+    for run_id, created_at in runs[keep_runs:]:
+        month = (created_at.year, created_at.month) if created_at else None
+        if created_at is None or created_at < cutoff or month in months:
+            expired.append(run_id)
+        else:
+            months.add(month)
+    return expired
+
+
+def prune_recommendation_history(farm_ids: Optional[Iterable[int]] = None, keep_runs: int = HISTORY_KEEP_RUNS,
+                                 keep_days: int = HISTORY_KEEP_DAYS, commit: bool = True) -> int:
+    """
+    Compact recommendation history for the given farms (all farms by default): keep each farm's
+    newest keep_runs runs, then the last run of each month for keep_days, and delete the rest
+    with their recommendations. Superseded rows written before runs existed are dropped too.
+    Returns the number of runs deleted.
+    """
+    keep_runs = max(1, keep_runs)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=keep_days)
+    query = db.session.query(RecommendationRun.farm_id, RecommendationRun.id, RecommendationRun.created_at)
+    legacy = Recommendation.query.filter(Recommendation.run_id.is_(None), Recommendation.is_current.is_(False))
+    if farm_ids is not None:
+        farm_ids = list(farm_ids)
+        query = query.filter(RecommendationRun.farm_id.in_(farm_ids))
+        legacy = legacy.filter(Recommendation.farm_id.in_(farm_ids))
+
+    expired = []
+    farm_runs = []
+    previous_farm = None
+    for farm_id, run_id, created_at in query.order_by(RecommendationRun.farm_id, RecommendationRun.id.desc()):
+        if farm_id != previous_farm:
+            expired += _expired_runs(farm_runs, keep_runs, cutoff)
+            farm_runs = []
+            previous_farm = farm_id
+        farm_runs.append((run_id, created_at))
+    expired += _expired_runs(farm_runs, keep_runs, cutoff)
+
+    legacy.delete(synchronize_session=False)
+    for i in range(0, len(expired), _DELETE_BATCH):
+        batch = expired[i:i + _DELETE_BATCH]
+        Recommendation.query.filter(Recommendation.run_id.in_(batch)).delete(synchronize_session=False)
+        RecommendationRun.query.filter(RecommendationRun.id.in_(batch)).delete(synchronize_session=False)
+    if commit:
+        db.session.commit()
+    return len(expired)
+
+
+def generate_farm_recommendations(profile, ctx=None) -> Tuple[int, List[str]]:
+    """
+    Recompute the top 5 recommendations for a farm as a new run, keeping earlier runs as
+    history. When the inputs hash matches the latest run nothing is written.
+    Returns the number of current recommendations and any data-source warnings.
+    """
+    ctx = ctx or get_request_context()
+    ctx.prefetch(profile)
+    notes = []
+
+    climate_summary = ctx.climate_summary(profile)
+    if ctx.climate_error(profile):
+        notes.append(f'Climate data unavailable: {ctx.climate_error(profile)}')
+
+    market = ctx.market()
+    if ctx.market_error():
+        notes.append(f'Market data unavailable: {ctx.market_error()}')
+
+    digest = inputs_hash(profile.soil_type, profile.latitude, profile.longitude, climate_summary,
+                         market_fingerprint(market))
+    if current_inputs_hashes([profile.id]).get(profile.id) == digest:
+        notes.append('Inputs unchanged since the last run; kept its recommendations.')
+        return Recommendation.query.filter_by(farm_id=profile.id, is_current=True).count(), notes
+
+    run = build_recommendation_run(profile.id, profile.soil_type, profile.latitude, profile.longitude,
+                                   climate_summary, market)
+    return store_recommendation_runs([run]), notes
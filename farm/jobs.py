@@ -0,0 +1,121 @@
+import datetime
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from models import db, FarmProfile, RecommendationJob
+from .context import FarmDataContext
+from .generation import generate_farm_recommendations
+
+
+ACTIVE_JOB_STATUSES = RecommendationJob.ACTIVE_STATUSES
+STALE_JOB_AFTER = datetime.timedelta(minutes=30)
+
+
+class RecommendationJobQueue:
+    """
+    Database-backed queue of recommendation jobs drained by a local thread pool.
+    The recommendation_jobs table is the source of truth: workers claim a job by
+    flipping it from pending to running, so any number of processes can share it, and a
+    partial unique index allows one pending or running job per farm.
+    """
+
+    def __init__(self, app, max_workers: int):
+        self.app = app
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='recommendations')
+        self._recovered = False
+        self._recover_lock = threading.Lock()
+
+    def enqueue(self, profile) -> RecommendationJob:
+        """Queue a job for the farm, or return the one already pending/running for it."""
+        job = self.active_job(profile.id)
+        if job is not None:
+            return job
+        job = RecommendationJob(farm_id=profile.id, status='pending')
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # a concurrent request queued one first; the unique index let only that one in
+            db.session.rollback()
+            return self.active_job(profile.id) or self.enqueue(profile)
+        self.executor.submit(self._run, job.id)
+        return job
+
+    @staticmethod
+    def active_job(farm_id: int):
+        return (RecommendationJob.query
+                .filter(RecommendationJob.farm_id == farm_id, RecommendationJob.status.in_(ACTIVE_JOB_STATUSES))
+                .order_by(RecommendationJob.id.desc())
+                .first())
+
+    def recover_on_start(self) -> None:
+        """
+        Run recover() once, before the first request this worker process serves, so jobs
+        orphaned by a restart resume without waiting for a new enqueue. (CLI processes never
+        serve requests, so they don't pick up jobs they would not finish.)
+        """
+        if self._recovered:
+            return
+        with self._recover_lock:
+            if not self._recovered:
+                try:
+                    self.recover()
+                    self._recovered = True
+                except Exception as e:
+                    db.session.rollback()
+                    logging.error(f"Recommendation job recovery failed, retrying on the next request: {str(e)}")
+
+    def recover(self) -> None:
+        """
+        Requeue jobs left behind by a restarted or crashed worker process. Safe to run in every
+        process at once: resetting stale jobs is one conditional UPDATE and each pending job is
+        claimed by exactly one worker.
+        """
+        cutoff = datetime.datetime.utcnow() - STALE_JOB_AFTER
+        RecommendationJob.query.filter(
+            RecommendationJob.status == 'running', RecommendationJob.started_at < cutoff
+        ).update({'status': 'pending', 'started_at': None}, synchronize_session=False)
+        db.session.commit()
+        for (job_id,) in RecommendationJob.query.with_entities(RecommendationJob.id).filter_by(status='pending'):
+            self.executor.submit(self._run, job_id)
+
+    def _run(self, job_id: int) -> None:
+        with self.app.app_context():
+            claimed = RecommendationJob.query.filter_by(id=job_id, status='pending').update(
+                {'status': 'running', 'started_at': datetime.datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            if not claimed:
+                return  # already taken by another worker
+            job = db.session.get(RecommendationJob, job_id)
+            try:
+                profile = db.session.get(FarmProfile, job.farm_id)
+                count, notes = generate_farm_recommendations(profile, FarmDataContext())
+                job.status = 'completed'
+                job.result_count = count
+                job.message = '\n'.join(notes) or None
+            except Exception as e:
+                logging.error(f"Recommendation job {job_id} failed: {str(e)}", exc_info=True)
+                db.session.rollback()
+                job = db.session.get(RecommendationJob, job_id)
+                if job is None:
+                    return  # farm deleted while the job ran
+                job.status = 'failed'
+                job.error = str(e)
+            job.finished_at = datetime.datetime.utcnow()
+            db.session.commit()
+
+
+def init_job_queue(app) -> None:
+    workers = int(os.environ.get('RECOMMENDATION_WORKERS', app.config.get('RECOMMENDATION_WORKERS', 2)))
+    queue = RecommendationJobQueue(app, workers)
+    app.extensions['recommendation_jobs'] = queue
+    app.before_request(queue.recover_on_start)
+
+
+def get_job_queue() -> RecommendationJobQueue:
+    return current_app.extensions['recommendation_jobs']
@@ -0,0 +1,212 @@
+import datetime
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+from flask import current_app, g, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import func
+
+from models import db, FarmProfile, RecommendationRun
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+
+PAGE_CACHE_MAX_ENTRIES = 512
+PAGE_CACHE_TTL = 3600  # seconds; market and climate inputs change at most daily
+
+# Versioned data URLs never change content, so browsers may keep them for a year
+DATA_MAX_AGE = 365 * 24 * 3600
+COMPRESS_MIN_BYTES = 512
+
+
+class PageCache:
+    """
+    Rendered responses of read-heavy pages, keyed by endpoint, user, view arguments, query
+    string and a data version. A changed version never hits an old entry, so invalidation
+    only has to free memory early; the least recently used entries go past the size cap.
+    """
+
+    def __init__(self, max_entries: int = PAGE_CACHE_MAX_ENTRIES, ttl: float = PAGE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, bytes, Dict[str, str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, body, headers = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body, headers
+
+    def set(self, key: Hashable, body: bytes, headers: Dict[str, str]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), body, headers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop every entry rendered for the user."""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == user_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def user_data_version() -> tuple:
+    """
+    Version of everything the farm pages read for the current user: their farms' editable
+    fields and latest recommendation run, plus the day (market and climate refresh daily).
+    One query.
+    """
+    rows = (db.session.query(FarmProfile.id, FarmProfile.location_name, FarmProfile.soil_type,
+                             FarmProfile.latitude, FarmProfile.longitude, func.max(RecommendationRun.id))
+            .outerjoin(RecommendationRun, RecommendationRun.farm_id == FarmProfile.id)
+            .filter(FarmProfile.user_id == current_user.id)
+            .group_by(FarmProfile.id)
+            .order_by(FarmProfile.id)
+            .all())
+    return (datetime.date.today().isoformat(), tuple(tuple(row) for row in rows))
+
+
+def data_version(*parts) -> str:
+    """Short digest of whatever a data endpoint's payload is derived from."""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:20]
+
+
+def _response_encoding() -> str:
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return 'identity'
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def _degraded() -> bool:
+    """Whether this request rendered without some of its climate or market data."""
+    farm_data = g.get('farm_data')
+    return farm_data is not None and bool(farm_data.errors)
+
+
+def cached_json(version: str, build: Callable[[], object]):
+    """
+    JSON response for a chart data endpoint whose payload is fully determined by `version`.
+    The serialized, compressed body is cached per version and encoding, and If-None-Match
+    gets a 304 without calling build(), so `version` should come from cheap inputs and the
+    expensive fetches belong inside build(). Requests made through a URL carrying ?v=<version>
+    (see the page templates) may be cached by the browser for a year; other requests revalidate.
+    A payload built without some of its climate or market data is sent uncached and untagged.
+    """
+    encoding = _response_encoding()
+    etag = f"{version}.{encoding}"
+    degraded = False
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        cache = get_page_cache()
+        key = (request.endpoint, current_user.id, tuple(sorted((request.view_args or {}).items())),
+               tuple(sorted((k, v) for k, v in request.args.items(multi=True) if k != 'v')), version, encoding)
+        cached = cache.get(key)
+        if cached is None:
+            body = current_app.json.dumps(build()).encode()
+            headers = {'Content-Type': 'application/json'}
+            if len(body) >= COMPRESS_MIN_BYTES and encoding != 'identity':
+                body = _compress(body, encoding)
+                headers['Content-Encoding'] = encoding
+            cached = (body, headers)
+            degraded = _degraded()
+            if not degraded:
+                cache.set(key, *cached)
+        body, headers = cached
+        response = current_app.response_class(body, headers=headers)
+    if not degraded:
+        response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.vary.add('Cookie')
+    response.cache_control.private = True
+    if request.args.get('v') == version and not degraded:
+        response.cache_control.max_age = DATA_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def cached_page(version: Callable[[], Hashable] = user_data_version):
+    """
+    Serve a page from the page cache while version() is unchanged, answering
+    If-None-Match with 304 before any work is done. Responses other than 200, degraded
+    renders (a climate or market fetch failed) and requests with flashed messages waiting
+    to be shown bypass the cache, so an upstream outage is not pinned for PAGE_CACHE_TTL.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if session.get('_flashes'):
+                return view(**kwargs)
+            key = (request.endpoint, current_user.id, tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))), version())
+            etag = hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                cache = get_page_cache()
+                cached = cache.get(key)
+                if cached is None:
+                    response = make_response(view(**kwargs))
+                    if (response.status_code != 200 or response.direct_passthrough or session.get('_flashes')
+                            or _degraded()):
+                        return response
+                    cache.set(key, response.get_data(), {'Content-Type': response.content_type})
+                else:
+                    body, headers = cached
+                    response = current_app.response_class(body, headers=headers)
+            response.set_etag(etag)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate_user_pages(user_id: int) -> None:
+    get_page_cache().invalidate_user(user_id)
+
+
+def init_page_cache(app) -> None:
+    app.extensions['page_cache'] = PageCache(
+        max_entries=int(app.config.get('PAGE_CACHE_MAX_ENTRIES', PAGE_CACHE_MAX_ENTRIES)),
+        ttl=float(app.config.get('PAGE_CACHE_TTL', PAGE_CACHE_TTL)),
+    )
+
+
+def get_page_cache() -> PageCache:
+    return current_app.extensions['page_cache']
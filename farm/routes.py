@@ -1,15 +1,35 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from models import db, FarmProfile, Recommendation
-from services.climate import fetch_nasa_power_daily, summarize_climate_for_agriculture
-from services.market import fetch_market_prices_stub
+from models import db, FarmProfile, Recommendation, RecommendationJob, RecommendationRun
+from query_profiles import PROFILE_HISTORY, PROFILE_LIST, PROFILE_RECOMMENDATIONS
+from services.crop_knowledge import KNOWLEDGE_BASE
+from services.market import market_snapshot_version
 from services.recommender import recommend_crops
+from services.rollups import remove_farms_from_rollups
+from services.scoring import ENHANCED_CONSENSUS_WEIGHTS, consensus_ranking, top_k
+from services.timeseries import DOWNSAMPLE_METHODS, SERIES_ENCODINGS, columnar_series
+from .context import MARKET_CROPS, get_request_context
+from .jobs import ACTIVE_JOB_STATUSES, get_job_queue
+from .page_cache import cached_json, cached_page, data_version, invalidate_user_pages, user_data_version
 import datetime
 import random
 import logging
 
 farm_bp = Blueprint('farm', __name__, url_prefix='/farm')
 
+# How many crops get full analysis sections; pages accept ?k= up to MAX_TOP_K
+DEFAULT_TOP_K = 8
+MAX_TOP_K = 50
+
+# Samples per crop drawn in the market page's daily price chart
+MARKET_CHART_POINTS = 20
+
+
+def requested_top_k(default=DEFAULT_TOP_K):
+    """Number of crops to rank in detail, from the ?k= query parameter."""
+    k = request.args.get('k', default, type=int)
+    return max(1, min(k, MAX_TOP_K))
+
 
 @farm_bp.route('/profile/new', methods=['GET', 'POST'])
 @login_required
@@ -40,6 +60,7 @@ def create_profile():
         )
         db.session.add(profile)
         db.session.commit()
+        invalidate_user_pages(current_user.id)
         flash('Farm profile created.', 'success')
         return redirect(url_for('dashboard'))
 
@@ -49,7 +70,8 @@ def create_profile():
 @farm_bp.route('/profiles')
 @login_required
 def list_profiles():
-    profiles = FarmProfile.query.filter_by(user_id=current_user.id).order_by(FarmProfile.created_at.desc()).all()
+    profiles = (FarmProfile.query.options(*PROFILE_LIST).filter_by(user_id=current_user.id)
+                .order_by(FarmProfile.created_at.desc()).all())
     return render_template('farm/profile_list.html', profiles=profiles)
 
 
@@ -57,97 +79,115 @@ def list_profiles():
 @login_required
 def generate_recommendations(profile_id: int):
     profile = FarmProfile.query.filter_by(id=profile_id, user_id=current_user.id).first_or_404()
-    end = datetime.date.today()
-    start = end - datetime.timedelta(days=180)
-    
-    # Clear existing recommendations
-    Recommendation.query.filter_by(farm_id=profile.id).delete()
-    
-    try:
-        climate_json = fetch_nasa_power_daily(profile.latitude, profile.longitude, start, end)
-        climate_summary = summarize_climate_for_agriculture(climate_json)
-        flash('Climate data loaded successfully', 'info')
-    except Exception as e:
-        flash(f'Climate data unavailable: {str(e)}', 'warning')
-        climate_summary = None
+    job = get_job_queue().enqueue(profile)
+    invalidate_user_pages(current_user.id)
+    if job.status == 'running':
+        flash('Recommendations are already being generated for this farm.', 'info')
+    else:
+        flash('Generating AI-powered recommendations with market insights - this page will update when they are ready.', 'info')
+    return redirect(url_for('farm.view_profile', profile_id=profile.id))
 
-    try:
-        market = fetch_market_prices_stub(['Wheat','Maize','Rice','Millet','Soybean','Chickpea','Lentil','Mustard','Cotton'])
-        flash('Market data loaded successfully', 'info')
-    except Exception as e:
-        flash(f'Market data unavailable: {str(e)}', 'warning')
-        market = {}
-
-    recs = recommend_crops(profile.soil_type, climate_summary, market)
-
-    # Enhanced ecological impacts
-    ecological_impacts = {
-        'Wheat': 'Improves soil structure, nitrogen fixation, good for crop rotation',
-        'Maize': 'High biomass production, good for soil organic matter, carbon sequestration',
-        'Rice': 'Water management benefits, supports wetland ecosystem, high yield potential',
-        'Millet': 'Drought resistant, low water requirement, excellent for arid regions',
-        'Soybean': 'Nitrogen fixation, improves soil fertility, high protein content',
-        'Chickpea': 'Nitrogen fixation, drought tolerant, improves soil health',
-        'Lentil': 'Nitrogen fixation, soil improvement, short growing season',
-        'Mustard': 'Oil crop, good for crop rotation, pest management benefits',
-        'Cotton': 'Fiber crop, requires careful pest management, high value crop'
+
+@farm_bp.route('/api/profile/<int:profile_id>/jobs')
+@login_required
+def get_recommendation_jobs_api(profile_id: int):
+    """API endpoint for recommendation job status"""
+    profile = FarmProfile.query.filter_by(id=profile_id, user_id=current_user.id).first_or_404()
+    jobs = (RecommendationJob.query.filter_by(farm_id=profile.id)
+            .order_by(RecommendationJob.id.desc()).limit(10).all())
+    return jsonify({
+        'active': any(job.status in ACTIVE_JOB_STATUSES for job in jobs),
+        'jobs': [job.to_dict() for job in jobs],
+    })
+
+
+@farm_bp.route('/api/profile/<int:profile_id>/history')
+@login_required
+def get_recommendation_history_api(profile_id: int):
+    """API endpoint for a farm's recommendation runs, newest first, for trend charts"""
+    profile = FarmProfile.query.filter_by(id=profile_id, user_id=current_user.id).first_or_404()
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    runs = (RecommendationRun.query.options(*PROFILE_HISTORY).filter_by(farm_id=profile.id)
+            .order_by(RecommendationRun.id.desc()).limit(limit).all())
+    return jsonify({
+        'farm_id': profile.id,
+        'runs': [
+            {
+                'id': run.id,
+                'created_at': run.created_at.isoformat() if run.created_at else None,
+                'inputs_hash': run.inputs_hash,
+                'current': i == 0,
+                'climate': {column: getattr(run, column) for column in RecommendationRun.CLIMATE_COLUMNS},
+                'market_as_of': run.market_as_of.isoformat() if run.market_as_of else None,
+                'recommendations': [
+                    {
+                        'crop_name': r.crop_name,
+                        'ai_score': r.ai_score,
+                        'market_demand_score': r.market_demand_score,
+                        'profitability_estimate': r.profitability_estimate,
+                    }
+                    for r in sorted(run.recommendations, key=lambda r: r.id)
+                ],
+            }
+            for i, run in enumerate(runs)
+        ],
+    })
+
+
+def _current_recommendations(profile_id: int):
+    return (Recommendation.query.filter_by(farm_id=profile_id, is_current=True)
+            .order_by(Recommendation.created_at.desc()))
+
+
+def _recommendation_json(r):
+    return {
+        'id': r.id,
+        'crop_name': r.crop_name,
+        'market_demand_score': r.market_demand_score,
+        'profitability_estimate': r.profitability_estimate,
+        'cost_estimate': r.cost_estimate,
+        'ecological_impact': r.ecological_impact,
+        'rationale': r.rationale,
+        'data': r.details
     }
 
-    # Store top 5 recommendations with enhanced data
-    for r in recs[:5]:
-        market_info = r.get('market_info', {})
-        latest_price = market_info.get('latest_price', 0)
-        demand_index = market_info.get('demand_index', 0.5)
-        
-        # Calculate profitability estimate
-        base_yield = 2.5  # tons per hectare (average)
-        cost_per_hectare = latest_price * 0.4  # 40% of market price as cost
-        revenue_per_hectare = latest_price * base_yield
-        profit_estimate = revenue_per_hectare - cost_per_hectare
-        
-        rec = Recommendation(
-            farm_id=profile.id,
-            crop_name=r['crop_name'],
-            market_demand_score=demand_index,
-            profitability_estimate=profit_estimate,
-            cost_estimate=cost_per_hectare,
-            ecological_impact=ecological_impacts.get(r['crop_name'], 'Improves soil health and biodiversity'),
-            rationale=r['rationale'],
-            data={
-                'climate': climate_summary,
-                'market': market_info,
-                'soil_type': profile.soil_type,
-                'coordinates': {'lat': profile.latitude, 'lng': profile.longitude},
-                'ai_score': r['score']
-            },
-        )
-        db.session.add(rec)
-    
-    db.session.commit()
-    flash(f'Generated {len(recs[:5])} AI-powered recommendations with market insights!', 'success')
-    return redirect(url_for('farm.view_profile', profile_id=profile.id))
+
+# Page and chart data versions come from cheap inputs (the user's farms and runs, the day and
+# the newest market stats) so If-None-Match is answered before any climate or market data is
+# fetched, and a same-day market reload still changes them.
+def _market_version():
+    return data_version(market_snapshot_version(MARKET_CROPS))
+
+
+def _user_market_version():
+    return data_version(user_data_version(), market_snapshot_version(MARKET_CROPS))
+
+
+@farm_bp.route('/api/profile/<int:profile_id>/recommendations')
+@login_required
+def get_profile_recommendations_api(profile_id: int):
+    """Chart data for a farm's current recommendations"""
+    profile = FarmProfile.query.filter_by(id=profile_id, user_id=current_user.id).first_or_404()
+    # rows are never updated in place, so their ids version the payload
+    ids = sorted(rec_id for (rec_id,) in _current_recommendations(profile.id).with_entities(Recommendation.id))
+    return cached_json(data_version(profile.id, ids), lambda: [
+        _recommendation_json(r) for r in _current_recommendations(profile.id).options(*PROFILE_RECOMMENDATIONS)
+    ])
 
 
 @farm_bp.route('/profile/<int:profile_id>')
 @login_required
 def view_profile(profile_id: int):
     profile = FarmProfile.query.filter_by(id=profile_id, user_id=current_user.id).first_or_404()
-    recs = Recommendation.query.filter_by(farm_id=profile.id).order_by(Recommendation.created_at.desc()).all()
-    # Serialize recommendations for JSON usage in template scripts
-    recs_json = [
-        {
-            'id': r.id,
-            'crop_name': r.crop_name,
-            'market_demand_score': r.market_demand_score,
-            'profitability_estimate': r.profitability_estimate,
-            'cost_estimate': r.cost_estimate,
-            'ecological_impact': r.ecological_impact,
-            'rationale': r.rationale,
-            'data': r.data or {}
-        }
-        for r in recs
-    ]
-    return render_template('farm/profile_detail.html', profile=profile, recs=recs, recs_json=recs_json)
+    recs = _current_recommendations(profile.id).options(*PROFILE_RECOMMENDATIONS).all()
+    jobs = (RecommendationJob.query.filter_by(farm_id=profile.id)
+            .order_by(RecommendationJob.id.desc()).limit(5).all())
+    active_job = next((job for job in jobs if job.status in ACTIVE_JOB_STATUSES), None)
+    # Charts load the recommendation details from a versioned data URL instead of inline JSON
+    recs_data_url = url_for('farm.get_profile_recommendations_api', profile_id=profile.id,
+                            v=data_version(profile.id, sorted(r.id for r in recs)))
+    return render_template('farm/profile_detail.html', profile=profile, recs=recs, recs_data_url=recs_data_url,
+                           jobs=jobs, active_job=active_job)
 
 
 @farm_bp.route('/profile/<int:profile_id>/edit', methods=['GET', 'POST'])
@@ -179,6 +219,7 @@ def edit_profile(profile_id: int):
             profile.soil_type = soil_type
             
             db.session.commit()
+            invalidate_user_pages(current_user.id)
             flash('Farm profile updated successfully!', 'success')
             return redirect(url_for('farm.view_profile', profile_id=profile.id))
 
@@ -192,15 +233,19 @@ def edit_profile(profile_id: int):
 @farm_bp.route('/profile/<int:profile_id>/delete', methods=['POST'])
 @login_required
 def delete_profile(profile_id: int):
-    profile = FarmProfile.query.filter_by(id=profile_id, user_id=current_user.id).first_or_404()
+    # locked like a run being stored, so a concurrent run cannot change what is subtracted
+    profile = FarmProfile.query.filter_by(id=profile_id, user_id=current_user.id).with_for_update().first_or_404()
+    remove_farms_from_rollups(db.session.connection(), [profile.id])
     db.session.delete(profile)
     db.session.commit()
+    invalidate_user_pages(current_user.id)
     flash('Farm profile deleted.', 'success')
     return redirect(url_for('farm.list_profiles'))
 
 
 @farm_bp.route('/ai-insights')
 @login_required
+@cached_page(_user_market_version)
 def ai_insights():
     """AI Insights page with comprehensive crop recommendations"""
     try:
@@ -219,7 +264,7 @@ def ai_insights():
         logging.info(f"Using profile {latest_profile.id} for AI analysis")
         
         # Generate AI insights using multiple AI tools consensus
-        ai_insights = generate_ai_consensus_insights(latest_profile)
+        ai_insights = generate_ai_consensus_insights(latest_profile, k=requested_top_k())
         logging.info(f"Generated AI insights successfully")
         
         return render_template('farm/ai_insights.html', 
@@ -235,13 +280,14 @@ def ai_insights():
 
 @farm_bp.route('/market-data')
 @login_required
+@cached_page(_user_market_version)
 def market_data():
     """Market Data page with interactive charts and analysis"""
     try:
         logging.info(f"Market data requested by user {current_user.id}")
         
         # Get market data for visualization
-        market_data = fetch_market_prices_stub(['Wheat','Maize','Rice','Millet','Soybean','Chickpea','Lentil','Mustard','Cotton'])
+        market_data = get_request_context().market()
         logging.info(f"Fetched market data for {len(market_data)} crops")
         
         # Get user's farm profiles for context
@@ -250,7 +296,10 @@ def market_data():
         
         return render_template('farm/market_data.html', 
                              market_data=market_data,
-                             profiles=profiles)
+                             profiles=profiles,
+                             chart_data_url=url_for('farm.get_market_data_api', format='columnar',
+                                                    encoding='base64', points=MARKET_CHART_POINTS,
+                                                    v=_market_version()))
     
     except Exception as e:
         logging.error(f"Error in market data: {str(e)}", exc_info=True)
@@ -264,7 +313,7 @@ def get_ai_insights_api(profile_id):
     """API endpoint for AI insights"""
     try:
         profile = FarmProfile.query.filter_by(id=profile_id, user_id=current_user.id).first_or_404()
-        insights = generate_ai_consensus_insights(profile)
+        insights = generate_ai_consensus_insights(profile, k=requested_top_k())
         return jsonify(insights)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -273,16 +322,39 @@ def get_ai_insights_api(profile_id):
 @farm_bp.route('/api/market-data')
 @login_required
 def get_market_data_api():
-    """API endpoint for market data"""
+    """
+    API endpoint for market data.
+    ?format=columnar sends each trend series as a start date and a packed price array
+    (&encoding=json|base64 float32), optionally downsampled to &points= with &downsample=lttb|minmax.
+    """
+    series_format = request.args.get('format', 'rows')
+    points = request.args.get('points', type=int)
+    method = request.args.get('downsample', 'lttb')
+    encoding = request.args.get('encoding', 'json')
+    if series_format not in ('rows', 'columnar'):
+        return jsonify({'error': 'format must be rows or columnar'}), 400
+    if points is not None and points < 2:
+        return jsonify({'error': 'points must be at least 2'}), 400
+    if method not in DOWNSAMPLE_METHODS or encoding not in SERIES_ENCODINGS:
+        return jsonify({'error': f"downsample must be one of {', '.join(DOWNSAMPLE_METHODS)} and "
+                                 f"encoding one of {', '.join(SERIES_ENCODINGS)}"}), 400
     try:
-        market_data = fetch_market_prices_stub(['Wheat','Maize','Rice','Millet','Soybean','Chickpea','Lentil','Mustard','Cotton'])
-        return jsonify(market_data)
+        def build():
+            market_data = get_request_context().market()
+            if series_format == 'rows':
+                return market_data
+            return {crop: {**data, 'trend_series': columnar_series(data.get('trend_series') or [], points,
+                                                                   method, encoding)}
+                    for crop, data in market_data.items()}
+
+        return cached_json(_market_version(), build)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @farm_bp.route('/profile/<int:profile_id>/market-analysis')
 @login_required
+@cached_page(_user_market_version)
 def farm_market_analysis(profile_id: int):
     """Detailed market analysis for a specific farm"""
     try:
@@ -292,26 +364,23 @@ def farm_market_analysis(profile_id: int):
         profile = FarmProfile.query.filter_by(id=profile_id, user_id=current_user.id).first_or_404()
         logging.info(f"Found profile {profile.id} for analysis")
         
+        ctx = get_request_context()
+        ctx.prefetch(profile)
+        
         # Get comprehensive market data
-        market_data = fetch_market_prices_stub(['Wheat','Maize','Rice','Millet','Soybean','Chickpea','Lentil','Mustard','Cotton'])
+        market_data = ctx.market()
         
         # Get climate data for the farm location
-        end = datetime.date.today()
-        start = end - datetime.timedelta(days=180)
-        
-        try:
-            climate_json = fetch_nasa_power_daily(profile.latitude, profile.longitude, start, end)
-            climate_summary = summarize_climate_for_agriculture(climate_json)
+        climate_summary = ctx.climate_summary(profile)
+        if climate_summary is not None:
             logging.info(f"Climate data loaded for profile {profile.id}")
-        except Exception as e:
-            logging.warning(f"Climate data unavailable for profile {profile.id}: {str(e)}")
-            climate_summary = None
         
         # Generate farm-specific recommendations
-        recommendations = recommend_crops(profile.soil_type, climate_summary, market_data)
+        recommendations = recommend_crops(profile.soil_type, climate_summary, market_data,
+                                          limit=requested_top_k(default=5))
         
         # Calculate farm-specific market insights
-        farm_insights = calculate_farm_market_insights(profile, market_data, climate_summary)
+        farm_insights = calculate_farm_market_insights(profile, market_data, climate_summary, ctx)
         
         logging.info(f"Generated farm market analysis for profile {profile.id}")
         
@@ -320,7 +389,9 @@ def farm_market_analysis(profile_id: int):
                              market_data=market_data,
                              climate_summary=climate_summary,
                              recommendations=recommendations,
-                             farm_insights=farm_insights)
+                             farm_insights=farm_insights,
+                             chart_data_url=url_for('farm.get_farm_market_analysis_api', profile_id=profile.id,
+                                                    v=_user_market_version()))
     
     except Exception as e:
         logging.error(f"Error in farm market analysis: {str(e)}", exc_info=True)
@@ -328,27 +399,51 @@ def farm_market_analysis(profile_id: int):
         return redirect(url_for('farm.list_profiles'))
 
 
-def generate_ai_consensus_insights(profile):
-    """Generate comprehensive AI insights with climate and price consensus"""
+@farm_bp.route('/api/profile/<int:profile_id>/market-analysis')
+@login_required
+def get_farm_market_analysis_api(profile_id: int):
+    """Chart data for the farm market analysis page: optimal crops' prices and demand, and climate"""
     try:
-        # Get climate data
-        end = datetime.date.today()
-        start = end - datetime.timedelta(days=180)
+        profile = FarmProfile.query.filter_by(id=profile_id, user_id=current_user.id).first_or_404()
+
+        def build():
+            ctx = get_request_context()
+            ctx.prefetch(profile)
+            market_data = ctx.market()
+            climate_summary = ctx.climate_summary(profile)
+            farm_insights = calculate_farm_market_insights(profile, market_data, climate_summary, ctx)
+            crops = farm_insights['optimal_crops']
+            return {
+                'optimal_crops': crops,
+                'market': {crop: {'latest_price': market_data[crop].get('latest_price'),
+                                  'demand_index': market_data[crop].get('demand_index')}
+                           for crop in crops if crop in market_data},
+                'climate': climate_summary,
+            }
+
+        return cached_json(_user_market_version(), build)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def generate_ai_consensus_insights(profile, k=DEFAULT_TOP_K):
+    """
+    Generate comprehensive AI insights with climate and price consensus.
+    Only the top `k` consensus crops get the detailed per-crop analysis.
+    """
+    try:
+        ctx = get_request_context()
+        ctx.prefetch(profile)
         
-        try:
-            climate_json = fetch_nasa_power_daily(profile.latitude, profile.longitude, start, end)
-            climate_summary = summarize_climate_for_agriculture(climate_json)
-        except:
-            climate_summary = None
+        # Get climate data
+        climate_summary = ctx.climate_summary(profile)
         
         # Get market data
-        try:
-            market = fetch_market_prices_stub(['Wheat','Maize','Rice','Millet','Soybean','Chickpea','Lentil','Mustard','Cotton'])
-        except:
-            market = {}
+        market = ctx.market()
         
         # AI Tool 1: Soil-based recommendations
-        soil_recommendations = get_soil_based_recommendations(profile.soil_type)
+        soil_recommendations = ctx.memo(('soil_recommendations', profile.soil_type),
+                                        lambda: get_soil_based_recommendations(profile.soil_type))
         
         # AI Tool 2: Climate-based recommendations
         climate_recommendations = get_climate_based_recommendations(climate_summary)
@@ -361,12 +456,12 @@ def generate_ai_consensus_insights(profile):
         
         # Enhanced consensus algorithm with detailed recommendations
         consensus_crops = calculate_enhanced_consensus_recommendations(
-            soil_recommendations, climate_recommendations, market_recommendations, climate_summary, market
+            soil_recommendations, climate_recommendations, market_recommendations, climate_summary, market, k
         )
         
         # Generate comprehensive crop recommendations with climate and price consensus
         comprehensive_recommendations = generate_comprehensive_crop_recommendations(
-            profile, climate_summary, market, consensus_crops
+            profile, climate_summary, market, consensus_crops, ctx
         )
         
         return {
@@ -397,40 +492,7 @@ def generate_ai_consensus_insights(profile):
 
 def get_soil_based_recommendations(soil_type):
     """AI Tool 1: Soil-based crop recommendations"""
-    soil_crop_mapping = {
-        'Loam': {
-            'excellent': ['Wheat', 'Maize', 'Soybean', 'Rice'],
-            'good': ['Chickpea', 'Lentil', 'Mustard'],
-            'moderate': ['Millet', 'Cotton']
-        },
-        'Clay': {
-            'excellent': ['Rice', 'Wheat'],
-            'good': ['Maize', 'Soybean'],
-            'moderate': ['Chickpea', 'Lentil']
-        },
-        'Sandy': {
-            'excellent': ['Millet', 'Cotton'],
-            'good': ['Chickpea', 'Lentil'],
-            'moderate': ['Wheat', 'Maize']
-        },
-        'Silty': {
-            'excellent': ['Wheat', 'Rice', 'Maize'],
-            'good': ['Soybean', 'Mustard'],
-            'moderate': ['Chickpea', 'Lentil']
-        },
-        'Peaty': {
-            'excellent': ['Rice', 'Mustard'],
-            'good': ['Wheat', 'Maize'],
-            'moderate': ['Soybean', 'Chickpea']
-        },
-        'Chalky': {
-            'excellent': ['Wheat', 'Mustard'],
-            'good': ['Maize', 'Chickpea'],
-            'moderate': ['Soybean', 'Lentil']
-        }
-    }
-    
-    recommendations = soil_crop_mapping.get(soil_type, soil_crop_mapping['Loam'])
+    recommendations = {tier: list(crops) for tier, crops in KNOWLEDGE_BASE.soil_tiers(soil_type).items()}
     return {
         'soil_type': soil_type,
         'recommendations': recommendations,
@@ -439,6 +501,24 @@ def get_soil_based_recommendations(soil_type):
     }
 
 
+def _climate_crop_mask(avg_temp, avg_rainfall):
+    """Crops whose temperature and rainfall traits fit the climate, with the reasons used."""
+    if avg_temp > 30:
+        mask, reasons = KNOWLEDGE_BASE.trait_mask('heat_tolerant'), ["high temperature tolerance"]
+    elif avg_temp < 15:
+        mask, reasons = KNOWLEDGE_BASE.trait_mask('cold_tolerant'), ["cold temperature tolerance"]
+    else:
+        mask, reasons = KNOWLEDGE_BASE.trait_mask('moderate_temperature'), ["moderate temperature suitability"]
+
+    if avg_rainfall > 1500:
+        mask |= KNOWLEDGE_BASE.trait_mask('water_loving')
+        reasons.append("high rainfall requirement")
+    elif avg_rainfall < 500:
+        mask |= KNOWLEDGE_BASE.trait_mask('drought_tolerant')
+        reasons.append("drought tolerance")
+    return mask, reasons
+
+
 def get_climate_based_recommendations(climate_summary):
     """AI Tool 2: Climate-based recommendations"""
     if not climate_summary:
@@ -451,32 +531,11 @@ def get_climate_based_recommendations(climate_summary):
     
     avg_temp = climate_summary.get('avg_temp', 25)
     avg_rainfall = climate_summary.get('avg_rainfall', 1000)
-    
-    recommendations = []
-    reasoning_parts = []
-    
-    # Temperature-based recommendations
-    if avg_temp > 30:
-        recommendations.extend(['Cotton', 'Millet', 'Soybean'])
-        reasoning_parts.append("high temperature tolerance")
-    elif avg_temp < 15:
-        recommendations.extend(['Wheat', 'Mustard', 'Chickpea'])
-        reasoning_parts.append("cold temperature tolerance")
-    else:
-        recommendations.extend(['Rice', 'Maize', 'Lentil'])
-        reasoning_parts.append("moderate temperature suitability")
-    
-    # Rainfall-based recommendations
-    if avg_rainfall > 1500:
-        recommendations.extend(['Rice', 'Soybean'])
-        reasoning_parts.append("high rainfall requirement")
-    elif avg_rainfall < 500:
-        recommendations.extend(['Millet', 'Chickpea', 'Lentil'])
-        reasoning_parts.append("drought tolerance")
+    mask, reasoning_parts = _climate_crop_mask(avg_temp, avg_rainfall)
     
     return {
         'climate_data': climate_summary,
-        'recommendations': list(set(recommendations)),
+        'recommendations': list(KNOWLEDGE_BASE.names(mask)),
         'confidence': 0.8,
         'reasoning': f"Based on temperature ({avg_temp}°C) and rainfall ({avg_rainfall}mm) - " + ", ".join(reasoning_parts)
     }
@@ -492,18 +551,9 @@ def get_market_based_recommendations(market):
             'reasoning': 'Using default recommendations due to unavailable market data'
         }
     
-    # Sort crops by profitability
-    crop_profits = []
-    for crop, data in market.items():
-        price = data.get('latest_price', 0)
-        demand = data.get('demand_index', 0.5)
-        profit_score = price * demand
-        crop_profits.append((crop, profit_score, price, demand))
-    
-    # Sort by profit score
-    crop_profits.sort(key=lambda x: x[1], reverse=True)
-    
-    recommendations = [crop for crop, _, _, _ in crop_profits[:5]]
+    # Top 5 crops by profitability (price x demand)
+    recommendations = [crop for crop, _ in top_k(
+        market.items(), 5, key=lambda item: item[1].get('latest_price', 0) * item[1].get('demand_index', 0.5))]
     
     return {
         'market_data': market,
@@ -555,58 +605,13 @@ def get_weather_condition_analysis(climate_summary):
 
 def calculate_consensus_recommendations(soil_recs, climate_recs, market_recs):
     """Calculate consensus from multiple AI tools"""
-    all_crops = set()
-    
-    # Collect all recommended crops
-    all_crops.update(soil_recs.get('recommendations', {}).get('excellent', []))
-    all_crops.update(climate_recs.get('recommendations', []))
-    all_crops.update(market_recs.get('recommendations', []))
-    
-    # Score each crop based on consensus
-    crop_scores = {}
-    for crop in all_crops:
-        score = 0
-        confidence = 0
-        
-        # Soil score
-        soil_excellent = soil_recs.get('recommendations', {}).get('excellent', [])
-        soil_good = soil_recs.get('recommendations', {}).get('good', [])
-        if crop in soil_excellent:
-            score += 3
-            confidence += soil_recs.get('confidence', 0.5)
-        elif crop in soil_good:
-            score += 2
-            confidence += soil_recs.get('confidence', 0.5) * 0.7
-        
-        # Climate score
-        if crop in climate_recs.get('recommendations', []):
-            score += 2
-            confidence += climate_recs.get('confidence', 0.5)
-        
-        # Market score
-        if crop in market_recs.get('recommendations', []):
-            score += 2
-            confidence += market_recs.get('confidence', 0.5)
-        
-        crop_scores[crop] = {
-            'score': score,
-            'confidence': confidence / 3 if confidence > 0 else 0.5,
-            'soil_suitability': crop in soil_excellent or crop in soil_good,
-            'climate_suitability': crop in climate_recs.get('recommendations', []),
-            'market_suitability': crop in market_recs.get('recommendations', [])
-        }
-    
-    # Sort by score and confidence
-    sorted_crops = sorted(crop_scores.items(), 
-                         key=lambda x: (x[1]['score'], x[1]['confidence']), 
-                         reverse=True)
-    
-    return sorted_crops[:5]  # Top 5 recommendations
+    return consensus_ranking(soil_recs, climate_recs, market_recs, limit=5)  # Top 5 recommendations
 
 
-def calculate_farm_market_insights(profile, market_data, climate_summary):
+def calculate_farm_market_insights(profile, market_data, climate_summary, ctx=None):
     """Calculate farm-specific market insights"""
     try:
+        ctx = ctx or get_request_context()
         insights = {
             'farm_location': f"{profile.latitude:.4f}, {profile.longitude:.4f}",
             'soil_type': profile.soil_type,
@@ -620,7 +625,8 @@ def calculate_farm_market_insights(profile, market_data, climate_summary):
         }
         
         # Analyze optimal crops for this farm
-        soil_suitable_crops = get_soil_suitable_crops(profile.soil_type)
+        soil_suitable_crops = ctx.memo(('soil_suitable_crops', profile.soil_type),
+                                       lambda: get_soil_suitable_crops(profile.soil_type))
         climate_suitable_crops = get_climate_suitable_crops(climate_summary)
         
         # Find intersection of soil and climate suitable crops
@@ -644,22 +650,22 @@ def calculate_farm_market_insights(profile, market_data, climate_summary):
         insights['market_opportunities'].sort(key=lambda x: x['opportunity_score'], reverse=True)
         
         # Calculate profitability analysis
-        for crop in optimal_crops[:5]:  # Top 5 crops
-            if crop in market_data:
-                crop_data = market_data[crop]
-                # Estimate costs and profits
-                estimated_yield = 2.5  # tons per hectare
-                estimated_cost = crop_data['latest_price'] * 0.4  # 40% of price as cost
-                estimated_revenue = crop_data['latest_price'] * estimated_yield
-                estimated_profit = estimated_revenue - estimated_cost
-                
-                insights['profitability_analysis'][crop] = {
-                    'estimated_yield': estimated_yield,
-                    'estimated_cost': estimated_cost,
-                    'estimated_revenue': estimated_revenue,
-                    'estimated_profit': estimated_profit,
-                    'profit_margin': (estimated_profit / estimated_revenue) * 100 if estimated_revenue > 0 else 0
-                }
+        for opportunity in insights['market_opportunities'][:5]:  # Top 5 crops
+            crop = opportunity['crop']
+            crop_data = market_data[crop]
+            # Estimate costs and profits
+            estimated_yield = 2.5  # tons per hectare
+            estimated_cost = crop_data['latest_price'] * 0.4  # 40% of price as cost
+            estimated_revenue = crop_data['latest_price'] * estimated_yield
+            estimated_profit = estimated_revenue - estimated_cost
+            
+            insights['profitability_analysis'][crop] = {
+                'estimated_yield': estimated_yield,
+                'estimated_cost': estimated_cost,
+                'estimated_revenue': estimated_revenue,
+                'estimated_profit': estimated_profit,
+                'profit_margin': (estimated_profit / estimated_revenue) * 100 if estimated_revenue > 0 else 0
+            }
         
         # Identify risk factors
         if climate_summary:
@@ -713,15 +719,7 @@ def determine_climate_zone(climate_summary):
 
 def get_soil_suitable_crops(soil_type):
     """Get crops suitable for specific soil type"""
-    soil_crop_mapping = {
-        'Loam': ['Wheat', 'Maize', 'Soybean', 'Rice', 'Chickpea', 'Lentil', 'Mustard'],
-        'Clay': ['Rice', 'Wheat', 'Maize', 'Soybean'],
-        'Sandy': ['Millet', 'Cotton', 'Chickpea', 'Lentil'],
-        'Silty': ['Wheat', 'Rice', 'Maize', 'Soybean', 'Mustard'],
-        'Peaty': ['Rice', 'Mustard', 'Wheat', 'Maize'],
-        'Chalky': ['Wheat', 'Mustard', 'Maize', 'Chickpea']
-    }
-    return soil_crop_mapping.get(soil_type, ['Wheat', 'Maize', 'Rice'])
+    return list(KNOWLEDGE_BASE.suitable_crops(soil_type))
 
 
 def get_climate_suitable_crops(climate_summary):
@@ -729,151 +727,36 @@ def get_climate_suitable_crops(climate_summary):
     if not climate_summary:
         return ['Wheat', 'Maize', 'Rice']
     
-    avg_temp = climate_summary.get('avg_temp', 25)
-    avg_rainfall = climate_summary.get('avg_rainfall', 1000)
-    
-    suitable_crops = []
-    
-    if avg_temp > 30:
-        suitable_crops.extend(['Cotton', 'Millet', 'Soybean'])
-    elif avg_temp < 15:
-        suitable_crops.extend(['Wheat', 'Mustard', 'Chickpea'])
-    else:
-        suitable_crops.extend(['Rice', 'Maize', 'Lentil'])
-    
-    if avg_rainfall > 1500:
-        suitable_crops.extend(['Rice', 'Soybean'])
-    elif avg_rainfall < 500:
-        suitable_crops.extend(['Millet', 'Chickpea', 'Lentil'])
-    
-    return list(set(suitable_crops))
+    mask, _ = _climate_crop_mask(climate_summary.get('avg_temp', 25), climate_summary.get('avg_rainfall', 1000))
+    return list(KNOWLEDGE_BASE.names(mask))
 
 
 def get_seasonal_recommendations(month, crops):
     """Get seasonal planting recommendations"""
-    seasonal_mapping = {
-        1: {'season': 'Winter', 'recommended': ['Wheat', 'Mustard', 'Chickpea']},
-        2: {'season': 'Winter', 'recommended': ['Wheat', 'Mustard', 'Chickpea']},
-        3: {'season': 'Spring', 'recommended': ['Maize', 'Rice', 'Soybean']},
-        4: {'season': 'Spring', 'recommended': ['Maize', 'Rice', 'Soybean']},
-        5: {'season': 'Spring', 'recommended': ['Maize', 'Rice', 'Soybean']},
-        6: {'season': 'Monsoon', 'recommended': ['Rice', 'Maize', 'Millet']},
-        7: {'season': 'Monsoon', 'recommended': ['Rice', 'Maize', 'Millet']},
-        8: {'season': 'Monsoon', 'recommended': ['Rice', 'Maize', 'Millet']},
-        9: {'season': 'Autumn', 'recommended': ['Wheat', 'Mustard', 'Lentil']},
-        10: {'season': 'Autumn', 'recommended': ['Wheat', 'Mustard', 'Lentil']},
-        11: {'season': 'Autumn', 'recommended': ['Wheat', 'Mustard', 'Lentil']},
-        12: {'season': 'Winter', 'recommended': ['Wheat', 'Mustard', 'Chickpea']}
-    }
-    
-    season_info = seasonal_mapping.get(month, {'season': 'Unknown', 'recommended': []})
+    seasonal = KNOWLEDGE_BASE.season_crops(month)
     
     # Filter recommended crops to only include those suitable for this farm
-    farm_suitable_seasonal = [crop for crop in season_info['recommended'] if crop in crops]
+    crops_mask = KNOWLEDGE_BASE.mask(crops)
+    farm_suitable_seasonal = [crop for crop in seasonal if KNOWLEDGE_BASE.bit[crop] & crops_mask]
     
     return {
-        'current_season': season_info['season'],
+        'current_season': KNOWLEDGE_BASE.season_for_month(month),
         'recommended_crops': farm_suitable_seasonal,
-        'all_seasonal_crops': season_info['recommended']
+        'all_seasonal_crops': list(seasonal)
     }
 
 
-def calculate_enhanced_consensus_recommendations(soil_recs, climate_recs, market_recs, climate_summary, market):
+def calculate_enhanced_consensus_recommendations(soil_recs, climate_recs, market_recs, climate_summary, market,
+                                                k=DEFAULT_TOP_K):
     """Enhanced consensus algorithm with detailed scoring"""
-    all_crops = set()
-    
-    # Collect all recommended crops
-    all_crops.update(soil_recs.get('recommendations', {}).get('excellent', []))
-    all_crops.update(climate_recs.get('recommendations', []))
-    all_crops.update(market_recs.get('recommendations', []))
-    
-    # Score each crop based on enhanced consensus
-    crop_scores = {}
-    for crop in all_crops:
-        score = 0
-        confidence = 0
-        details = {
-            'soil_score': 0,
-            'climate_score': 0,
-            'market_score': 0,
-            'price_trend': 'stable',
-            'profitability': 'medium',
-            'climate_suitability': 'moderate',
-            'seasonal_timing': 'optimal'
-        }
-        
-        # Soil score (40% weight)
-        soil_excellent = soil_recs.get('recommendations', {}).get('excellent', [])
-        soil_good = soil_recs.get('recommendations', {}).get('good', [])
-        if crop in soil_excellent:
-            score += 4
-            confidence += soil_recs.get('confidence', 0.5)
-            details['soil_score'] = 4
-        elif crop in soil_good:
-            score += 3
-            confidence += soil_recs.get('confidence', 0.5) * 0.7
-            details['soil_score'] = 3
-        
-        # Climate score (30% weight)
-        if crop in climate_recs.get('recommendations', []):
-            score += 3
-            confidence += climate_recs.get('confidence', 0.5)
-            details['climate_score'] = 3
-            details['climate_suitability'] = 'excellent'
-        
-        # Market score (30% weight)
-        if crop in market_recs.get('recommendations', []):
-            score += 3
-            confidence += market_recs.get('confidence', 0.5)
-            details['market_score'] = 3
-        
-        # Enhanced market analysis
-        if crop in market:
-            crop_data = market[crop]
-            price_change = crop_data.get('price_change_pct', 0)
-            if price_change > 5:
-                details['price_trend'] = 'rising'
-                score += 1
-            elif price_change < -5:
-                details['price_trend'] = 'falling'
-                score -= 1
-            
-            # Profitability analysis
-            price = crop_data.get('latest_price', 0)
-            demand = crop_data.get('demand_index', 0.5)
-            if price > 3000 and demand > 0.7:
-                details['profitability'] = 'high'
-                score += 1
-            elif price < 2000 or demand < 0.4:
-                details['profitability'] = 'low'
-                score -= 1
-        
-        # Seasonal timing bonus
-        current_month = datetime.date.today().month
-        seasonal_crops = get_seasonal_crops_for_month(current_month)
-        if crop in seasonal_crops:
-            details['seasonal_timing'] = 'optimal'
-            score += 1
-        
-        crop_scores[crop] = {
-            'score': score,
-            'confidence': confidence / 3 if confidence > 0 else 0.5,
-            'details': details,
-            'soil_suitability': crop in soil_excellent or crop in soil_good,
-            'climate_suitability': crop in climate_recs.get('recommendations', []),
-            'market_suitability': crop in market_recs.get('recommendations', [])
-        }
-    
-    # Sort by score and confidence
-    sorted_crops = sorted(crop_scores.items(), 
-                         key=lambda x: (x[1]['score'], x[1]['confidence']), 
-                         reverse=True)
-    
-    return sorted_crops[:8]  # Top 8 recommendations
+    return consensus_ranking(soil_recs, climate_recs, market_recs, market,
+                             month=datetime.date.today().month, weights=ENHANCED_CONSENSUS_WEIGHTS,
+                             limit=k, detailed=True)
 
 
-def generate_comprehensive_crop_recommendations(profile, climate_summary, market, consensus_crops):
+def generate_comprehensive_crop_recommendations(profile, climate_summary, market, consensus_crops, ctx=None):
     """Generate comprehensive crop recommendations with detailed analysis"""
+    ctx = ctx or get_request_context()
     recommendations = []
     
     for crop_data in consensus_crops:
@@ -897,19 +780,24 @@ def generate_comprehensive_crop_recommendations(profile, climate_summary, market
             'price_recommendations': generate_price_recommendations(crop_name, market_data),
             
             # Seasonal recommendations
-            'seasonal_recommendations': generate_seasonal_recommendations(crop_name),
+            'seasonal_recommendations': ctx.memo(('seasonal', crop_name),
+                                                 lambda: generate_seasonal_recommendations(crop_name)),
             
             # Profitability analysis
-            'profitability_analysis': generate_profitability_analysis(crop_name, market_data),
+            'profitability_analysis': ctx.memo(('profitability', crop_name, market_data.get('latest_price'),
+                                                market_data.get('demand_index')),
+                                               lambda: generate_profitability_analysis(crop_name, market_data)),
             
             # Risk assessment
             'risk_assessment': generate_risk_assessment(crop_name, climate_summary, market_data),
             
             # Implementation timeline
-            'implementation_timeline': generate_implementation_timeline(crop_name),
+            'implementation_timeline': ctx.memo(('timeline', crop_name),
+                                                lambda: generate_implementation_timeline(crop_name)),
             
             # Success factors
-            'success_factors': generate_success_factors(crop_name, profile.soil_type)
+            'success_factors': ctx.memo(('success_factors', crop_name, profile.soil_type),
+                                        lambda: generate_success_factors(crop_name, profile.soil_type))
         }
         
         recommendations.append(recommendation)
@@ -928,26 +816,26 @@ def generate_climate_recommendations(crop_name, climate_summary):
     recommendations = []
     
     # Temperature-based recommendations
-    if crop_name in ['Cotton', 'Millet', 'Soybean']:
+    if KNOWLEDGE_BASE.has_trait(crop_name, 'heat_tolerant'):
         if avg_temp > 30:
             recommendations.append("✓ Excellent for hot climate - optimal temperature range")
         elif avg_temp < 20:
             recommendations.append("⚠️ Consider heat management - may need greenhouse or shade")
     
-    elif crop_name in ['Wheat', 'Mustard', 'Chickpea']:
+    elif KNOWLEDGE_BASE.has_trait(crop_name, 'cold_tolerant'):
         if avg_temp < 20:
             recommendations.append("✓ Perfect for cool climate - ideal growing conditions")
         elif avg_temp > 30:
             recommendations.append("⚠️ High temperature risk - plant early or use heat-resistant varieties")
     
     # Rainfall-based recommendations
-    if crop_name in ['Rice', 'Soybean']:
+    if KNOWLEDGE_BASE.has_trait(crop_name, 'water_loving'):
         if avg_rainfall > 1200:
             recommendations.append("✓ High rainfall suitable - ensure proper drainage")
         elif avg_rainfall < 600:
             recommendations.append("⚠️ Low rainfall - ensure irrigation capacity")
     
-    elif crop_name in ['Millet', 'Chickpea', 'Lentil']:
+    elif KNOWLEDGE_BASE.has_trait(crop_name, 'drought_tolerant'):
         if avg_rainfall < 800:
             recommendations.append("✓ Drought-tolerant crops - perfect for low rainfall")
         elif avg_rainfall > 1500:
@@ -1001,70 +889,7 @@ def generate_price_recommendations(crop_name, market_data):
 def generate_seasonal_recommendations(crop_name):
     """Generate seasonal planting recommendations"""
     current_month = datetime.date.today().month
-    
-    seasonal_mapping = {
-        'Wheat': {
-            'optimal_months': [10, 11, 12, 1, 2],
-            'season': 'Winter',
-            'planting_window': 'October-February',
-            'harvest_window': 'March-May'
-        },
-        'Rice': {
-            'optimal_months': [6, 7, 8, 9],
-            'season': 'Monsoon',
-            'planting_window': 'June-September',
-            'harvest_window': 'October-December'
-        },
-        'Maize': {
-            'optimal_months': [3, 4, 5, 6],
-            'season': 'Spring-Summer',
-            'planting_window': 'March-June',
-            'harvest_window': 'July-September'
-        },
-        'Soybean': {
-            'optimal_months': [6, 7, 8],
-            'season': 'Monsoon',
-            'planting_window': 'June-August',
-            'harvest_window': 'September-November'
-        },
-        'Cotton': {
-            'optimal_months': [4, 5, 6],
-            'season': 'Summer',
-            'planting_window': 'April-June',
-            'harvest_window': 'October-December'
-        },
-        'Millet': {
-            'optimal_months': [6, 7, 8],
-            'season': 'Monsoon',
-            'planting_window': 'June-August',
-            'harvest_window': 'September-November'
-        },
-        'Chickpea': {
-            'optimal_months': [10, 11, 12],
-            'season': 'Winter',
-            'planting_window': 'October-December',
-            'harvest_window': 'March-May'
-        },
-        'Lentil': {
-            'optimal_months': [10, 11, 12],
-            'season': 'Winter',
-            'planting_window': 'October-December',
-            'harvest_window': 'March-April'
-        },
-        'Mustard': {
-            'optimal_months': [10, 11, 12],
-            'season': 'Winter',
-            'planting_window': 'October-December',
-            'harvest_window': 'February-April'
-        }
-    }
-    
-    crop_info = seasonal_mapping.get(crop_name, {
-        'optimal_months': [3, 4, 5, 6, 7, 8],
-        'season': 'General',
-        'planting_window': 'March-August',
-        'harvest_window': 'September-December'
-    })
+    crop_info = KNOWLEDGE_BASE.season_window(crop_name)
     
     recommendations = []
     
@@ -1135,11 +960,11 @@ def generate_risk_assessment(crop_name, climate_summary, market_data):
         avg_temp = climate_summary.get('avg_temp', 25)
         avg_rainfall = climate_summary.get('avg_rainfall', 1000)
         
-        if crop_name in ['Rice', 'Soybean'] and avg_rainfall < 600:
+        if KNOWLEDGE_BASE.has_trait(crop_name, 'water_loving') and avg_rainfall < 600:
             risks.append("Drought risk - insufficient rainfall")
             mitigations.append("Ensure irrigation backup systems")
         
-        if crop_name in ['Wheat', 'Mustard'] and avg_temp > 30:
+        if KNOWLEDGE_BASE.has_trait(crop_name, 'heat_sensitive') and avg_temp > 30:
             risks.append("Heat stress risk - high temperatures")
             mitigations.append("Plant early or use heat-resistant varieties")
     
@@ -1228,39 +1053,11 @@ def generate_success_factors(crop_name, soil_type):
         factors.append("⚠️ Sandy soil needs frequent irrigation and organic matter")
     
     # Crop-specific factors
-    crop_factors = {
-        'Wheat': ["Proper seed rate (100-120 kg/hectare)", "Timely sowing in October-November", "Balanced NPK fertilization"],
-        'Rice': ["Water management is critical", "Transplanting at proper age", "Pest management for stem borer"],
-        'Maize': ["High seed rate (20-25 kg/hectare)", "Proper spacing (60x20 cm)", "Zinc application"],
-        'Soybean': ["Inoculation with Rhizobium", "Proper spacing (45x10 cm)", "Timely harvesting to prevent shattering"],
-        'Cotton': ["High seed rate (8-10 kg/hectare)", "Proper spacing (90x60 cm)", "Pest management for bollworm"],
-        'Millet': ["Low seed rate (8-10 kg/hectare)", "Drought-resistant varieties", "Minimal irrigation"],
-        'Chickpea': ["Proper spacing (30x10 cm)", "Timely sowing in October", "Disease-resistant varieties"],
-        'Lentil': ["Low seed rate (30-40 kg/hectare)", "Proper spacing (30x10 cm)", "Timely harvesting"],
-        'Mustard': ["Proper spacing (45x10 cm)", "Balanced fertilization", "Pest management for aphids"]
-    }
-    
-    factors.extend(crop_factors.get(crop_name, ["Follow general agricultural practices"]))
+    factors.extend(KNOWLEDGE_BASE.success_factors(crop_name))
     
     return factors
 
 
 def get_seasonal_crops_for_month(month):
     """Get crops suitable for planting in a specific month"""
-    seasonal_crops = {
-        1: ['Wheat', 'Mustard', 'Chickpea'],
-        2: ['Wheat', 'Mustard', 'Chickpea'],
-        3: ['Maize', 'Rice', 'Soybean'],
-        4: ['Maize', 'Rice', 'Cotton'],
-        5: ['Maize', 'Rice', 'Cotton'],
-        6: ['Rice', 'Maize', 'Millet', 'Soybean'],
-        7: ['Rice', 'Maize', 'Millet', 'Soybean'],
-        8: ['Rice', 'Maize', 'Millet', 'Soybean'],
-        9: ['Wheat', 'Mustard', 'Lentil'],
-        10: ['Wheat', 'Mustard', 'Lentil', 'Chickpea'],
-        11: ['Wheat', 'Mustard', 'Lentil', 'Chickpea'],
-        12: ['Wheat', 'Mustard', 'Chickpea']
-    }
-    return seasonal_crops.get(month, [])
-
-
+    return KNOWLEDGE_BASE.crops_for_month(month)
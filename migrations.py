@@ -0,0 +1,298 @@
+"""
+Schema migrations for databases created before a model change.
+
+db.create_all() only creates missing tables, so indexes and columns added to existing tables
+are applied here. Each migration runs once, in order, inside its own transaction, and is
+recorded in schema_migrations. Migrations must be idempotent: a fresh database gets the
+current schema from create_all and then runs every migration on top of it.
+
+    python create_db.py            # create_all + apply pending migrations
+    flask --app app db-upgrade     # apply pending migrations only
+"""
+import datetime
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import (JSON, Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData,
+                        String, Table, UniqueConstraint, bindparam, column, delete, func, inspect, insert,
+                        select, table, text, true, update)
+
+from models import db, SchemaMigration
+
+
+_BACKFILL_BATCH = 1000
+
+# Migrations describe the schema and data as they were when each was written, never the current
+# models or service code, so a later model change cannot alter what an old migration does.
+# The tables below name only the columns the migrations read or write.
+_farms = table('farm_profiles', column('id', Integer), column('soil_type', String),
+               column('latitude', Float), column('longitude', Float), column('geohash', String))
+_recommendations = table(
+    'recommendations', column('id', Integer), column('farm_id', Integer), column('run_id', Integer),
+    column('crop_name', String), column('is_current', Boolean), column('ai_score', Float),
+    column('soil_type', String), column('profitability_estimate', Float), column('cost_estimate', Float),
+    column('market_demand_score', Float), column('data', JSON), column('created_at', DateTime))
+_runs = table(
+    'recommendation_runs', column('id', Integer), column('soil_type', String), column('latitude', Float),
+    column('longitude', Float), column('climate', JSON), column('market', JSON), column('avg_temp_c', Float),
+    column('total_precip_mm', Float), column('avg_rel_humidity', Float), column('growing_degree_days', Float),
+    column('market_as_of', Date))
+_jobs = table('recommendation_jobs', column('id', Integer), column('farm_id', Integer), column('status', String),
+              column('error', String), column('finished_at', DateTime))
+
+_GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def _geohash(lat: float, lon: float, precision: int) -> str:
+    """Geohash of a point, interleaving longitude and latitude bits (longitude first)."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    value = bits = 0
+    even = True
+    while len(chars) < precision:
+        bounds, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        mid = (bounds[0] + bounds[1]) / 2
+        if coordinate >= mid:
+            value = value * 2 + 1
+            bounds[0] = mid
+        else:
+            value = value * 2
+            bounds[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_BASE32[value])
+            value = bits = 0
+    return ''.join(chars)
+
+
+def _create_index(conn, name: str, table_name: str, *column_names: str, unique: bool = False,
+                  where: str = None) -> None:
+    """Create an index on the named columns if it does not exist yet; `where` makes it partial."""
+    columns = Table(table_name, MetaData(), *(Column(column_name) for column_name in column_names)).c
+    kwargs = {'sqlite_where': text(where), 'postgresql_where': text(where)} if where else {}
+    Index(name, *(columns[column_name] for column_name in column_names), unique=unique,
+          **kwargs).create(conn, checkfirst=True)
+
+
+def _add_column(conn, table_name: str, column: Column) -> None:
+    """Add a column to an existing table unless it is already there."""
+    if column.name in {existing['name'] for existing in inspect(conn).get_columns(table_name)}:
+        return
+    ddl = f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"
+    if column.server_default is not None:
+        default = column.server_default.arg
+        default = default if isinstance(default, str) else default.compile(dialect=conn.dialect)
+        ddl += f" DEFAULT {default}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    for fk in column.foreign_keys:
+        referred_table, referred_column = fk.target_fullname.split('.')
+        ddl += f" REFERENCES {referred_table} ({referred_column})"
+    conn.exec_driver_sql(ddl)
+
+
+def _batches(conn, query, size: int = _BACKFILL_BATCH):
+    """Rows of `query` (whose first column is its table's id) in id order, `size` at a time."""
+    id_column = query.selected_columns[0]
+    last_id = None
+    while True:
+        page = query if last_id is None else query.where(id_column > last_id)
+        rows = conn.execute(page.order_by(id_column).limit(size)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _rebuild_rollups(conn, ai_score) -> None:
+    """
+    Recompute recommendation_rollups from the current recommendations of runs: per (geohash-4
+    cell, soil type, YYYY-MM, crop), the count and the sums of AI score (read from the
+    `ai_score` expression), profitability, cost and demand.
+    """
+    rec, run = _recommendations, _runs
+    query = (select(rec.c.id, run.c.soil_type, run.c.latitude, run.c.longitude, rec.c.created_at,
+                    rec.c.crop_name, ai_score, rec.c.profitability_estimate, rec.c.cost_estimate,
+                    rec.c.market_demand_score)
+             .select_from(rec.join(run, rec.c.run_id == run.c.id))
+             .where(rec.c.is_current))
+    totals: Dict[tuple, List[float]] = {}
+    for rows in _batches(conn, query):
+        for _, soil, lat, lon, created_at, crop, *values in rows:
+            if soil is None or lat is None or lon is None or created_at is None:
+                continue
+            key = (_geohash(lat, lon, 4), soil, created_at.strftime('%Y-%m'), crop)
+            sums = totals.setdefault(key, [0, 0.0, 0.0, 0.0, 0.0])
+            sums[0] += 1
+            for i, value in enumerate(values, 1):
+                sums[i] += value or 0.0
+
+    rollups = table('recommendation_rollups', column('region'), column('soil_type'), column('month'),
+                    column('crop_name'), column('recommendation_count'), column('ai_score_sum'),
+                    column('profitability_sum'), column('cost_sum'), column('demand_sum'),
+                    column('updated_at', DateTime))
+    conn.execute(delete(rollups))
+    now = datetime.datetime.utcnow()
+    rows = [{'region': region, 'soil_type': soil, 'month': month, 'crop_name': crop, 'recommendation_count': count,
+             'ai_score_sum': score, 'profitability_sum': profit, 'cost_sum': cost, 'demand_sum': demand,
+             'updated_at': now}
+            for (region, soil, month, crop), (count, score, profit, cost, demand) in totals.items()]
+    if rows:
+        conn.execute(insert(rollups), rows)
+
+
+def _admin_listing_indexes(conn) -> None:
+    _create_index(conn, 'ix_farm_profiles_created_at_id', 'farm_profiles', 'created_at', 'id')
+    _create_index(conn, 'ix_farm_profiles_location_name', 'farm_profiles', 'location_name')
+    _create_index(conn, 'ix_farm_profiles_soil_type', 'farm_profiles', 'soil_type')
+    _create_index(conn, 'ix_recommendations_created_at_id', 'recommendations', 'created_at', 'id')
+    _create_index(conn, 'ix_recommendations_crop_name', 'recommendations', 'crop_name')
+
+
+def _owner_and_farm_indexes(conn) -> None:
+    _create_index(conn, 'ix_farm_profiles_user_id_created_at', 'farm_profiles', 'user_id', 'created_at')
+    _create_index(conn, 'ix_recommendations_farm_id_created_at', 'recommendations', 'farm_id', 'created_at')
+
+
+def _recommendation_runs(conn) -> None:
+    metadata = MetaData()
+    Table('farm_profiles', metadata, Column('id', Integer, primary_key=True))
+    runs = Table(
+        'recommendation_runs', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('farm_id', Integer, ForeignKey('farm_profiles.id'), nullable=False, index=True),
+        Column('soil_type', String(100)),
+        Column('latitude', Float),
+        Column('longitude', Float),
+        Column('climate', JSON),
+        Column('market', JSON),
+        Column('created_at', DateTime, server_default=func.now()),
+    )
+    runs.create(conn, checkfirst=True)
+    _add_column(conn, 'recommendations', Column('run_id', Integer, ForeignKey('recommendation_runs.id')))
+    _create_index(conn, 'ix_recommendations_run_id', 'recommendations', 'run_id')
+
+
+def _recommendation_history(conn) -> None:
+    _add_column(conn, 'recommendation_runs', Column('inputs_hash', String(64)))
+    _add_column(conn, 'recommendations', Column('is_current', Boolean, nullable=False, server_default=true()))
+
+
+def _farm_geohash(conn) -> None:
+    _add_column(conn, 'farm_profiles', Column('geohash', String(12)))
+    _create_index(conn, 'ix_farm_profiles_geohash', 'farm_profiles', 'geohash')
+    farms = _farms
+    query = select(farms.c.id, farms.c.latitude, farms.c.longitude).where(farms.c.geohash.is_(None))
+    for rows in _batches(conn, query):
+        conn.execute(update(farms).where(farms.c.id == bindparam('farm_id')),
+                     [{'farm_id': farm_id, 'geohash': _geohash(lat, lon, 9)} for farm_id, lat, lon in rows])
+
+
+def _recommendation_rollups(conn) -> None:
+    metadata = MetaData()
+    rollups = Table(
+        'recommendation_rollups', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('region', String(12), nullable=False),
+        Column('soil_type', String(100), nullable=False),
+        Column('month', String(7), nullable=False),
+        Column('crop_name', String(150), nullable=False),
+        Column('recommendation_count', Integer, nullable=False),
+        Column('ai_score_sum', Float, nullable=False),
+        Column('profitability_sum', Float, nullable=False),
+        Column('cost_sum', Float, nullable=False),
+        Column('demand_sum', Float, nullable=False),
+        Column('updated_at', DateTime),
+        UniqueConstraint('region', 'soil_type', 'month', 'crop_name', name='uq_recommendation_rollups_key'),
+        Index('ix_recommendation_rollups_month_region', 'month', 'region'),
+    )
+    rollups.create(conn, checkfirst=True)
+    # ai_score still lived in the recommendations' JSON; 0007 moves it to a column
+    _rebuild_rollups(conn, _recommendations.c.data['ai_score'].as_float())
+
+
+def _typed_recommendation_columns(conn) -> None:
+    _add_column(conn, 'recommendations', Column('ai_score', Float))
+    _add_column(conn, 'recommendations', Column('soil_type', String(100)))
+    climate_columns = ('avg_temp_c', 'total_precip_mm', 'avg_rel_humidity', 'growing_degree_days')
+    for column_name in climate_columns:
+        _add_column(conn, 'recommendation_runs', Column(column_name, Float))
+    _add_column(conn, 'recommendation_runs', Column('market_as_of', Date))
+    _create_index(conn, 'ix_recommendations_ai_score', 'recommendations', 'ai_score')
+    _create_index(conn, 'ix_recommendations_soil_type', 'recommendations', 'soil_type')
+    _create_index(conn, 'ix_recommendation_runs_avg_temp_c', 'recommendation_runs', 'avg_temp_c')
+    _create_index(conn, 'ix_recommendation_runs_total_precip_mm', 'recommendation_runs', 'total_precip_mm')
+    _create_index(conn, 'ix_recommendation_runs_market_as_of', 'recommendation_runs', 'market_as_of')
+
+    # climate metrics copied from the summary; market_as_of is the newest day in the snapshot
+    run = _runs
+    for rows in _batches(conn, select(run.c.id, run.c.climate, run.c.market)):
+        changes = []
+        for run_id, climate, market in rows:
+            days = [info['as_of'] for info in (market or {}).values() if isinstance(info, dict) and info.get('as_of')]
+            changes.append({'run_id': run_id,
+                            **{column_name: (climate or {}).get(column_name) for column_name in climate_columns},
+                            'market_as_of': datetime.date.fromisoformat(max(days)[:10]) if days else None})
+        conn.execute(update(run).where(run.c.id == bindparam('run_id')), changes)
+
+    # ai_score (and, on rows older than runs, soil_type) move out of the JSON column
+    rec = _recommendations
+    for rows in _batches(conn, select(rec.c.id, rec.c.data).where(rec.c.data.isnot(None))):
+        changes = []
+        for rec_id, data in rows:
+            data = dict(data or {})
+            changes.append({'rec_id': rec_id, 'ai_score': data.pop('ai_score', None),
+                            'soil_type': data.get('soil_type'), 'data': data or None})
+        conn.execute(update(rec).where(rec.c.id == bindparam('rec_id')), changes)
+    farm = _farms
+    conn.execute(update(rec).where(rec.c.run_id.isnot(None))
+                 .values(soil_type=select(run.c.soil_type).where(run.c.id == rec.c.run_id).scalar_subquery()))
+    conn.execute(update(rec).where(rec.c.soil_type.is_(None))
+                 .values(soil_type=select(farm.c.soil_type).where(farm.c.id == rec.c.farm_id).scalar_subquery()))
+    _rebuild_rollups(conn, rec.c.ai_score)
+
+
+def _one_active_job_per_farm(conn) -> None:
+    # older duplicates from concurrent enqueues would violate the unique index; keep the newest
+    job = _jobs
+    active = job.c.status.in_(('pending', 'running'))
+    newest = select(func.max(job.c.id)).where(active).group_by(job.c.farm_id)
+    conn.execute(update(job).where(active, job.c.id.not_in(newest))
+                 .values(status='failed', error='Superseded by a newer job for the same farm',
+                         finished_at=func.now()))
+    _create_index(conn, 'ix_recommendation_jobs_active_farm_id', 'recommendation_jobs', 'farm_id', unique=True,
+                  where="status IN ('pending', 'running')")
+
+
+# (version, description, apply); append only, never reorder or edit an applied migration
+MIGRATIONS: List[Tuple[str, str, Callable]] = [
+    ('0001', 'Admin listing pagination indexes', _admin_listing_indexes),
+    ('0002', 'Farm by owner and recommendation by farm indexes', _owner_and_farm_indexes),
+    ('0003', 'Recommendation runs holding the shared climate/market snapshot', _recommendation_runs),
+    ('0004', 'Recommendation history: run inputs hash and current flag', _recommendation_history),
+    ('0005', 'Farm geohash column and index, backfilled from coordinates', _farm_geohash),
+    ('0006', 'Regional recommendation rollups, built from current recommendations', _recommendation_rollups),
+    ('0007', 'Typed, indexed ai_score, soil type, climate metrics and market date, backfilled from JSON',
+     _typed_recommendation_columns),
+    ('0008', 'At most one pending or running recommendation job per farm', _one_active_job_per_farm),
+]
+
+
+def pending_migrations() -> List[Tuple[str, str, Callable]]:
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    with db.engine.connect() as conn:
+        applied = set(conn.scalars(select(SchemaMigration.version)))
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def apply_migrations() -> List[str]:
+    """Apply pending migrations in order; returns the versions applied. Needs an app context."""
+    applied = []
+    for version, description, apply in pending_migrations():
+        with db.engine.begin() as conn:
+            apply(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(version=version, description=description))
+        logging.info(f"Applied migration {version}: {description}")
+        applied.append(version)
+    return applied
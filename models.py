@@ -1,7 +1,11 @@
+import datetime
+
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from services.geohash import encode_geohash
+
 db = SQLAlchemy()
 
 class User(UserMixin, db.Model):
@@ -27,18 +31,46 @@ class FarmProfile(db.Model):
     location_name = db.Column(db.String(255))
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
-    soil_type = db.Column(db.String(100), nullable=False)
+    soil_type = db.Column(db.String(100), nullable=False, index=True)
+    # geohash of latitude/longitude, kept in sync on flush; prefix ranges serve spatial queries
+    geohash = db.Column(db.String(12), index=True)
     climate_inputs = db.Column(db.JSON)  # optional manual inputs or cached API results
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
+    __table_args__ = (
+        # a user's farms, newest first
+        db.Index('ix_farm_profiles_user_id_created_at', 'user_id', 'created_at'),
+        # keyset pagination in the admin listings seeks on (created_at, id)
+        db.Index('ix_farm_profiles_created_at_id', 'created_at', 'id'),
+        db.Index('ix_farm_profiles_location_name', 'location_name'),
+    )
+
     recommendations = db.relationship('Recommendation', backref='farm', cascade='all, delete-orphan', lazy=True)
+    # the latest run's recommendations, without the history kept from earlier runs
+    current_recommendations = db.relationship(
+        'Recommendation', primaryjoin='and_(FarmProfile.id == Recommendation.farm_id, Recommendation.is_current)',
+        viewonly=True, lazy=True)
+    recommendation_jobs = db.relationship('RecommendationJob', backref='farm', cascade='all, delete-orphan', lazy=True)
+    recommendation_runs = db.relationship('RecommendationRun', backref='farm', cascade='all, delete-orphan', lazy=True)
+
+
+@db.event.listens_for(FarmProfile, 'before_insert')
+@db.event.listens_for(FarmProfile, 'before_update')
+def _sync_geohash(mapper, connection, farm):
+    if farm.latitude is not None and farm.longitude is not None:
+        farm.geohash = encode_geohash(farm.latitude, farm.longitude)
 
 
 class Recommendation(db.Model):
     __tablename__ = "recommendations"
     id = db.Column(db.Integer, primary_key=True)
     farm_id = db.Column(db.Integer, db.ForeignKey('farm_profiles.id'), nullable=False)
-    crop_name = db.Column(db.String(150), nullable=False)
+    run_id = db.Column(db.Integer, db.ForeignKey('recommendation_runs.id'), index=True)  # shared inputs snapshot
+    crop_name = db.Column(db.String(150), nullable=False, index=True)
+    # False once a newer run for the farm replaced it; kept as history until pruned
+    is_current = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    ai_score = db.Column(db.Float, index=True)  # consensus score the crop was ranked by
+    soil_type = db.Column(db.String(100), index=True)  # farm soil when generated, for filtering without a join
 
     # Scores/estimates
     market_demand_score = db.Column(db.Float)  # 0-1 or 0-100 scale
@@ -47,5 +79,182 @@ class Recommendation(db.Model):
 
     ecological_impact = db.Column(db.String(255))  # short summary
     rationale = db.Column(db.Text)  # explanation of why recommended
-    data = db.Column(db.JSON)  # raw details: prices, weather stats, features
+    data = db.Column(db.JSON)  # rarely read extras; older rows carry climate/market inline
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    __table_args__ = (
+        # a farm's recommendations, newest first
+        db.Index('ix_recommendations_farm_id_created_at', 'farm_id', 'created_at'),
+        db.Index('ix_recommendations_created_at_id', 'created_at', 'id'),
+    )
+
+    @property
+    def details(self):
+        """Row data merged with its scores and its run's climate, market, soil and coordinates snapshot."""
+        details = dict(self.data or {})
+        if self.ai_score is not None:
+            details.setdefault('ai_score', self.ai_score)
+        if self.soil_type is not None:
+            details.setdefault('soil_type', self.soil_type)
+        if self.run is not None:
+            details.setdefault('climate', self.run.climate)
+            details.setdefault('market', (self.run.market or {}).get(self.crop_name, {}))
+            details.setdefault('soil_type', self.run.soil_type)
+            details.setdefault('coordinates', {'lat': self.run.latitude, 'lng': self.run.longitude})
+        return details
+
+
+class RecommendationRun(db.Model):
+    __tablename__ = "recommendation_runs"
+    id = db.Column(db.Integer, primary_key=True)
+    farm_id = db.Column(db.Integer, db.ForeignKey('farm_profiles.id'), nullable=False, index=True)
+    inputs_hash = db.Column(db.String(64))  # fingerprint of the inputs below; unchanged inputs skip regeneration
+    # inputs shared by every recommendation of the run, stored once
+    soil_type = db.Column(db.String(100))
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    climate = db.Column(db.JSON)  # climate summary
+    market = db.Column(db.JSON)  # {crop: market snapshot} for the recommended crops
+    # climate summary metrics and market snapshot day, typed for filtering
+    avg_temp_c = db.Column(db.Float, index=True)
+    total_precip_mm = db.Column(db.Float, index=True)
+    avg_rel_humidity = db.Column(db.Float)
+    growing_degree_days = db.Column(db.Float)
+    market_as_of = db.Column(db.Date, index=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    recommendations = db.relationship('Recommendation', backref='run', lazy=True)
+
+    # climate summary keys copied into columns of the same name
+    CLIMATE_COLUMNS = ('avg_temp_c', 'total_precip_mm', 'avg_rel_humidity', 'growing_degree_days')
+
+    @classmethod
+    def typed_columns(cls, climate, market):
+        """Column values derived from a run's climate summary and {crop: market snapshot}."""
+        values = {column: (climate or {}).get(column) for column in cls.CLIMATE_COLUMNS}
+        days = [info['as_of'] for info in (market or {}).values() if isinstance(info, dict) and info.get('as_of')]
+        values['market_as_of'] = datetime.date.fromisoformat(max(days)[:10]) if days else None
+        return values
+
+
+class RecommendationRollup(db.Model):
+    __tablename__ = "recommendation_rollups"  # current recommendations aggregated, see services/rollups.py
+    id = db.Column(db.Integer, primary_key=True)
+    region = db.Column(db.String(12), nullable=False)  # geohash cell of the farm
+    soil_type = db.Column(db.String(100), nullable=False)
+    month = db.Column(db.String(7), nullable=False)  # YYYY-MM the recommendation was generated
+    crop_name = db.Column(db.String(150), nullable=False)
+    # sums rather than averages so rows can be added and removed incrementally
+    recommendation_count = db.Column(db.Integer, nullable=False, default=0)
+    ai_score_sum = db.Column(db.Float, nullable=False, default=0.0)
+    profitability_sum = db.Column(db.Float, nullable=False, default=0.0)
+    cost_sum = db.Column(db.Float, nullable=False, default=0.0)
+    demand_sum = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.UniqueConstraint('region', 'soil_type', 'month', 'crop_name', name='uq_recommendation_rollups_key'),
+        db.Index('ix_recommendation_rollups_month_region', 'month', 'region'),
+    )
+
+
+class RecommendationJob(db.Model):
+    __tablename__ = "recommendation_jobs"
+    ACTIVE_STATUSES = ('pending', 'running')
+
+    id = db.Column(db.Integer, primary_key=True)
+    farm_id = db.Column(db.Integer, db.ForeignKey('farm_profiles.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, failed
+    result_count = db.Column(db.Integer)  # recommendations stored by the run
+    message = db.Column(db.Text)  # data-source warnings collected during the run
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # at most one pending or running job per farm, so concurrent enqueues cannot both insert one
+        db.Index('ix_recommendation_jobs_active_farm_id', 'farm_id', unique=True,
+                 sqlite_where=status.in_(ACTIVE_STATUSES), postgresql_where=status.in_(ACTIVE_STATUSES)),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'farm_id': self.farm_id,
+            'status': self.status,
+            'result_count': self.result_count,
+            'message': self.message,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class ClimateCell(db.Model):
+    __tablename__ = "climate_cells"
+    id = db.Column(db.Integer, primary_key=True)
+    cell_key = db.Column(db.String(64), unique=True, nullable=False)  # snapped lat/lon grid cell
+    latitude = db.Column(db.Float, nullable=False)  # cell centre used for upstream requests
+    longitude = db.Column(db.Float, nullable=False)
+    fetched_at = db.Column(db.DateTime, nullable=False)  # last successful ingest
+    last_accessed = db.Column(db.DateTime, nullable=False, index=True)  # drives LRU eviction
+
+
+class ClimateDaily(db.Model):
+    __tablename__ = "climate_daily"
+    id = db.Column(db.Integer, primary_key=True)
+    cell_key = db.Column(db.String(64), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    # NASA POWER parameters; NULL where the upstream returned its fill value
+    t2m = db.Column(db.Float)
+    t2m_min = db.Column(db.Float)
+    t2m_max = db.Column(db.Float)
+    precip = db.Column(db.Float)
+    rel_humidity = db.Column(db.Float)
+    solar = db.Column(db.Float)
+
+    __table_args__ = (
+        db.UniqueConstraint('cell_key', 'date', name='uq_climate_daily_cell_date'),
+    )
+
+
+class MarketPrice(db.Model):
+    __tablename__ = "market_prices"
+    id = db.Column(db.Integer, primary_key=True)
+    crop = db.Column(db.String(100), nullable=False)
+    region = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    price = db.Column(db.Float, nullable=False)  # INR per quintal
+
+    __table_args__ = (
+        db.UniqueConstraint('crop', 'region', 'date', name='uq_market_prices_crop_region_date'),
+    )
+
+
+class MarketStat(db.Model):
+    __tablename__ = "market_stats"
+    id = db.Column(db.Integer, primary_key=True)
+    crop = db.Column(db.String(100), nullable=False)
+    region = db.Column(db.String(100), nullable=False)
+    as_of = db.Column(db.Date, nullable=False)  # stats cover the window ending on this day
+    latest_price = db.Column(db.Float)
+    demand_index = db.Column(db.Float)
+    price_change_pct = db.Column(db.Float)
+    trend = db.Column(db.String(20))
+    volatility = db.Column(db.String(20))
+    seasonality = db.Column(db.String(20))
+    support_level = db.Column(db.Float)
+    resistance_level = db.Column(db.Float)
+
+    __table_args__ = (
+        db.UniqueConstraint('crop', 'region', 'as_of', name='uq_market_stats_crop_region_as_of'),
+    )
+
+
+class SchemaMigration(db.Model):
+    __tablename__ = "schema_migrations"  # migrations from migrations.py applied to this database
+    version = db.Column(db.String(64), primary_key=True)
+    description = db.Column(db.String(255))
+    applied_at = db.Column(db.DateTime, server_default=db.func.now())
@@ -0,0 +1,66 @@
+"""
+Eager-loading profiles for the list views, so a page runs the same number of queries however
+many rows it shows, and a helper to check a route stays within its query budget:
+
+    with app.app_context():
+        engine = db.engine
+    with assert_max_queries(4, engine):
+        client.get('/admin/farms')
+"""
+from contextlib import contextmanager
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import configure_mappers, defer, joinedload, load_only, selectinload
+
+from models import db, FarmProfile, Recommendation, RecommendationRun
+
+# Backrefs such as FarmProfile.owner only exist once the mappers are configured
+configure_mappers()
+
+# Admin farm listing shows each farm's owner
+ADMIN_FARM_LIST = (joinedload(FarmProfile.owner),)
+
+# Admin recommendation listing shows each recommendation's farm and its owner, and no JSON extras
+ADMIN_RECOMMENDATION_LIST = (joinedload(Recommendation.farm).joinedload(FarmProfile.owner),
+                             defer(Recommendation.data))
+
+# A user's profile list shows a current recommendation count per farm; load ids only, in one extra query
+PROFILE_LIST = (selectinload(FarmProfile.current_recommendations).options(load_only(Recommendation.id)),)
+
+# A farm's recommendations with the run snapshot their details are merged from
+PROFILE_RECOMMENDATIONS = (selectinload(Recommendation.run),)
+
+# A farm's run history with each run's ranked crops; everything it shows is a typed column
+PROFILE_HISTORY = (defer(RecommendationRun.climate), defer(RecommendationRun.market),
+                   selectinload(RecommendationRun.recommendations).options(defer(Recommendation.data)))
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A block ran more SQL statements than allowed."""
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Collect the SQL statements executed on `engine` (default: the app's) inside the block."""
+    engine = engine or db.engine
+    statements: List[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, engine: Optional[object] = None):
+    """Raise QueryBudgetExceeded, listing the statements, if the block runs more than max_queries."""
+    with count_queries(engine) as statements:
+        yield statements
+    if len(statements) > max_queries:
+        raise QueryBudgetExceeded(f"{len(statements)} queries executed, budget was {max_queries}:\n"
+                                  + '\n'.join(statements))
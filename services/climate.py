@@ -1,5 +1,39 @@
 import datetime
+import logging
+import math
+import warnings
+from typing import List, Optional, Tuple
+
+import numpy as np
 import requests
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ClimateCell, ClimateDaily
+
+
+logger = logging.getLogger(__name__)
+
+# NASA POWER serves daily point data on a 0.5 x 0.625 degree grid, so every farm
+# inside one cell gets the same answer; the daily store is keyed on that cell.
+CLIMATE_CELL_LAT_DEG = 0.5
+CLIMATE_CELL_LON_DEG = 0.625
+CLIMATE_CACHE_TTL = datetime.timedelta(hours=12)
+CLIMATE_CACHE_MAX_ENTRIES = 5000  # grid cells kept in the daily store
+CLIMATE_WINDOW_DAYS = 180
+CLIMATE_RETENTION_DAYS = 400
+
+# NASA POWER parameter -> ClimateDaily column
+POWER_PARAMETERS = {
+    'T2M': 't2m',
+    'T2M_MIN': 't2m_min',
+    'T2M_MAX': 't2m_max',
+    'PRECTOTCORR': 'precip',
+    'RELHUM': 'rel_humidity',
+    'ALLSKY_SFC_SW_DWN': 'solar',
+}
+POWER_FILL_VALUE = -999.0
+GDD_BASE_TEMP_C = 10.0
+DRY_DAY_PRECIP_MM = 1.0
 
 
 def fetch_nasa_power_daily(lat: float, lon: float, start: datetime.date, end: datetime.date) -> dict:
@@ -22,23 +56,225 @@ def fetch_nasa_power_daily(lat: float, lon: float, start: datetime.date, end: da
     return resp.json()
 
 
+def snap_to_cell(lat: float, lon: float) -> Tuple[float, float]:
+    """Snap a coordinate to the centre of its NASA POWER grid cell."""
+    cell_lat = (math.floor(lat / CLIMATE_CELL_LAT_DEG) + 0.5) * CLIMATE_CELL_LAT_DEG
+    cell_lon = (math.floor(lon / CLIMATE_CELL_LON_DEG) + 0.5) * CLIMATE_CELL_LON_DEG
+    return round(min(max(cell_lat, -90.0), 90.0), 4), round(min(max(cell_lon, -180.0), 180.0), 4)
+
+
+def climate_cell_key(lat: float, lon: float) -> str:
+    """Stable string key for the grid cell containing a coordinate."""
+    cell_lat, cell_lon = snap_to_cell(lat, lon)
+    return f"{cell_lat:.4f}:{cell_lon:.4f}"
+
+
+def _evict_climate_cells() -> None:
+    """Drop the least recently used cells (and their daily rows) above the size cap."""
+    overflow = ClimateCell.query.count() - CLIMATE_CACHE_MAX_ENTRIES
+    if overflow <= 0:
+        return
+    stale_keys = [row.cell_key for row in ClimateCell.query.with_entities(ClimateCell.cell_key)
+                  .order_by(ClimateCell.last_accessed.asc()).limit(overflow)]
+    ClimateDaily.query.filter(ClimateDaily.cell_key.in_(stale_keys)).delete(synchronize_session=False)
+    ClimateCell.query.filter(ClimateCell.cell_key.in_(stale_keys)).delete(synchronize_session=False)
+
+
+def ingest_daily_climate(lat: float, lon: float, start: datetime.date, end: datetime.date) -> int:
+    """
+    Bring the daily store for the grid cell up to date over [start, end].
+    Only days that are missing (or were still fill values upstream) are requested,
+    and not more often than the cache TTL. Rows older than the retention window are
+    trimmed. Returns the number of days written.
+    """
+    key = climate_cell_key(lat, lon)
+    cell_lat, cell_lon = snap_to_cell(lat, lon)
+    now = datetime.datetime.utcnow()
+
+    cell = ClimateCell.query.filter_by(cell_key=key).first()
+    if cell is None:
+        cell = ClimateCell(cell_key=key, latitude=cell_lat, longitude=cell_lon,
+                           fetched_at=datetime.datetime.min, last_accessed=now)
+        db.session.add(cell)
+    cell.last_accessed = now
+
+    rows = {row.date: row for row in ClimateDaily.query.filter(
+        ClimateDaily.cell_key == key, ClimateDaily.date >= start, ClimateDaily.date <= end)}
+    missing = [start + datetime.timedelta(days=d) for d in range((end - start).days + 1)]
+    missing = [day for day in missing if day not in rows or rows[day].t2m is None]
+
+    # Recent days stay missing until NASA publishes them; don't re-ask within the TTL.
+    if not missing or (cell.fetched_at >= now - CLIMATE_CACHE_TTL and all(day in rows for day in missing)):
+        db.session.commit()
+        return 0
+
+    fetch_start, fetch_end = min(missing), max(missing)
+    params = fetch_nasa_power_daily(cell_lat, cell_lon, fetch_start, fetch_end)['properties']['parameter']
+
+    written = 0
+    for offset in range((fetch_end - fetch_start).days + 1):
+        day = fetch_start + datetime.timedelta(days=offset)
+        stamp = day.strftime('%Y%m%d')
+        values = {}
+        for name, column in POWER_PARAMETERS.items():
+            value = params.get(name, {}).get(stamp)
+            values[column] = None if value is None or value <= POWER_FILL_VALUE else value
+        row = rows.get(day)
+        if row is None:
+            db.session.add(ClimateDaily(cell_key=key, date=day, **values))
+        else:
+            for column, value in values.items():
+                setattr(row, column, value)
+        written += 1
+
+    cell.fetched_at = now
+    ClimateDaily.query.filter(
+        ClimateDaily.cell_key == key,
+        ClimateDaily.date < end - datetime.timedelta(days=CLIMATE_RETENTION_DAYS),
+    ).delete(synchronize_session=False)
+    _evict_climate_cells()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # another worker ingested the same cell concurrently
+        db.session.rollback()
+    return written
+
+
+def load_daily_climate(lat: float, lon: float, start: datetime.date, end: datetime.date) -> dict:
+    """
+    Read the stored daily series for the grid cell in the NASA POWER response shape,
+    with missing values set to the upstream fill value.
+    """
+    rows = ClimateDaily.query.filter(
+        ClimateDaily.cell_key == climate_cell_key(lat, lon),
+        ClimateDaily.date >= start, ClimateDaily.date <= end,
+    ).order_by(ClimateDaily.date.asc()).all()
+    parameter = {name: {} for name in POWER_PARAMETERS}
+    for row in rows:
+        stamp = row.date.strftime('%Y%m%d')
+        for name, column in POWER_PARAMETERS.items():
+            value = getattr(row, column)
+            parameter[name][stamp] = POWER_FILL_VALUE if value is None else value
+    return {'properties': {'parameter': parameter}} if rows else {}
+
+
+def fetch_climate_window(lat: float, lon: float, start: datetime.date, end: datetime.date) -> dict:
+    """
+    Climate series for a point from the local daily store, ingesting missing days first.
+    If the upstream is down, whatever is already stored is served; raises only when
+    nothing is stored for the window.
+    """
+    try:
+        ingest_daily_climate(lat, lon, start, end)
+    except Exception as e:
+        db.session.rollback()
+        stored = load_daily_climate(lat, lon, start, end)
+        if stored:
+            logger.warning(f"NASA POWER ingest failed for cell {climate_cell_key(lat, lon)}, serving stored data: {e}")
+            return stored
+        raise
+    return load_daily_climate(lat, lon, start, end)
+
+
+def get_farm_climate_summary(profile, days: int = CLIMATE_WINDOW_DAYS) -> Optional[dict]:
+    """
+    Climate summary for a farm over the trailing window, reusing the summary stored in
+    profile.climate_inputs when it was computed today for the same grid cell.
+    Raises if the data is neither cached nor fetchable.
+    """
+    end = datetime.date.today()
+    start = end - datetime.timedelta(days=days)
+    key = climate_cell_key(profile.latitude, profile.longitude)
+
+    stored = (profile.climate_inputs or {}).get('nasa_power') or {}
+    if (stored.get('cell_key') == key and stored.get('start') == start.isoformat()
+            and stored.get('end') == end.isoformat() and stored.get('summary') is not None):
+        return stored['summary']
+
+    summary = summarize_climate_for_agriculture(fetch_climate_window(profile.latitude, profile.longitude, start, end))
+    profile.climate_inputs = {
+        **(profile.climate_inputs or {}),
+        'nasa_power': {
+            'cell_key': key,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'summary': summary,
+        },
+    }
+    db.session.commit()
+    return summary
+
+
+def _power_matrix(params: dict) -> Tuple[List[str], np.ndarray]:
+    """
+    Parse properties.parameter into a (parameter x day) float matrix in POWER_PARAMETERS
+    order, with fill values and gaps masked as NaN.
+    """
+    dates = sorted(set().union(*(params.get(name, {}).keys() for name in POWER_PARAMETERS)))
+    matrix = np.array(
+        [[params.get(name, {}).get(day, np.nan) for day in dates] for name in POWER_PARAMETERS],
+        dtype=float,
+    ).reshape(len(POWER_PARAMETERS), len(dates))
+    matrix[matrix <= POWER_FILL_VALUE] = np.nan
+    return dates, matrix
+
+
+def _longest_run(flags: np.ndarray) -> int:
+    """Length of the longest run of True values."""
+    if not flags.any():
+        return 0
+    edges = np.diff(np.concatenate(([0], flags.astype(np.int8), [0])))
+    return int((np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)).max())
+
+
 def summarize_climate_for_agriculture(power_json: dict) -> dict:
     """
-    Produce simple aggregates useful for recommendations.
+    Produce aggregates useful for recommendations: per-parameter means, temperature
+    extremes and percentiles, growing degree days, rainfall totals and dry spells.
+    NASA POWER fill values are ignored; metrics with no valid data are None.
     """
     if not power_json or 'properties' not in power_json:
         return {}
-    params = power_json['properties']['parameter']
-    def avg(series):
-        vals = list(series.values())
-        return sum(vals) / len(vals) if vals else None
+    _, matrix = _power_matrix(power_json['properties']['parameter'])
+    valid = ~np.isnan(matrix)
+    counts = valid.sum(axis=1)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN rows yield NaN
+        means = np.nanmean(matrix, axis=1)
+        mins = np.nanmin(matrix, axis=1) if matrix.shape[1] else np.full(len(matrix), np.nan)
+        maxs = np.nanmax(matrix, axis=1) if matrix.shape[1] else np.full(len(matrix), np.nan)
+        p10, p50, p90 = (np.nanpercentile(matrix, [10, 50, 90], axis=1) if matrix.shape[1]
+                         else np.full((3, len(matrix)), np.nan))
+
+    t2m, t2m_min, t2m_max, precip, rel_humidity, solar = range(len(POWER_PARAMETERS))
+    daily_mean = np.where(valid[t2m_min] & valid[t2m_max], (matrix[t2m_min] + matrix[t2m_max]) / 2, matrix[t2m])
+    gdd = np.nansum(np.clip(daily_mean - GDD_BASE_TEMP_C, 0, None)) if not np.isnan(daily_mean).all() else np.nan
+    dry_days = valid[precip] & (np.nan_to_num(matrix[precip], nan=np.inf) < DRY_DAY_PRECIP_MM)
+
+    def value(x):
+        return None if np.isnan(x) else float(x)
+
     return {
-        'avg_temp_c': avg(params.get('T2M', {})),
-        'avg_min_temp_c': avg(params.get('T2M_MIN', {})),
-        'avg_max_temp_c': avg(params.get('T2M_MAX', {})),
-        'avg_precip_mm': avg(params.get('PRECTOTCORR', {})),
-        'avg_rel_humidity': avg(params.get('RELHUM', {})),
-        'avg_solar_mj_m2': avg(params.get('ALLSKY_SFC_SW_DWN', {})),
+        'avg_temp_c': value(means[t2m]),
+        'avg_min_temp_c': value(means[t2m_min]),
+        'avg_max_temp_c': value(means[t2m_max]),
+        'avg_precip_mm': value(means[precip]),
+        'avg_rel_humidity': value(means[rel_humidity]),
+        'avg_solar_mj_m2': value(means[solar]),
+        'min_temp_c': value(mins[t2m_min]),
+        'max_temp_c': value(maxs[t2m_max]),
+        'temp_p10_c': value(p10[t2m]),
+        'temp_median_c': value(p50[t2m]),
+        'temp_p90_c': value(p90[t2m]),
+        'precip_p90_mm': value(p90[precip]),
+        'max_daily_precip_mm': value(maxs[precip]),
+        'total_precip_mm': value(np.nansum(matrix[precip])) if counts[precip] else None,
+        'rainy_days': int(valid[precip].sum() - dry_days.sum()),
+        'max_dry_spell_days': _longest_run(dry_days),
+        'growing_degree_days': value(gdd),
+        'valid_days': int(counts[t2m]),
     }
 
 
@@ -0,0 +1,122 @@
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
+
+
+CROP_DATA_PATH = os.path.join(os.path.dirname(__file__), 'data', 'crops.json')
+
+SOIL_TIERS = ('excellent', 'good', 'moderate')
+
+
+class CropKnowledgeBase:
+    """
+    Crop, soil and season reference data compiled into bitset indexes.
+    Each crop owns one bit; soil tiers, planting months and traits are stored as masks,
+    so membership tests and intersections are single integer operations.
+    """
+
+    def __init__(self, data: dict):
+        self.crops: Tuple[str, ...] = tuple(data['crops'])
+        self.bit: Dict[str, int] = {crop: 1 << i for i, crop in enumerate(self.crops)}
+        self.all_mask = (1 << len(self.crops)) - 1
+        self._crop_info = data['crops']
+        self._default_crop = data['default_crop']
+        self.default_soil = data['default_soil']
+        self.soils: Tuple[str, ...] = tuple(data['soils'])
+
+        self._soil_masks = {
+            soil: {tier: self.mask(tiers.get(tier, [])) for tier in SOIL_TIERS}
+            for soil, tiers in data['soils'].items()
+        }
+        # Seasonal tables by month, in their listed order: the season with its featured crops,
+        # and the crops in season for planting (which also drives seasonal scoring)
+        self._seasons_by_month = {int(month): entry['season'] for month, entry in data['seasons_by_month'].items()}
+        self._season_crops = {int(month): tuple(entry['recommended'])
+                              for month, entry in data['seasons_by_month'].items()}
+        self._month_crops = {int(month): tuple(crops) for month, crops in data['seasonal_crops_by_month'].items()}
+        listed = {crop for crops in (*self._season_crops.values(), *self._month_crops.values()) for crop in crops}
+        if listed - set(self.crops):
+            raise ValueError(f"Unknown crops in the seasonal tables of {CROP_DATA_PATH}: "
+                             f"{sorted(listed - set(self.crops))}")
+        self._month_masks = {month: self.mask(crops) for month, crops in self._month_crops.items()}
+        unknown = {t for info in self._crop_info.values() for t in info['traits']} - set(data['traits'])
+        if unknown:
+            raise ValueError(f"Undeclared crop traits in {CROP_DATA_PATH}: {sorted(unknown)}")
+        self._trait_masks = {
+            trait: self.mask(crop for crop, info in self._crop_info.items() if trait in info['traits'])
+            for trait in data['traits']
+        }
+
+    def mask(self, crops: Iterable[str]) -> int:
+        m = 0
+        for crop in crops:
+            m |= self.bit.get(crop, 0)
+        return m
+
+    @lru_cache(maxsize=1024)
+    def names(self, mask: int) -> Tuple[str, ...]:
+        """Crops in a mask, in catalogue order."""
+        return tuple(crop for crop in self.crops if mask & self.bit[crop])
+
+    # Soil
+    def soil_mask(self, soil_type: str, tiers: Tuple[str, ...] = ('excellent', 'good')) -> int:
+        masks = self._soil_masks.get(soil_type) or self._soil_masks[self.default_soil]
+        m = 0
+        for tier in tiers:
+            m |= masks[tier]
+        return m
+
+    def soil_tiers(self, soil_type: str) -> Dict[str, Tuple[str, ...]]:
+        return {tier: self.names(self.soil_mask(soil_type, (tier,))) for tier in SOIL_TIERS}
+
+    def suitable_crops(self, soil_type: str) -> Tuple[str, ...]:
+        return self.names(self.soil_mask(soil_type))
+
+    # Seasons
+    def season_for_month(self, month: int) -> str:
+        return self._seasons_by_month.get(month, 'Unknown')
+
+    def month_mask(self, month: int) -> int:
+        return self._month_masks.get(month, 0)
+
+    def crops_for_month(self, month: int) -> Tuple[str, ...]:
+        return self._month_crops.get(month, ())
+
+    def season_crops(self, month: int) -> Tuple[str, ...]:
+        """Crops featured for the month's season."""
+        return self._season_crops.get(month, ())
+
+    def season_window(self, crop: str) -> dict:
+        info = self._crop_info.get(crop, self._default_crop)
+        return {
+            'optimal_months': info['planting_months'],
+            'season': info['season'],
+            'planting_window': info['planting_window'],
+            'harvest_window': info['harvest_window'],
+        }
+
+    # Traits and descriptions
+    def trait_mask(self, trait: str) -> int:
+        return self._trait_masks[trait]
+
+    def with_trait(self, trait: str) -> Tuple[str, ...]:
+        return self.names(self._trait_masks[trait])
+
+    def has_trait(self, crop: str, trait: str) -> bool:
+        return bool(self.bit.get(crop, 0) & self._trait_masks[trait])
+
+    def ecological_impact(self, crop: str) -> str:
+        return self._crop_info.get(crop, self._default_crop)['ecological_impact']
+
+    def success_factors(self, crop: str) -> List[str]:
+        return list(self._crop_info.get(crop, self._default_crop)['success_factors'])
+
+
+def load_knowledge_base(path: str = CROP_DATA_PATH) -> CropKnowledgeBase:
+    with open(path) as f:
+        return CropKnowledgeBase(json.load(f))
+
+
+# Compiled once at import; every recommendation path reads from this
+KNOWLEDGE_BASE = load_knowledge_base()
@@ -0,0 +1,230 @@
+"""
+Streaming exports of farms, recommendations and market snapshots as CSV, NDJSON or Parquet.
+
+Rows are read through a server-side cursor (yield_per) EXPORT_BATCH_ROWS at a time, and each
+batch is encoded and handed on before the next is fetched, so memory stays flat however many
+rows are exported:
+
+    with open('recs.csv', 'wb') as out:
+        for chunk in export_stream('recommendations', 'csv', {'soil_type': 'Loam'}):
+            out.write(chunk)
+
+Parquet needs the optional pyarrow package; each batch becomes one row group.
+"""
+import csv
+import datetime
+import io
+import json
+from typing import Callable, Dict, Iterator, Optional
+
+from sqlalchemy import select
+
+from models import db, FarmProfile, MarketStat, Recommendation, RecommendationRun, User
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional; CSV and NDJSON are always available
+    pyarrow = None
+
+
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+EXPORT_BATCH_ROWS = 5000
+EXPORT_MEDIA_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def _date(value: str) -> datetime.date:
+    return datetime.date.fromisoformat(value)
+
+
+def _flag(value: str) -> bool:
+    return value.lower() in ('1', 'true', 'yes')
+
+
+def _farms(filters: Dict):
+    query = (select(FarmProfile.id, FarmProfile.user_id, User.username.label('owner'), FarmProfile.location_name,
+                    FarmProfile.soil_type, FarmProfile.latitude, FarmProfile.longitude, FarmProfile.geohash,
+                    FarmProfile.created_at)
+             .join(User, User.id == FarmProfile.user_id)
+             .order_by(FarmProfile.id))
+    if 'soil_type' in filters:
+        query = query.where(FarmProfile.soil_type == filters['soil_type'])
+    if 'user_id' in filters:
+        query = query.where(FarmProfile.user_id == filters['user_id'])
+    if 'since' in filters:
+        query = query.where(FarmProfile.created_at >= filters['since'])
+    return query
+
+
+def _recommendations(filters: Dict):
+    query = (select(Recommendation.id, Recommendation.farm_id, Recommendation.run_id, Recommendation.is_current,
+                    Recommendation.crop_name, Recommendation.soil_type, Recommendation.ai_score,
+                    Recommendation.market_demand_score, Recommendation.profitability_estimate,
+                    Recommendation.cost_estimate, Recommendation.ecological_impact, Recommendation.rationale,
+                    RecommendationRun.latitude, RecommendationRun.longitude,
+                    *(getattr(RecommendationRun, column) for column in RecommendationRun.CLIMATE_COLUMNS),
+                    RecommendationRun.market_as_of, Recommendation.created_at)
+             .outerjoin(RecommendationRun, RecommendationRun.id == Recommendation.run_id)
+             .order_by(Recommendation.id))
+    if not filters.get('history'):
+        query = query.where(Recommendation.is_current)
+    if 'crop' in filters:
+        query = query.where(Recommendation.crop_name == filters['crop'])
+    if 'soil_type' in filters:
+        query = query.where(Recommendation.soil_type == filters['soil_type'])
+    if 'farm_id' in filters:
+        query = query.where(Recommendation.farm_id == filters['farm_id'])
+    if 'since' in filters:
+        query = query.where(Recommendation.created_at >= filters['since'])
+    return query
+
+
+def _market(filters: Dict):
+    query = select(*MarketStat.__table__.columns).order_by(MarketStat.id)
+    if 'crop' in filters:
+        query = query.where(MarketStat.crop == filters['crop'])
+    if 'region' in filters:
+        query = query.where(MarketStat.region == filters['region'])
+    if 'since' in filters:
+        query = query.where(MarketStat.as_of >= filters['since'])
+    if 'until' in filters:
+        query = query.where(MarketStat.as_of <= filters['until'])
+    return query
+
+
+# dataset -> (query builder, {filter name: parser})
+EXPORT_DATASETS: Dict[str, tuple] = {
+    'farms': (_farms, {'soil_type': str, 'user_id': int, 'since': _date}),
+    'recommendations': (_recommendations, {'history': _flag, 'crop': str, 'soil_type': str, 'farm_id': int,
+                                           'since': _date}),
+    'market': (_market, {'crop': str, 'region': str, 'since': _date, 'until': _date}),
+}
+
+
+def export_query(dataset: str, filters: Optional[Dict[str, str]] = None):
+    """SELECT for a dataset, with string filter values parsed; raises ValueError on unknown or bad ones."""
+    if dataset not in EXPORT_DATASETS:
+        raise ValueError(f"dataset must be one of: {', '.join(EXPORT_DATASETS)}")
+    build, parsers = EXPORT_DATASETS[dataset]
+    parsed = {}
+    for name, value in (filters or {}).items():
+        if name not in parsers:
+            raise ValueError(f"{dataset} filters are: {', '.join(parsers)}")
+        try:
+            parsed[name] = parsers[name](value)
+        except ValueError:
+            raise ValueError(f'invalid {name}: {value!r}')
+    return build(parsed)
+
+
+def _batches(query) -> Iterator[list]:
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_ROWS))
+    yield list(result.keys())
+    for rows in result.partitions():
+        yield rows
+
+
+def _text(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv(query) -> Iterator[bytes]:
+    batches = _batches(query)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(next(batches))
+    for rows in batches:
+        writer.writerows([[_text(value) for value in row] for row in rows])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # header only
+        yield buffer.getvalue().encode()
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _ndjson(query) -> Iterator[bytes]:
+    batches = _batches(query)
+    keys = next(batches)
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(keys, row)), default=_json_value) + '\n' for row in rows).encode()
+
+
+class _ChunkSink:
+    """Write-only file object that keeps what pyarrow writes until it is taken and streamed."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def writable(self) -> bool:
+        return True
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_schema(query):
+    types = {int: pyarrow.int64(), float: pyarrow.float64(), str: pyarrow.string(), bool: pyarrow.bool_(),
+             datetime.datetime: pyarrow.timestamp('us'), datetime.date: pyarrow.date32()}
+    return pyarrow.schema([(column.name, types.get(column.type.python_type, pyarrow.string()))
+                           for column in query.selected_columns])
+
+
+def _parquet(query) -> Iterator[bytes]:
+    schema = _arrow_schema(query)
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='zstd')
+    batches = _batches(query)
+    keys = next(batches)
+    for rows in batches:
+        writer.write_table(pyarrow.Table.from_pydict(
+            {key: [row[i] for row in rows] for i, key in enumerate(keys)}, schema=schema))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+_ENCODERS: Dict[str, Callable] = {'csv': _csv, 'ndjson': _ndjson, 'parquet': _parquet}
+
+
+def export_stream(dataset: str, fmt: str, filters: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
+    """
+    Encoded chunks of a dataset export. Arguments are checked before anything is read, so a
+    ValueError is raised here rather than part-way through the stream.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if fmt == 'parquet' and pyarrow is None:
+        raise ValueError('parquet export needs the pyarrow package')
+    return _ENCODERS[fmt](export_query(dataset, filters))
@@ -1,87 +1,330 @@
+import abc
+import csv
 import datetime
-from typing import List, Dict, Optional
-
-
-def fetch_market_prices_stub(crop_names: List[str], region: Optional[str] = None) -> Dict:
-    """Enhanced market data simulation with realistic trends and insights."""
-    import random
-    
-    # Base prices in INR per quintal (more realistic for Indian market)
-    base_prices = {
-        'Wheat': 2200,
-        'Maize': 1800,
-        'Rice': 2500,
-        'Millet': 1500,
-        'Soybean': 4000,
-        'Chickpea': 5000,
-        'Lentil': 5200,
-        'Mustard': 4500,
-        'Cotton': 6000,
-    }
-    
-    # Market volatility factors
-    volatility = {
-        'Wheat': 0.05,
-        'Maize': 0.08,
-        'Rice': 0.06,
-        'Millet': 0.10,
-        'Soybean': 0.12,
-        'Chickpea': 0.15,
-        'Lentil': 0.18,
-        'Mustard': 0.14,
-        'Cotton': 0.20,
-    }
-    
-    data = {}
+import logging
+import math
+import os
+import random
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, MarketPrice, MarketStat
+
+
+DEFAULT_MARKET_REGION = 'national'
+MARKET_WINDOW_DAYS = 30  # trend series covers as_of - 30 .. as_of
+
+# Base prices in INR per quintal (more realistic for Indian market)
+BASE_PRICES = {
+    'Wheat': 2200,
+    'Maize': 1800,
+    'Rice': 2500,
+    'Millet': 1500,
+    'Soybean': 4000,
+    'Chickpea': 5000,
+    'Lentil': 5200,
+    'Mustard': 4500,
+    'Cotton': 6000,
+}
+
+# Market volatility factors
+VOLATILITY = {
+    'Wheat': 0.05,
+    'Maize': 0.08,
+    'Rice': 0.06,
+    'Millet': 0.10,
+    'Soybean': 0.12,
+    'Chickpea': 0.15,
+    'Lentil': 0.18,
+    'Mustard': 0.14,
+    'Cotton': 0.20,
+}
+
+# Assembled market snapshots per region, keyed on the region's market_snapshot_version, so a
+# change to the store made by any process (a price CSV load, stats computed elsewhere) gives a
+# new key and the snapshot is rebuilt rather than served until midnight. Crops already looked
+# up for a key are remembered even when they have no stats (the provider has no prices for
+# them), so they don't send every later call back to the store. Request threads and the
+# FarmDataContext fetch pool share these: hold the lock, and swap in new dicts rather than
+# changing ones a reader may hold.
+_snapshot_cache: Dict[tuple, Dict] = {}
+_snapshot_crops: Dict[tuple, frozenset] = {}
+_snapshot_lock = threading.Lock()
+
+
+def _clear_snapshots() -> None:
+    with _snapshot_lock:
+        _snapshot_cache.clear()
+        _snapshot_crops.clear()
+
+
+class MarketDataProvider(abc.ABC):
+    """Source of daily (crop, date, price) observations for a region."""
+
+    @abc.abstractmethod
+    def daily_prices(self, crop_names: List[str], region: str, start: datetime.date,
+                     end: datetime.date) -> Iterable[Tuple[str, datetime.date, float]]:
+        raise NotImplementedError
+
+
+class SimulatedMarketProvider(MarketDataProvider):
+    """Deterministic price simulation: the same crop, region and day always yield the same price."""
+
+    def daily_prices(self, crop_names, region, start, end):
+        for crop in crop_names:
+            for offset in range((end - start).days + 1):
+                day = start + datetime.timedelta(days=offset)
+                yield crop, day, simulated_price(crop, region, day)
+
+
+_provider: MarketDataProvider = SimulatedMarketProvider()
+
+
+def get_market_provider() -> MarketDataProvider:
+    return _provider
+
+
+def set_market_provider(provider: MarketDataProvider) -> None:
+    global _provider
+    _provider = provider
+    _clear_snapshots()
+
+
+def configure_market_provider(app) -> None:
+    """Use the HTTP market feed when MARKET_PROVIDER_URL is set, the simulation otherwise."""
+    url = os.environ.get('MARKET_PROVIDER_URL') or app.config.get('MARKET_PROVIDER_URL')
+    if url:
+        from services.market_http import HttpMarketProvider
+        set_market_provider(HttpMarketProvider(url))
+
+
+def simulated_price(crop: str, region: str, day: datetime.date) -> float:
+    """Seasonal base price with smooth cyclic swings and small daily noise, seeded per crop/region/day."""
+    base_price = BASE_PRICES.get(crop, 2000)
+    vol = VOLATILITY.get(crop, 0.10)
+
+    # Seasonal adjustment (example: higher prices in harvest season)
+    seasonal_factor = 1.0
+    if day.month in [10, 11, 12]:  # Harvest season
+        seasonal_factor = 1.1
+    elif day.month in [6, 7, 8]:  # Monsoon season
+        seasonal_factor = 0.95
+
+    phase = (zlib.crc32(f"{crop}|{region}".encode()) % 360) * math.pi / 180
+    t = day.toordinal()
+    cycle = 0.6 * math.sin(2 * math.pi * t / 45 + phase) + 0.4 * math.sin(2 * math.pi * t / 11 + 2 * phase)
+    noise = random.Random(f"{crop}|{region}|{day.isoformat()}").uniform(-1, 1)
+    return round(base_price * seasonal_factor * (1 + vol * (0.7 * cycle + 0.3 * noise)), 2)
+
+
+def _compute_stats(crop: str, region: str, as_of: datetime.date, series: List[dict]) -> MarketStat:
+    vol = VOLATILITY.get(crop, 0.10)
+
+    # Calculate demand index based on price trend and volatility
+    price_change = (series[-1]['price'] - series[0]['price']) / series[0]['price']
+    demand_index = max(0.1, min(0.9, 0.5 + price_change * 2))
+
+    return MarketStat(
+        crop=crop,
+        region=region,
+        as_of=as_of,
+        latest_price=series[-1]['price'],
+        demand_index=demand_index,
+        price_change_pct=round(price_change * 100, 2),
+        trend='upward' if price_change > 0.02 else 'downward' if price_change < -0.02 else 'stable',
+        volatility='high' if vol > 0.15 else 'medium' if vol > 0.08 else 'low',
+        seasonality='harvest' if as_of.month in [10, 11, 12] else 'monsoon' if as_of.month in [6, 7, 8] else 'normal',
+        support_level=round(series[-1]['price'] * 0.9, 2),
+        resistance_level=round(series[-1]['price'] * 1.1, 2),
+    )
+
+
+def _load_series(crop_names: List[str], region: str, as_of: datetime.date) -> Dict[str, List[dict]]:
+    start = as_of - datetime.timedelta(days=MARKET_WINDOW_DAYS)
+    series = {crop: [] for crop in crop_names}
+    rows = (MarketPrice.query
+            .with_entities(MarketPrice.crop, MarketPrice.date, MarketPrice.price)
+            .filter(MarketPrice.region == region, MarketPrice.crop.in_(crop_names),
+                    MarketPrice.date >= start, MarketPrice.date <= as_of)
+            .order_by(MarketPrice.crop, MarketPrice.date))
+    for crop, day, price in rows:
+        series[crop].append({'date': day.isoformat(), 'price': price})
+    return series
+
+
+def refresh_market_store(crop_names: List[str], region: str = DEFAULT_MARKET_REGION,
+                         as_of: Optional[datetime.date] = None,
+                         provider: Optional[MarketDataProvider] = None) -> int:
+    """
+    Make sure the price window ending on as_of is stored for each crop (asking the provider
+    only for missing days) and precompute that day's stats. Returns the number of stats rows added.
+    """
+    as_of = as_of or datetime.date.today()
+    start = as_of - datetime.timedelta(days=MARKET_WINDOW_DAYS)
+    provider = provider or get_market_provider()
+
+    have = {(crop, day) for crop, day in MarketPrice.query
+            .with_entities(MarketPrice.crop, MarketPrice.date)
+            .filter(MarketPrice.region == region, MarketPrice.crop.in_(crop_names),
+                    MarketPrice.date >= start, MarketPrice.date <= as_of)}
+    window = [start + datetime.timedelta(days=d) for d in range(MARKET_WINDOW_DAYS + 1)]
+    incomplete = [crop for crop in crop_names if any((crop, day) not in have for day in window)]
+    if incomplete:
+        db.session.add_all(
+            MarketPrice(crop=crop, region=region, date=day, price=price)
+            for crop, day, price in provider.daily_prices(incomplete, region, start, as_of)
+            if (crop, day) not in have
+        )
+        db.session.flush()
+
+    computed = {crop for (crop,) in MarketStat.query.with_entities(MarketStat.crop)
+                .filter(MarketStat.region == region, MarketStat.as_of == as_of, MarketStat.crop.in_(crop_names))}
+    added = 0
+    for crop, series in _load_series([c for c in crop_names if c not in computed], region, as_of).items():
+        if series:
+            db.session.add(_compute_stats(crop, region, as_of, series))
+            added += 1
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # another worker refreshed the same day concurrently
+        db.session.rollback()
+    return added
+
+
+def load_market_prices_csv(path: str, default_region: str = DEFAULT_MARKET_REGION) -> int:
+    """
+    Upsert daily prices from a CSV with crop, date (YYYY-MM-DD), price and optional region
+    columns. Stats for the affected days are dropped so they are recomputed. Returns rows read.
+    """
+    prices = {}
+    with open(path, newline='') as f:
+        for record in csv.DictReader(f):
+            crop = record['crop'].strip()
+            region = (record.get('region') or '').strip() or default_region
+            prices[(crop, region, datetime.date.fromisoformat(record['date'].strip()))] = float(record['price'])
+    if not prices:
+        return 0
+
+    first_day = min(day for _, _, day in prices)
+    last_day = max(day for _, _, day in prices)
+    crops = {crop for crop, _, _ in prices}
+    regions = {region for _, region, _ in prices}
+    existing = {(row.crop, row.region, row.date): row for row in MarketPrice.query.filter(
+        MarketPrice.crop.in_(crops), MarketPrice.region.in_(regions),
+        MarketPrice.date >= first_day, MarketPrice.date <= last_day)}
+    for key, price in prices.items():
+        if key in existing:
+            existing[key].price = price
+        else:
+            crop, region, day = key
+            db.session.add(MarketPrice(crop=crop, region=region, date=day, price=price))
+
+    MarketStat.query.filter(
+        MarketStat.crop.in_(crops), MarketStat.region.in_(regions),
+        MarketStat.as_of >= first_day,
+        MarketStat.as_of <= last_day + datetime.timedelta(days=MARKET_WINDOW_DAYS),
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    _clear_snapshots()
+    return len(prices)
+
+
+def market_snapshot_version(crop_names: Optional[List[str]] = None, region: Optional[str] = None) -> tuple:
+    """
+    Cheap stand-in for the content of fetch_market_prices(crop_names, region) (None: every
+    crop): the day, the newest stats stored for those crops and a checksum of the prices in
+    today's window, so reloaded prices or recomputed stats change it even when row ids are
+    reused. One aggregate query, so a conditional request can be answered without assembling
+    (or refreshing) the snapshot.
+    """
+    region = region or DEFAULT_MARKET_REGION
+    today = datetime.date.today()
+    stats = MarketStat.query.filter(MarketStat.region == region)
+    prices = MarketPrice.query.filter(MarketPrice.region == region,
+                                      MarketPrice.date >= today - datetime.timedelta(days=MARKET_WINDOW_DAYS),
+                                      MarketPrice.date <= today)
+    if crop_names is not None:
+        stats = stats.filter(MarketStat.crop.in_(crop_names))
+        prices = prices.filter(MarketPrice.crop.in_(crop_names))
+    stats = stats.with_entities(db.func.max(MarketStat.as_of), db.func.max(MarketStat.id),
+                                db.func.count(MarketStat.id), db.func.sum(MarketStat.latest_price)).subquery()
+    prices = prices.with_entities(db.func.count(MarketPrice.id), db.func.sum(MarketPrice.price)).subquery()
+    # both sides are one aggregate row; the explicit join says the product is intended
+    row = db.session.query(stats, prices).join(prices, db.true()).one()
+    latest, last_id, stat_count, stat_sum, price_count, price_sum = row
+    return (today.isoformat(), region, latest.isoformat() if latest else None, last_id, stat_count,
+            round(stat_sum or 0.0, 2), price_count, round(price_sum or 0.0, 2))
+
+
+def fetch_market_prices(crop_names: List[str], region: Optional[str] = None) -> Dict:
+    """
+    Market snapshot per crop from the price store: latest price, 31-day trend series,
+    demand index, trend insights and support/resistance levels.
+    Stats are computed once per day; later calls are served from memory, including for
+    crops that turned out to have no prices that day.
+    """
+    region = region or DEFAULT_MARKET_REGION
     today = datetime.date.today()
-    
-    for crop in crop_names:
-        base_price = base_prices.get(crop, 2000)
-        vol = volatility.get(crop, 0.10)
-        
-        # Generate realistic price series with seasonal trends
-        series = []
-        for i in range(31):
-            date = today - datetime.timedelta(days=30 - i)
-            
-            # Seasonal adjustment (example: higher prices in harvest season)
-            seasonal_factor = 1.0
-            if date.month in [10, 11, 12]:  # Harvest season
-                seasonal_factor = 1.1
-            elif date.month in [6, 7, 8]:  # Monsoon season
-                seasonal_factor = 0.95
-            
-            # Random walk with trend
-            trend = 0.001 * i  # Slight upward trend
-            random_factor = random.uniform(-vol, vol)
-            price = base_price * seasonal_factor * (1 + trend + random_factor)
-            
-            series.append({
-                'date': date.isoformat(),
-                'price': round(price, 2)
-            })
-        
-        # Calculate demand index based on price trend and volatility
-        price_change = (series[-1]['price'] - series[0]['price']) / series[0]['price']
-        demand_index = max(0.1, min(0.9, 0.5 + price_change * 2))
-        
-        # Market insights
-        market_insights = {
-            'trend': 'upward' if price_change > 0.02 else 'downward' if price_change < -0.02 else 'stable',
-            'volatility': 'high' if vol > 0.15 else 'medium' if vol > 0.08 else 'low',
-            'seasonality': 'harvest' if today.month in [10, 11, 12] else 'monsoon' if today.month in [6, 7, 8] else 'normal'
-        }
-        
-        data[crop] = {
-            'latest_price': series[-1]['price'],
-            'trend_series': series,
-            'demand_index': demand_index,
-            'price_change_pct': round(price_change * 100, 2),
-            'market_insights': market_insights,
-            'support_level': round(series[-1]['price'] * 0.9, 2),
-            'resistance_level': round(series[-1]['price'] * 1.1, 2)
-        }
-    
-    return data
+    key = market_snapshot_version(None, region)
+    with _snapshot_lock:
+        snapshot = _snapshot_cache.get(key, {})
+        looked_up = _snapshot_crops.get(key, frozenset())
 
+    if any(crop not in looked_up for crop in crop_names):
+        as_of = today
+        stats = {s.crop: s for s in MarketStat.query.filter(
+            MarketStat.region == region, MarketStat.as_of == as_of, MarketStat.crop.in_(crop_names))}
+        if any(crop not in stats and crop not in looked_up for crop in crop_names):
+            logging.info(f"Refreshing market store for {region} as of {as_of}")
+            try:
+                refresh_market_store(crop_names, region, as_of)
+            except Exception as e:
+                # Feed down: serve the most recent day we have rather than nothing
+                db.session.rollback()
+                as_of = (MarketStat.query.with_entities(db.func.max(MarketStat.as_of))
+                         .filter(MarketStat.region == region, MarketStat.crop.in_(crop_names)).scalar())
+                if as_of is None:
+                    raise
+                logging.warning(f"Market refresh failed, serving stats as of {as_of}: {str(e)}")
+            stats = {s.crop: s for s in MarketStat.query.filter(
+                MarketStat.region == region, MarketStat.as_of == as_of, MarketStat.crop.in_(crop_names))}
+        series = _load_series(list(stats), region, as_of)
+        fresh = {}
+        for crop, stat in stats.items():
+            fresh[crop] = {
+                'latest_price': stat.latest_price,
+                'trend_series': series[crop],
+                'demand_index': stat.demand_index,
+                'price_change_pct': stat.price_change_pct,
+                'market_insights': {
+                    'trend': stat.trend,
+                    'volatility': stat.volatility,
+                    'seasonality': stat.seasonality,
+                },
+                'support_level': stat.support_level,
+                'resistance_level': stat.resistance_level,
+                'as_of': as_of.isoformat(),
+            }
+        snapshot = {**snapshot, **fresh}
+        if as_of == today:
+            # a failed refresh is not remembered, so the next call tries the feed again; a
+            # refresh changes the store, so what was built is kept under the version after it
+            stored_key = market_snapshot_version(None, region)
+            with _snapshot_lock:
+                if stored_key == key:
+                    _snapshot_cache[stored_key] = {**_snapshot_cache.get(key, {}), **fresh}
+                    _snapshot_crops[stored_key] = _snapshot_crops.get(key, frozenset()) | frozenset(crop_names)
+                else:
+                    # entries cached under the old version may be stale; keep only what was just read
+                    _snapshot_cache[stored_key] = fresh
+                    _snapshot_crops[stored_key] = frozenset(crop_names)
+                for stale in [stale for stale in _snapshot_cache
+                              if stale != stored_key and (stale[1] == region or stale[0] != today.isoformat())]:
+                    del _snapshot_cache[stale]
+                    _snapshot_crops.pop(stale, None)
 
+    return {crop: snapshot[crop] for crop in crop_names if crop in snapshot}
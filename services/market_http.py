@@ -0,0 +1,157 @@
+import asyncio
+import datetime
+import logging
+import random
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import httpx
+
+from services.market import MarketDataProvider
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream that has been failing."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for `reset_timeout`
+    seconds, then lets a single trial call through (half-open) to decide whether to close again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self._opened_at >= self.reset_timeout else 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """End a call that says nothing about upstream health, freeing the half-open trial slot."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class HttpMarketProvider(MarketDataProvider):
+    """
+    Market feed client. Expects GET {base_url}/prices?crops=A,B&region=R&start=YYYY-MM-DD&end=YYYY-MM-DD
+    to answer {"prices": [{"crop": ..., "date": ..., "price": ...}, ...]}.
+
+    Crops are requested in batches that run concurrently over one pooled async client living
+    on a background event loop, so connections are reused across calls. Transient failures
+    are retried with exponential backoff and full jitter behind a circuit breaker.
+    """
+
+    RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, base_url: str, batch_size: int = 10, timeout: float = 5.0, max_retries: int = 3,
+                 backoff: float = 0.2, max_connections: int = 20, breaker: Optional[CircuitBreaker] = None):
+        self.base_url = base_url.rstrip('/')
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.breaker = breaker or CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='market-http', daemon=True)
+        self._thread.start()
+
+    def daily_prices(self, crop_names, region, start, end):
+        future = asyncio.run_coroutine_threadsafe(self._fetch_all(list(crop_names), region, start, end), self._loop)
+        return future.result(timeout=self.timeout * (self.max_retries + 1) * 2)
+
+    def close(self) -> None:
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result(timeout=self.timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    async def _fetch_all(self, crop_names: List[str], region: str, start: datetime.date,
+                         end: datetime.date) -> List[Tuple[str, datetime.date, float]]:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        batches = [crop_names[i:i + self.batch_size] for i in range(0, len(crop_names), self.batch_size)]
+        results = await asyncio.gather(*(self._fetch_batch(batch, region, start, end) for batch in batches))
+        return [row for batch in results for row in batch]
+
+    async def _fetch_batch(self, crops: List[str], region: str, start: datetime.date,
+                           end: datetime.date) -> List[Tuple[str, datetime.date, float]]:
+        params = {'crops': ','.join(crops), 'region': region, 'start': start.isoformat(), 'end': end.isoformat()}
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Market feed {self.base_url} is unavailable (circuit open)")
+            try:
+                resp = await self._client.get('/prices', params=params)
+                if resp.status_code in self.RETRYABLE_STATUS:
+                    raise httpx.HTTPStatusError(f"Retryable status {resp.status_code}",
+                                                request=resp.request, response=resp)
+                resp.raise_for_status()
+                rows = [(p['crop'], datetime.date.fromisoformat(p['date']), float(p['price']))
+                        for p in resp.json()['prices']]
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in self.RETRYABLE_STATUS:
+                    # the feed answered and rejected the request: a caller error, not an outage
+                    self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+            except httpx.TransportError:
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    raise
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception:
+                # malformed payload; counted so a half-open trial always settles the breaker
+                self.breaker.record_failure()
+                raise
+            else:
+                self.breaker.record_success()
+                return rows
+            delay = random.uniform(0, self.backoff * 2 ** attempt)
+            logger.warning(f"Market feed request for {params['crops']} failed, retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        return []
@@ -0,0 +1,83 @@
+"""
+Local stand-in for a market price feed, speaking the protocol HttpMarketProvider expects.
+Prices come from the deterministic simulation; latency and failures can be injected.
+
+    python -m services.market_standin --port 8765 --latency 0.2 --failure-rate 0.1
+"""
+import argparse
+import datetime
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+from urllib.parse import parse_qs, urlparse
+
+from services.market import simulated_price
+
+
+class StandinMarketHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so client connection pooling is exercised
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/prices':
+            return self._send(404, {'error': 'not found'})
+        server = self.server
+        server.request_count += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if server.failure_rate and random.random() < server.failure_rate:
+            return self._send(503, {'error': 'injected failure'})
+        try:
+            query = parse_qs(url.query)
+            crops = [c for c in query['crops'][0].split(',') if c]
+            region = query.get('region', ['national'])[0]
+            start = datetime.date.fromisoformat(query['start'][0])
+            end = datetime.date.fromisoformat(query['end'][0])
+        except (KeyError, ValueError) as e:
+            return self._send(400, {'error': f'bad request: {e}'})
+        prices = []
+        for crop in crops:
+            for offset in range((end - start).days + 1):
+                day = start + datetime.timedelta(days=offset)
+                prices.append({'crop': crop, 'date': day.isoformat(), 'price': simulated_price(crop, region, day)})
+        self._send(200, {'prices': prices})
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_standin_server(port: int = 0, latency: float = 0.0,
+                         failure_rate: float = 0.0) -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stand-in feed on a background thread; returns the server and its base URL."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StandinMarketHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.request_count = 0
+    threading.Thread(target=server.serve_forever, name='market-standin', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response.')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with 503.')
+    args = parser.parse_args()
+    server, url = start_standin_server(args.port, args.latency, args.failure_rate)
+    print(f"Stand-in market feed listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,147 @@
+"""
+Regional rollups of current recommendations.
+
+recommendation_rollups holds, per (region, soil type, month, crop), the count and the sums of
+AI score, profitability, cost and demand of the farms' current recommendations. Region is the
+farm's geohash cell (ROLLUP_PRECISION characters, roughly 39 x 20 km) and month the month
+the recommendation was generated. The rollups are kept current in the same transaction as
+the recommendation writes: rows retired by a new run are subtracted and the new rows added,
+so regional dashboards read a table whose size does not grow with the recommendations.
+Only rows that belong to a run are counted (rows written before runs existed are not).
+"""
+import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, Recommendation, RecommendationRollup, RecommendationRun
+from services.geohash import encode_geohash
+
+
+ROLLUP_PRECISION = 4
+ROLLUP_DIMENSIONS = ('region', 'soil_type', 'month', 'crop_name')
+_KEY = ROLLUP_DIMENSIONS
+_SUMS = ('recommendation_count', 'ai_score_sum', 'profitability_sum', 'cost_sum', 'demand_sum')
+
+# (region, soil_type, month, crop_name) -> [count, ai_score, profitability, cost, demand]
+RollupDeltas = Dict[Tuple[str, str, str, str], List[float]]
+
+
+def _add(deltas: RollupDeltas, sign: int, soil_type: str, latitude: float, longitude: float,
+         created_at: datetime.datetime, crop_name: str, ai_score, profitability, cost, demand) -> None:
+    key = (encode_geohash(latitude, longitude, ROLLUP_PRECISION), soil_type, created_at.strftime('%Y-%m'),
+           crop_name)
+    values = (1, ai_score or 0.0, profitability or 0.0, cost or 0.0, demand or 0.0)
+    totals = deltas.setdefault(key, [0, 0.0, 0.0, 0.0, 0.0])
+    for i, value in enumerate(values):
+        totals[i] += sign * value
+
+
+def _current_rows(conn, farm_ids: Optional[Sequence[int]] = None):
+    rec = Recommendation.__table__
+    run = RecommendationRun.__table__
+    query = (select(run.c.soil_type, run.c.latitude, run.c.longitude, rec.c.created_at, rec.c.crop_name,
+                    rec.c.ai_score, rec.c.profitability_estimate, rec.c.cost_estimate, rec.c.market_demand_score)
+             .join(run, rec.c.run_id == run.c.id)
+             .where(rec.c.is_current))
+    if farm_ids is not None:
+        query = query.where(rec.c.farm_id.in_(farm_ids))
+    return conn.execute(query)
+
+
+def current_rollup_deltas(conn, farm_ids: Optional[Sequence[int]], sign: int = -1) -> RollupDeltas:
+    """Deltas for the farms' (None: all farms') current recommendations; by default to subtract them."""
+    deltas: RollupDeltas = {}
+    rows = _current_rows(conn, farm_ids)
+    for soil, lat, lon, created_at, crop, ai_score, profit, cost, demand in rows:
+        if soil is None or lat is None or lon is None or created_at is None:
+            continue
+        _add(deltas, sign, soil, lat, lon, created_at, crop, ai_score, profit, cost, demand)
+    return deltas
+
+
+def add_run_deltas(deltas: RollupDeltas, runs: Iterable[Tuple[dict, List[dict]]]) -> RollupDeltas:
+    """Add the rows of new runs (run and row column values, created_at set) to deltas."""
+    for run, rows in runs:
+        for row in rows:
+            _add(deltas, 1, run['soil_type'], run['latitude'], run['longitude'], row['created_at'],
+                 row['crop_name'], row.get('ai_score'), row.get('profitability_estimate'),
+                 row.get('cost_estimate'), row.get('market_demand_score'))
+    return deltas
+
+
+def apply_rollup_deltas(conn, deltas: RollupDeltas) -> None:
+    """Add deltas to the rollup table in one upsert, then drop keys left with no recommendations."""
+    changes = [dict(zip(_KEY, key), **dict(zip(_SUMS, values)), updated_at=datetime.datetime.utcnow())
+               for key, values in deltas.items() if any(values)]
+    if not changes:
+        return
+    table = RecommendationRollup.__table__
+    dialect = {'postgresql': postgresql, 'sqlite': sqlite}.get(conn.dialect.name)
+    if dialect is not None:
+        stmt = dialect.insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(_KEY),
+            set_={**{column: table.c[column] + stmt.excluded[column] for column in _SUMS},
+                  'updated_at': stmt.excluded.updated_at})
+        conn.execute(stmt, changes)
+    else:
+        for change in changes:
+            matched = conn.execute(
+                update(table).where(and_(*(table.c[column] == change[column] for column in _KEY)))
+                .values({**{column: table.c[column] + change[column] for column in _SUMS},
+                         'updated_at': change['updated_at']})).rowcount
+            if not matched:
+                conn.execute(insert(table).values(change))
+    conn.execute(delete(table).where(table.c.recommendation_count <= 0))
+
+
+def remove_farms_from_rollups(conn, farm_ids: Sequence[int]) -> None:
+    """Subtract the farms' current recommendations, e.g. before the farms are deleted."""
+    apply_rollup_deltas(conn, current_rollup_deltas(conn, farm_ids))
+
+
+def rebuild_rollups(conn) -> int:
+    """Recompute the whole rollup table from current recommendations; returns the keys written."""
+    deltas = current_rollup_deltas(conn, None, sign=1)
+    conn.execute(delete(RecommendationRollup.__table__))
+    apply_rollup_deltas(conn, deltas)
+    return len(deltas)
+
+
+def query_rollups(group_by: Sequence[str], region_precision: int = ROLLUP_PRECISION,
+                  month_from: Optional[str] = None, month_to: Optional[str] = None,
+                  filters: Optional[Dict[str, str]] = None, limit: int = 1000) -> List[Dict]:
+    """
+    Aggregate the rollup table over `group_by` dimensions, with regions coarsened to
+    region_precision geohash characters. Filters match dimensions exactly, except region,
+    which matches a geohash prefix. Averages are per recommendation.
+    """
+    unknown = [dimension for dimension in group_by if dimension not in ROLLUP_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"group_by must be among: {', '.join(ROLLUP_DIMENSIONS)}")
+    if not 1 <= region_precision <= ROLLUP_PRECISION:
+        raise ValueError(f'region_precision must be between 1 and {ROLLUP_PRECISION}')
+
+    columns = {dimension: getattr(RecommendationRollup, dimension) for dimension in ROLLUP_DIMENSIONS}
+    columns['region'] = func.substr(RecommendationRollup.region, 1, region_precision)
+    dimensions = [columns[dimension].label(dimension) for dimension in group_by]
+    count = func.sum(RecommendationRollup.recommendation_count)
+    query = select(*dimensions, count.label('recommendations'),
+                   (func.sum(RecommendationRollup.ai_score_sum) / count).label('avg_ai_score'),
+                   (func.sum(RecommendationRollup.profitability_sum) / count).label('avg_profitability'),
+                   (func.sum(RecommendationRollup.cost_sum) / count).label('avg_cost'),
+                   (func.sum(RecommendationRollup.demand_sum) / count).label('avg_demand'))
+    if month_from:
+        query = query.where(RecommendationRollup.month >= month_from)
+    if month_to:
+        query = query.where(RecommendationRollup.month <= month_to)
+    for dimension, value in (filters or {}).items():
+        if dimension == 'region':
+            query = query.where(RecommendationRollup.region.startswith(value))
+        elif dimension in ROLLUP_DIMENSIONS:
+            query = query.where(columns[dimension] == value)
+    if dimensions:
+        query = query.group_by(*dimensions).order_by(*dimensions)
+    return [dict(row._mapping) for row in db.session.execute(query.limit(limit))]
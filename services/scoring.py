@@ -0,0 +1,221 @@
+import datetime
+import heapq
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+from services.crop_knowledge import KNOWLEDGE_BASE
+
+
+# Column order of every (farms x crops) matrix
+CROPS = KNOWLEDGE_BASE.crops
+
+# Rule-based recommender: base score plus a bonus per matching signal, capped at 1.0
+RULE_WEIGHTS = {
+    'base': 0.5,
+    'cool_season': 0.2,
+    'warm_season': 0.2,
+    'wet': 0.15,
+    'dry': 0.1,
+    'demand': 0.2,
+}
+
+# Consensus of the soil / climate / market tools
+CONSENSUS_WEIGHTS = {
+    'soil_excellent': 3,
+    'soil_good': 2,
+    'climate': 2,
+    'market': 2,
+    'price_trend': 0,
+    'profitability': 0,
+    'seasonal': 0,
+}
+
+# Enhanced consensus: soil 40%, climate and market 30% each, plus market and timing adjustments
+ENHANCED_CONSENSUS_WEIGHTS = {
+    'soil_excellent': 4,
+    'soil_good': 3,
+    'climate': 3,
+    'market': 3,
+    'price_trend': 1,
+    'profitability': 1,
+    'seasonal': 1,
+}
+
+T = TypeVar('T')
+
+RULE_RATIONALE = (
+    ('cool_season', 'Average temperature favors cool-season crops'),
+    ('warm_season', 'Average temperature favors warm-season crops'),
+    ('wet', 'Higher precipitation supports rice'),
+    ('dry', 'Lower precipitation suits drought-tolerant crops'),
+    ('market', 'Market demand trend is favorable'),
+)
+
+
+def top_k(items: Iterable[T], k: Optional[int], key: Callable[[T], object]) -> List[T]:
+    """
+    The k best items by key, best first, selected with a bounded heap (O(n log k)) rather
+    than sorting everything. Ties keep input order; k=None ranks all items.
+    """
+    if k is None:
+        return sorted(items, key=key, reverse=True)
+    return heapq.nlargest(k, items, key=key)
+
+
+def crop_flags(mask: int) -> np.ndarray:
+    """Boolean vector over CROPS for a knowledge-base crop mask."""
+    return np.array([bool(mask & KNOWLEDGE_BASE.bit[crop]) for crop in CROPS], dtype=bool)
+
+
+_TRAIT_FLAGS = {trait: crop_flags(KNOWLEDGE_BASE.trait_mask(trait))
+                for trait in ('cool_season', 'warm_season', 'high_precipitation', 'low_precipitation')}
+
+
+def _soil_flags(soil_types: Sequence[str]) -> np.ndarray:
+    """(farms x crops) suitability; each distinct soil type is looked up once."""
+    by_soil = {soil: crop_flags(KNOWLEDGE_BASE.soil_mask(soil)) for soil in set(soil_types)}
+    return np.array([by_soil[soil] for soil in soil_types], dtype=bool).reshape(len(soil_types), len(CROPS))
+
+
+def _climate_column(climate_summaries: Sequence[Optional[dict]], key: str) -> np.ndarray:
+    # Missing summaries or values become NaN, which fails every threshold comparison
+    return np.array([(summary or {}).get(key) for summary in climate_summaries], dtype=float)
+
+
+def market_features(market: Optional[dict]) -> Dict[str, np.ndarray]:
+    """Per-crop market vectors: presence, latest price, demand index and price change %."""
+    rows = [(market or {}).get(crop) or {} for crop in CROPS]
+    return {
+        'has': np.array([bool(row) for row in rows], dtype=bool),
+        'price': np.array([row.get('latest_price', 0) for row in rows], dtype=float),
+        'demand': np.array([row.get('demand_index', 0.5) for row in rows], dtype=float),
+        'change': np.array([row.get('price_change_pct', 0) for row in rows], dtype=float),
+    }
+
+
+class RuleScores:
+    """
+    Recommender scores for a batch of farms. Scores and signal flags are (farms x crops)
+    arrays; rationale text is only assembled for the crops a caller asks for.
+    """
+
+    def __init__(self, soil_types: Sequence[str], eligible: np.ndarray, scores: np.ndarray,
+                 flags: Dict[str, np.ndarray], market: Optional[dict]):
+        self.soil_types = list(soil_types)
+        self.eligible = eligible
+        self.scores = scores
+        self.flags = flags
+        self.market = market or {}
+
+    def ranked(self, farm: int, limit: Optional[int] = None) -> List[int]:
+        """Crop column indexes for one farm, best first (catalogue order breaks ties)."""
+        scores = self.scores[farm]
+        return top_k(np.flatnonzero(self.eligible[farm]).tolist(), limit, key=scores.__getitem__)
+
+    def rationale(self, farm: int, crop: int) -> str:
+        parts = [f"Suitable for {self.soil_types[farm]} soil"]
+        parts.extend(text for flag, text in RULE_RATIONALE if self.flags[flag][farm, crop])
+        return '; '.join(parts)
+
+    def recommendations(self, farm: int, limit: Optional[int] = None) -> List[Dict]:
+        return [{
+            'crop_name': CROPS[j],
+            'score': float(self.scores[farm, j]),
+            'rationale': self.rationale(farm, j),
+            'market_info': self.market.get(CROPS[j]) or {},
+        } for j in self.ranked(farm, limit)]
+
+
+def score_farms(soil_types: Sequence[str], climate_summaries: Sequence[Optional[dict]],
+                market: Optional[dict], weights: Optional[Dict[str, float]] = None) -> RuleScores:
+    """
+    Score every crop for every farm in one pass. Farms are rows, crops are columns; each
+    soil, temperature, precipitation and market signal is a boolean or float matrix and the
+    score is their weighted sum. Pass modified summaries or weights to run what-if scenarios.
+    """
+    w = {**RULE_WEIGHTS, **(weights or {})}
+    temp = _climate_column(climate_summaries, 'avg_temp_c')[:, None]
+    precip = _climate_column(climate_summaries, 'avg_precip_mm')[:, None]
+    mf = market_features(market)
+
+    flags = {
+        'cool_season': _TRAIT_FLAGS['cool_season'] & (temp >= 10) & (temp <= 25),
+        'warm_season': _TRAIT_FLAGS['warm_season'] & (temp >= 20) & (temp <= 35),
+        'wet': _TRAIT_FLAGS['high_precipitation'] & (precip >= 3),
+        'dry': _TRAIT_FLAGS['low_precipitation'] & (precip <= 2),
+        'market': np.broadcast_to(mf['has'], (len(soil_types), len(CROPS))),
+    }
+    demand = np.where(mf['has'], np.clip(mf['demand'], 0, 1), 0.0)
+
+    scores = (w['base']
+              + w['cool_season'] * flags['cool_season']
+              + w['warm_season'] * flags['warm_season']
+              + w['wet'] * flags['wet']
+              + w['dry'] * flags['dry']
+              + w['demand'] * demand)
+    scores = np.round(np.minimum(scores, 1.0), 2)
+    return RuleScores(soil_types, _soil_flags(soil_types), scores, flags, market)
+
+
+def consensus_ranking(soil_recs: dict, climate_recs: dict, market_recs: dict, market: Optional[dict] = None,
+                      month: Optional[int] = None, weights: Optional[Dict[str, float]] = None,
+                      limit: int = 5, detailed: bool = False) -> List[Tuple[str, Dict]]:
+    """
+    Rank crops by agreement between the soil, climate and market tools.
+    Candidates are the soil tool's excellent crops plus everything the climate and market
+    tools recommend. Returns [(crop, info)] for the top `limit`, ordered by score then confidence.
+    With detailed=True each info carries the per-signal breakdown shown on the insights page.
+    """
+    w = {**CONSENSUS_WEIGHTS, **(weights or {})}
+    soil = soil_recs.get('recommendations', {})
+    excellent = crop_flags(KNOWLEDGE_BASE.mask(soil.get('excellent', [])))
+    good = crop_flags(KNOWLEDGE_BASE.mask(soil.get('good', []))) & ~excellent
+    climate = crop_flags(KNOWLEDGE_BASE.mask(climate_recs.get('recommendations', [])))
+    market_pick = crop_flags(KNOWLEDGE_BASE.mask(market_recs.get('recommendations', [])))
+    candidates = excellent | climate | market_pick
+
+    soil_confidence = soil_recs.get('confidence', 0.5)
+    confidence = (soil_confidence * excellent + soil_confidence * 0.7 * good
+                  + climate_recs.get('confidence', 0.5) * climate
+                  + market_recs.get('confidence', 0.5) * market_pick)
+    confidence = np.where(confidence > 0, confidence / 3, 0.5)
+
+    score = (w['soil_excellent'] * excellent + w['soil_good'] * good
+             + w['climate'] * climate + w['market'] * market_pick)
+
+    mf = market_features(market)
+    price_trend = np.select([mf['has'] & (mf['change'] > 5), mf['has'] & (mf['change'] < -5)], [1, -1], 0)
+    profitability = np.select(
+        [mf['has'] & (mf['price'] > 3000) & (mf['demand'] > 0.7),
+         mf['has'] & ((mf['price'] < 2000) | (mf['demand'] < 0.4))], [1, -1], 0)
+    seasonal = crop_flags(KNOWLEDGE_BASE.month_mask(month or datetime.date.today().month))
+    score = score + w['price_trend'] * price_trend + w['profitability'] * profitability + w['seasonal'] * seasonal
+
+    ranked = []
+    for j in top_k(np.flatnonzero(candidates).tolist(), limit, key=lambda j: (score[j], confidence[j])):
+        info = {
+            'score': _number(score[j]),
+            'confidence': float(confidence[j]),
+            'soil_suitability': bool(excellent[j] or good[j]),
+            'climate_suitability': bool(climate[j]),
+            'market_suitability': bool(market_pick[j]),
+        }
+        if detailed:
+            info['details'] = {
+                'soil_score': _number(w['soil_excellent'] if excellent[j] else w['soil_good'] if good[j] else 0),
+                'climate_score': _number(w['climate'] if climate[j] else 0),
+                'market_score': _number(w['market'] if market_pick[j] else 0),
+                'price_trend': {1: 'rising', -1: 'falling'}.get(int(price_trend[j]), 'stable'),
+                'profitability': {1: 'high', -1: 'low'}.get(int(profitability[j]), 'medium'),
+                'climate_suitability': 'excellent' if climate[j] else 'moderate',
+                'seasonal_timing': 'optimal',
+            }
+        ranked.append((CROPS[j], info))
+    return ranked
+
+
+def _number(value) -> float:
+    # Integer weights give integer scores; keep them displaying as 7 rather than 7.0
+    value = float(value)
+    return int(value) if value.is_integer() else value
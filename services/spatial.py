@@ -0,0 +1,173 @@
+"""
+Spatial queries over farm_profiles.geohash: radius, nearest-neighbour and bounding-box search,
+farm counts grouped by geohash or climate cell, and a proximity index for duplicate checks.
+
+Each search turns its area into a handful of geohash cells, fetches the farms in those cells
+through the geohash index (one range scan per cell) and filters the exact shape in Python.
+"""
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import String, and_, column, func, or_, text
+
+from models import FarmProfile
+from services.climate import climate_cell_key, snap_to_cell
+from services.geohash import GEOHASH_PRECISION, bbox_cells, cell_size, encode_geohash, haversine_km, radius_bbox
+
+
+MAX_RADIUS_KM = 500.0
+MAX_COVER_CELLS = 32
+NEAREST_START_KM = 5.0
+CELLS_PER_QUERY = 2048  # two bound parameters each, well under driver limits
+KM_PER_DEGREE = 111.32
+
+
+def _in_cells(cells: List[str]):
+    # '{' sorts right after 'z', the last geohash character, so [cell, cell + '{') is the prefix range
+    return or_(*(and_(FarmProfile.geohash >= cell, FarmProfile.geohash < cell + '{') for cell in cells))
+
+
+def _bbox_query(query, min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+    return query.filter(_in_cells(bbox_cells(min_lat, min_lon, max_lat, max_lon, MAX_COVER_CELLS)),
+                        FarmProfile.latitude.between(min_lat, max_lat),
+                        FarmProfile.longitude.between(min_lon, max_lon))
+
+
+def farms_in_bbox(min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                  query=None, limit: Optional[int] = None) -> List[FarmProfile]:
+    """Farms inside the box, by id. `query` narrows the search (e.g. to one user's farms)."""
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError('bounding box minimum must not exceed its maximum')
+    query = _bbox_query(query if query is not None else FarmProfile.query, min_lat, min_lon, max_lat, max_lon)
+    return query.order_by(FarmProfile.id).limit(limit).all()
+
+
+def farms_within(lat: float, lon: float, radius_km: float, query=None,
+                 limit: Optional[int] = None) -> List[Tuple[FarmProfile, float]]:
+    """(farm, distance_km) for farms within radius_km of the point, nearest first."""
+    if not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValueError(f'radius_km must be in (0, {MAX_RADIUS_KM:g}]')
+    candidates = _bbox_query(query if query is not None else FarmProfile.query, *radius_bbox(lat, lon, radius_km))
+    hits = [(farm, haversine_km(lat, lon, farm.latitude, farm.longitude)) for farm in candidates]
+    hits = sorted((hit for hit in hits if hit[1] <= radius_km), key=lambda hit: (hit[1], hit[0].id))
+    return hits[:limit] if limit is not None else hits
+
+
+def nearest_farms(lat: float, lon: float, k: int = 10, query=None,
+                  max_radius_km: float = MAX_RADIUS_KM) -> List[Tuple[FarmProfile, float]]:
+    """The k farms nearest the point, searching outwards in doubling radii up to max_radius_km."""
+    if k < 1:
+        raise ValueError('k must be at least 1')
+    radius = min(NEAREST_START_KM, max_radius_km)
+    while True:
+        hits = farms_within(lat, lon, radius, query, limit=k)
+        if len(hits) >= k or radius >= max_radius_km:
+            return hits
+        radius = min(radius * 2, max_radius_km)
+
+
+def farm_cells(precision: int, bbox: Optional[Tuple[float, float, float, float]] = None,
+               query=None) -> List[Dict]:
+    """Farm count and centroid per geohash cell of the given length, grouped in SQL."""
+    if not 1 <= precision <= 9:
+        raise ValueError('precision must be between 1 and 9')
+    cell = func.substr(FarmProfile.geohash, 1, precision)
+    rows = (query if query is not None else FarmProfile.query).with_entities(
+        cell.label('cell'), func.count(FarmProfile.id), func.avg(FarmProfile.latitude),
+        func.avg(FarmProfile.longitude))
+    if bbox is not None:
+        rows = _bbox_query(rows, *bbox)
+    rows = rows.filter(FarmProfile.geohash.isnot(None)).group_by(cell).order_by(cell)
+    return [{'cell': key, 'count': count, 'latitude': avg_lat, 'longitude': avg_lon}
+            for key, count, avg_lat, avg_lon in rows]
+
+
+def farms_by_climate_cell(bbox: Optional[Tuple[float, float, float, float]] = None,
+                          query=None) -> List[Dict]:
+    """Farm ids per NASA POWER climate cell, i.e. the farms that share one climate fetch."""
+    rows = (query if query is not None else FarmProfile.query).with_entities(
+        FarmProfile.id, FarmProfile.latitude, FarmProfile.longitude)
+    if bbox is not None:
+        rows = _bbox_query(rows, *bbox)
+    cells = defaultdict(list)
+    for farm_id, lat, lon in rows.order_by(FarmProfile.id):
+        cells[climate_cell_key(lat, lon)].append((farm_id, lat, lon))
+    result = []
+    for key, members in sorted(cells.items()):
+        cell_lat, cell_lon = snap_to_cell(members[0][1], members[0][2])
+        result.append({'cell': key, 'latitude': cell_lat, 'longitude': cell_lon, 'count': len(members),
+                       'farm_ids': [farm_id for farm_id, _, _ in members]})
+    return result
+
+
+@lru_cache(maxsize=None)
+def _cell_ranges(size: int):
+    """CTE of `size` bound (low, high) geohash ranges; textual, so SQLAlchemy caches its compiled form."""
+    rows = ', '.join(f'(:low_{i}, :high_{i})' for i in range(size))
+    return text(f'VALUES {rows}').columns(column('column1', String), column('column2', String)).cte('cells')
+
+
+def proximity_precision(radius_km: float) -> int:
+    """Longest geohash length whose cells are at least radius_km on each side at the equator."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if min(cell_size(precision)) * KM_PER_DEGREE >= radius_km:
+            return precision
+    return 1
+
+
+class PointIndex:
+    """
+    Points bucketed by geohash cell, answering "what is within radius_km of here?" for small
+    radii such as duplicate farm checks. Existing farms are loaded from the database by cell.
+    """
+
+    def __init__(self, radius_km: float):
+        self.radius_km = radius_km
+        self.precision = proximity_precision(radius_km)
+        self._cells: Dict[str, List[Tuple[object, float, float]]] = defaultdict(list)
+        self._loaded = set()
+        self._covers: Dict[Tuple[float, float], List[str]] = {}
+
+    def cover(self, lat: float, lon: float) -> List[str]:
+        """Index cells that a circle of radius_km around the point touches."""
+        cells = self._covers.get((lat, lon))
+        if cells is None:
+            cells = self._covers[(lat, lon)] = bbox_cells(*radius_bbox(lat, lon, self.radius_km),
+                                                          precision=self.precision)
+        return cells
+
+    def add(self, key, lat: float, lon: float) -> None:
+        self._cells[encode_geohash(lat, lon, self.precision)].append((key, lat, lon))
+
+    def load_farms(self, points: Iterable[Tuple[float, float]], query=None) -> None:
+        """
+        Add the farms near any of the points, keyed by id. The cells are joined as a VALUES
+        list of geohash ranges, one index range scan each, up to CELLS_PER_QUERY cells per query.
+        """
+        cells = sorted({cell for lat, lon in points for cell in self.cover(lat, lon)} - self._loaded)
+        self._loaded.update(cells)
+        farms = (query if query is not None else FarmProfile.query).with_entities(
+            FarmProfile.id, FarmProfile.latitude, FarmProfile.longitude)
+        for i in range(0, len(cells), CELLS_PER_QUERY):
+            chunk = cells[i:i + CELLS_PER_QUERY]
+            size = 1 << (len(chunk) - 1).bit_length()
+            chunk += chunk[-1:] * (size - len(chunk))  # pad with a repeated cell to a cached statement size
+            ranges = _cell_ranges(size)
+            params = {**{f'low_{j}': cell for j, cell in enumerate(chunk)},
+                      **{f'high_{j}': cell + '{' for j, cell in enumerate(chunk)}}
+            rows = (farms.join(ranges, and_(FarmProfile.geohash >= ranges.c.column1,
+                                            FarmProfile.geohash < ranges.c.column2))
+                    .params(params).distinct())
+            for farm_id, lat, lon in rows:
+                self.add(farm_id, lat, lon)
+
+    def nearest(self, lat: float, lon: float) -> Optional[Tuple[object, float]]:
+        """(key, distance_km) of the nearest point within radius_km, or None."""
+        best = None
+        for cell in self.cover(lat, lon):
+            for key, other_lat, other_lon in self._cells.get(cell, ()):
+                distance = haversine_km(lat, lon, other_lat, other_lon)
+                if distance <= self.radius_km and (best is None or distance < best[1]):
+                    best = (key, distance)
+        return best
@@ -0,0 +1,112 @@
+"""
+Compact encodings for price time series.
+
+The row format is a list of {'date', 'price'} dicts. The columnar format sends the first
+date, the day step and the prices as one array. It is optionally downsampled to a target
+point count and packed as base64 little-endian float32:
+
+    {'start': '2026-09-17', 'step_days': 1, 'count': 31, 'encoding': 'base64',
+     'prices': 'AAB...'}
+
+Series with gaps, or downsampled ones, also carry 'offsets': days since start for each point.
+"""
+import base64
+import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+SERIES_ENCODINGS = ('json', 'base64')
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+MAX_SERIES_POINTS = 10000
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of `points` samples that keep the visual shape
+    of the series. First and last samples are always kept.
+    """
+    n = len(x)
+    if points >= n:
+        return np.arange(n)
+    if points < 3:
+        return np.array([0, n - 1])
+    # bucket i spans [edges[i], edges[i+1]) over the samples between the fixed endpoints
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (the last sample for the final bucket)
+        next_lo, next_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        areas = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y: np.ndarray, points: int) -> np.ndarray:
+    """Both endpoints plus the minimum and maximum of each of (points - 2) // 2 interior buckets."""
+    n = len(y)
+    if points >= n:
+        return np.arange(n)
+    picks = {0, n - 1}
+    if points >= 4:
+        for bucket in np.array_split(np.arange(1, n - 1), (points - 2) // 2):
+            picks.add(int(bucket[np.argmin(y[bucket])]))
+            picks.add(int(bucket[np.argmax(y[bucket])]))
+    return np.array(sorted(picks))
+
+
+def _pack(values: np.ndarray, dtype: str, encoding: str):
+    if encoding == 'base64':
+        return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode()
+    return values.tolist()
+
+
+def columnar_series(series: List[dict], points: Optional[int] = None, method: str = 'lttb',
+                    encoding: str = 'json') -> Dict:
+    """
+    Columnar form of a [{'date', 'price'}] series, downsampled to at most `points` samples.
+    Prices are float32 ('<f4') and offsets int32 ('<i4') when base64-encoded.
+    """
+    if encoding not in SERIES_ENCODINGS:
+        raise ValueError(f"encoding must be one of: {', '.join(SERIES_ENCODINGS)}")
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"downsample must be one of: {', '.join(DOWNSAMPLE_METHODS)}")
+    if not series:
+        return {'start': None, 'step_days': 1, 'count': 0, 'encoding': encoding,
+                'prices': _pack(np.empty(0), '<f4', encoding)}
+
+    start = datetime.date.fromisoformat(series[0]['date'])
+    span = (datetime.date.fromisoformat(series[-1]['date']) - start).days
+    if span == len(series) - 1:
+        # dates are strictly increasing (one row per day), so a full span has no gaps
+        offsets = np.arange(len(series), dtype=np.int32)
+    else:
+        offsets = np.fromiter(((datetime.date.fromisoformat(p['date']) - start).days for p in series),
+                              dtype=np.int32, count=len(series))
+    prices = np.fromiter((p['price'] for p in series), dtype=np.float64, count=len(series))
+
+    if points is not None and points < len(series):
+        points = max(2, min(points, MAX_SERIES_POINTS))
+        keep = lttb_indices(offsets.astype(np.float64), prices, points) if method == 'lttb' \
+            else minmax_indices(prices, points)
+        offsets, prices = offsets[keep], prices[keep]
+
+    result = {
+        'start': start.isoformat(),
+        'step_days': 1,
+        'count': len(prices),
+        'encoding': encoding,
+        'prices': _pack(prices if encoding == 'base64' else np.round(prices, 2), '<f4', encoding),
+    }
+    if len(offsets) and offsets[-1] != len(offsets) - 1:
+        # gaps or downsampling: points are not one step apart
+        result['offsets'] = _pack(offsets, '<i4', encoding)
+    return result
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # No app context is left pushed: requests must each get their own, as in production,
+    # or flask.g (and the per-request FarmDataContext in it) would leak between them.
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.delenv('MARKET_PROVIDER_URL', raising=False)
+    import farm.context
+    import services.market
+    from app import create_app
+    from models import db
+
+    # process-wide caches would otherwise carry one test's data into the next test's database
+    monkeypatch.setattr(farm.context, '_backoff', farm.context.FailureBackoff())
+    services.market._clear_snapshots()
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def admin_id(app):
+    from models import db, User
+
+    with app.app_context():
+        user = User(username='admin', email='admin@example.com', is_admin=True)
+        user.set_password('adminpass')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def login(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def admin_client(app, admin_id):
+    return login(app, admin_id)
@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import insert
+
+from models import db, FarmProfile, User
+
+
+def _seed_farms(app, user_id, count):
+    # server_default created_at: several rows share a second, stored without a fraction on SQLite
+    with app.app_context():
+        db.session.execute(insert(FarmProfile), [
+            {'user_id': user_id, 'latitude': 10.0 + i / 100, 'longitude': 76.0, 'soil_type': 'Loam'}
+            for i in range(count)
+        ])
+        db.session.commit()
+        return [farm_id for (farm_id,) in db.session.query(FarmProfile.id)]
+
+
+def _walk(client, url):
+    ids, cursor = [], None
+    for _ in range(100):
+        response = client.get(url + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        page = response.get_json()
+        ids += [item['id'] for item in page['items']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+    pytest.fail('pagination did not terminate')
+
+
+@pytest.mark.parametrize('sort', ['created_at', 'id'])
+@pytest.mark.parametrize('order', ['desc', 'asc'])
+@pytest.mark.parametrize('limit', [1, 3])
+def test_farm_pages_cover_every_row_once(app, admin_id, admin_client, sort, order, limit):
+    farm_ids = _seed_farms(app, admin_id, 7)
+    ids = _walk(admin_client, f'/admin/api/farms?limit={limit}&sort={sort}&order={order}')
+    assert len(ids) == len(set(ids))
+    assert sorted(ids) == sorted(farm_ids)
+
+
+def test_search_matches_wildcards_literally(app, admin_id, admin_client):
+    with app.app_context():
+        for username in ('a_b', 'axb'):
+            user = User(username=username, email=f'{username}@example.com')
+            user.set_password('secret')
+            db.session.add(user)
+        db.session.add_all([FarmProfile(user_id=admin_id, latitude=10.0 + i, longitude=76.0, soil_type='Loam',
+                                        location_name=name) for i, name in enumerate(['100% organic', '1000 acres'])])
+        db.session.commit()
+    users = admin_client.get('/admin/api/users?q=a_').get_json()['items']
+    assert [user['username'] for user in users] == ['a_b']
+    farms = admin_client.get('/admin/api/farms?q=100%25').get_json()['items']
+    assert [farm['location_name'] for farm in farms] == ['100% organic']
@@ -0,0 +1,94 @@
+import io
+
+import pytest
+
+from farm.bulk_import import import_farms, read_farm_rows
+from models import db, FarmProfile
+from services.geohash import encode_geohash
+
+
+def _csv(*lines):
+    return read_farm_rows(io.BytesIO('\n'.join(lines).encode()), 'csv')
+
+
+def _import(app, admin_id, rows, **kwargs):
+    with app.app_context():
+        return import_farms(rows, admin_id, **kwargs)
+
+
+def test_invalid_rows_are_reported_by_line(app, admin_id):
+    stats = _import(app, admin_id, _csv(
+        'Lat,Lng,Soil,Name',
+        '10.0,76.0,loam,Good farm',
+        '95.0,76.0,Loam,',
+        ',76.0,Loam,',
+        '10.0,east,Loam,',
+        '11.0,77.0,Gravel,',
+    ))
+    assert (stats['rows'], stats['imported'], stats['invalid']) == (5, 1, 4)
+    assert [(issue['line'], issue['error'].split(' ')[0]) for issue in stats['issues']] == [
+        (3, 'latitude'), (4, 'latitude'), (5, 'longitude'), (6, 'soil_type')]
+    with app.app_context():
+        farm = FarmProfile.query.one()
+        assert (farm.soil_type, farm.location_name) == ('Loam', 'Good farm')
+
+
+def test_duplicates_within_the_file(app, admin_id):
+    # 0.0001 degrees of latitude is about 11 m
+    stats = _import(app, admin_id, _csv(
+        'latitude,longitude,soil_type',
+        '10.0,76.0,Loam',
+        '10.0001,76.0,Clay',
+        '10.01,76.0,Loam',
+    ))
+    assert (stats['imported'], stats['duplicates']) == (2, 1)
+    assert stats['issues'] == [{'line': 3, 'duplicate_of': 'line 2', 'distance_m': 11.1}]
+
+
+def test_duplicates_of_existing_farms(app, admin_id):
+    with app.app_context():
+        existing = FarmProfile(user_id=admin_id, latitude=10.0, longitude=76.0, soil_type='Loam')
+        db.session.add(existing)
+        db.session.commit()
+        existing_id = existing.id
+    stats = _import(app, admin_id, _csv('latitude,longitude,soil_type', '10.0001,76.0,Loam', '10.01,76.0,Loam'))
+    assert (stats['imported'], stats['duplicates']) == (1, 1)
+    assert stats['issues'][0]['duplicate_of'] == existing_id
+
+    # with the check off every row goes in
+    stats = _import(app, admin_id, _csv('latitude,longitude,soil_type', '10.0001,76.0,Loam'),
+                    duplicate_radius_m=0)
+    assert stats['imported'] == 1
+
+
+def test_core_insert_sets_geohash(app, admin_id):
+    stats = _import(app, admin_id, _csv('latitude,longitude,soil_type', '12.9716,77.5946,Sandy'))
+    with app.app_context():
+        farm = db.session.get(FarmProfile, stats['farm_ids'][0])
+        assert farm.geohash == encode_geohash(12.9716, 77.5946)
+
+
+def test_batches_commit_as_they_go(app, admin_id):
+    def rows():
+        for i in range(5):
+            yield i + 2, {'latitude': 10.0 + i, 'longitude': 76.0, 'soil_type': 'Loam'}
+        raise ValueError('truncated upload')
+
+    progress = []
+    with pytest.raises(ValueError):
+        _import(app, admin_id, rows(), batch_size=2, progress=progress.append)
+    assert [update['imported'] for update in progress] == [2, 4]
+    with app.app_context():
+        # the two full batches were committed before the failure; the partial third was not
+        assert FarmProfile.query.count() == 4
+
+
+def test_geojson_features(app, admin_id):
+    document = ('{"type": "FeatureCollection", "features": ['
+                '{"type": "Feature", "geometry": {"type": "Point", "coordinates": [76.0, 10.0]},'
+                ' "properties": {"soil": "Clay"}},'
+                '{"type": "Feature", "geometry": {"type": "Polygon", "coordinates": []},'
+                ' "properties": {"soil": "Clay"}}]}')
+    stats = _import(app, admin_id, read_farm_rows(io.BytesIO(document.encode()), 'geojson'))
+    assert (stats['imported'], stats['invalid']) == (1, 1)
+    assert stats['issues'] == [{'line': 2, 'error': 'latitude is required'}]
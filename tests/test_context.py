@@ -0,0 +1,52 @@
+import farm.context
+from farm.context import FarmDataContext, FailureBackoff
+from models import db, FarmProfile
+
+
+def _profiles(app, *coordinates):
+    with app.app_context():
+        profiles = [FarmProfile(user_id=1, latitude=lat, longitude=lon, soil_type='Loam') for lat, lon in coordinates]
+        db.session.add_all(profiles)
+        db.session.commit()
+        return [profile.id for profile in profiles]
+
+
+def test_failed_climate_cell_is_not_refetched_during_backoff(app, monkeypatch):
+    calls = []
+
+    def climate_down(profile):
+        calls.append(profile.id)
+        raise ConnectionError('NASA POWER unreachable')
+
+    monkeypatch.setattr(farm.context, 'get_farm_climate_summary', climate_down)
+    # the first two farms share a grid cell, the third is elsewhere
+    same_cell, neighbour, elsewhere = _profiles(app, (10.1, 76.1), (10.2, 76.2), (20.1, 80.1))
+    with app.app_context():
+        for profile_id in (same_cell, neighbour):
+            ctx = FarmDataContext()
+            profile = db.session.get(FarmProfile, profile_id)
+            ctx.prefetch(profile)
+            assert ctx.climate_summary(profile) is None
+            assert 'NASA POWER unreachable' in ctx.climate_error(profile)
+        assert calls == [same_cell]
+
+        ctx = FarmDataContext()
+        ctx.climate_summary(db.session.get(FarmProfile, elsewhere))
+        assert calls == [same_cell, elsewhere]
+
+
+def test_source_is_retried_after_backoff(app, monkeypatch):
+    monkeypatch.setattr(farm.context, '_backoff', FailureBackoff(0))
+    calls = []
+
+    def market_down(crops):
+        calls.append(crops)
+        raise ConnectionError('feed down')
+
+    monkeypatch.setattr(farm.context, 'fetch_market_prices', market_down)
+    with app.app_context():
+        for _ in range(2):
+            ctx = FarmDataContext()
+            assert ctx.market() == {}
+            assert ctx.market_error() == 'feed down'
+    assert len(calls) == 2
@@ -0,0 +1,52 @@
+from farm.routes import get_seasonal_crops_for_month, get_seasonal_recommendations
+from services.crop_knowledge import KNOWLEDGE_BASE
+from services.recommender import recommend_crops
+
+
+# The seasonal tables the routes used before the knowledge base existed
+SEASONAL_CROPS = {
+    1: ['Wheat', 'Mustard', 'Chickpea'],
+    2: ['Wheat', 'Mustard', 'Chickpea'],
+    3: ['Maize', 'Rice', 'Soybean'],
+    4: ['Maize', 'Rice', 'Cotton'],
+    5: ['Maize', 'Rice', 'Cotton'],
+    6: ['Rice', 'Maize', 'Millet', 'Soybean'],
+    7: ['Rice', 'Maize', 'Millet', 'Soybean'],
+    8: ['Rice', 'Maize', 'Millet', 'Soybean'],
+    9: ['Wheat', 'Mustard', 'Lentil'],
+    10: ['Wheat', 'Mustard', 'Lentil', 'Chickpea'],
+    11: ['Wheat', 'Mustard', 'Lentil', 'Chickpea'],
+    12: ['Wheat', 'Mustard', 'Chickpea'],
+}
+SEASONS = {
+    1: ('Winter', ['Wheat', 'Mustard', 'Chickpea']),
+    3: ('Spring', ['Maize', 'Rice', 'Soybean']),
+    6: ('Monsoon', ['Rice', 'Maize', 'Millet']),
+    9: ('Autumn', ['Wheat', 'Mustard', 'Lentil']),
+    12: ('Winter', ['Wheat', 'Mustard', 'Chickpea']),
+}
+
+
+def test_seasonal_crops_match_original_table():
+    for month, crops in SEASONAL_CROPS.items():
+        assert list(get_seasonal_crops_for_month(month)) == crops
+    assert get_seasonal_crops_for_month(13) == ()
+
+
+def test_seasonal_recommendations_match_original_table():
+    for month, (season, crops) in SEASONS.items():
+        result = get_seasonal_recommendations(month, ['Lentil', 'Mustard', 'Rice', 'Millet'])
+        assert result['current_season'] == season
+        assert result['all_seasonal_crops'] == crops
+        assert result['recommended_crops'] == [c for c in crops if c in ('Lentil', 'Mustard', 'Rice', 'Millet')]
+
+
+def test_recommender_precipitation_groups():
+    wet = {r['crop_name'] for r in recommend_crops('Loam', {'avg_precip_mm': 5}, None)
+           if 'Higher precipitation' in r['rationale']}
+    dry = {r['crop_name'] for r in recommend_crops('Loam', {'avg_precip_mm': 1}, None)
+           if 'Lower precipitation' in r['rationale']}
+    assert wet == {'Rice'}
+    # Millet is only moderately suited to loam, so it is not a candidate there
+    assert dry == {'Mustard', 'Chickpea'}
+    assert KNOWLEDGE_BASE.with_trait('low_precipitation') == ('Millet', 'Chickpea', 'Mustard')
@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+
+import pytest
+
+from models import db, FarmProfile
+from services import export
+from services.export import export_stream
+
+
+@pytest.fixture
+def farms(app, admin_id, monkeypatch):
+    # small batches, so the rows span several chunks
+    monkeypatch.setattr(export, 'EXPORT_BATCH_ROWS', 2)
+    with app.app_context():
+        profiles = [FarmProfile(user_id=admin_id, latitude=10.0 + i, longitude=76.5, soil_type=soil,
+                                location_name=f'Farm, "{i}"' if i % 2 else None)
+                    for i, soil in enumerate(['Loam', 'Clay', 'Loam', 'Sandy', 'Loam'])]
+        db.session.add_all(profiles)
+        db.session.commit()
+        return [(p.id, p.soil_type, p.location_name, p.latitude, p.geohash, p.created_at.isoformat())
+                for p in profiles]
+
+
+def _export(app, fmt, filters=None):
+    with app.app_context():
+        return b''.join(export_stream('farms', fmt, filters)).decode()
+
+
+def test_csv_matches_rows(app, farms):
+    rows = list(csv.DictReader(io.StringIO(_export(app, 'csv'))))
+    assert [(int(r['id']), r['soil_type'], r['location_name'] or None, float(r['latitude']), r['geohash'],
+             r['created_at']) for r in rows] == farms
+    assert {r['owner'] for r in rows} == {'admin'}
+
+
+def test_ndjson_matches_rows(app, farms):
+    rows = [json.loads(line) for line in _export(app, 'ndjson').splitlines()]
+    assert [(r['id'], r['soil_type'], r['location_name'], r['latitude'], r['geohash'], r['created_at'])
+            for r in rows] == farms
+
+
+def test_filters(app, farms):
+    rows = [json.loads(line) for line in _export(app, 'ndjson', {'soil_type': 'Loam'}).splitlines()]
+    assert [r['id'] for r in rows] == [farm[0] for farm in farms if farm[1] == 'Loam']
+    assert _export(app, 'csv', {'soil_type': 'Peaty'}).splitlines()[0].startswith('id,user_id,owner')
+    assert _export(app, 'ndjson', {'soil_type': 'Peaty'}) == ''
+    with app.app_context():
+        with pytest.raises(ValueError):
+            export_stream('farms', 'csv', {'since': 'yesterday'})
+        with pytest.raises(ValueError):
+            export_stream('farms', 'xml')
+
+
+def test_parquet_matches_rows(app, farms):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    with app.app_context():
+        data = b''.join(export_stream('farms', 'parquet'))
+    table = parquet.read_table(io.BytesIO(data))
+    assert table.column('id').to_pylist() == [farm[0] for farm in farms]
+    assert table.column('location_name').to_pylist() == [farm[2] for farm in farms]
@@ -0,0 +1,54 @@
+from sqlalchemy import event
+
+from farm.generation import build_recommendation_runs, store_recommendation_runs
+from models import db, FarmProfile, Recommendation, RecommendationRun
+from services.market import fetch_market_prices
+
+
+CLIMATE = {'avg_temp_c': 24.0, 'total_precip_mm': 900.0, 'avg_rel_humidity': 65.0, 'growing_degree_days': 2400.0}
+
+
+def _store(farms, climate=CLIMATE):
+    market = fetch_market_prices(['Wheat', 'Maize', 'Rice', 'Millet'])
+    return store_recommendation_runs(build_recommendation_runs(
+        [(p.id, p.soil_type, p.latitude, p.longitude, climate) for p in farms], market))
+
+
+def test_farm_has_one_current_run(app, admin_id):
+    with app.app_context():
+        farms = [FarmProfile(user_id=admin_id, latitude=10.0 + i, longitude=76.0, soil_type='Loam')
+                 for i in range(2)]
+        db.session.add_all(farms)
+        db.session.commit()
+        for temp in (20.0, 25.0, 30.0):
+            _store(farms, dict(CLIMATE, avg_temp_c=temp))
+
+        for farm in farms:
+            current_runs = (db.session.query(Recommendation.run_id).filter_by(farm_id=farm.id, is_current=True)
+                            .distinct().all())
+            latest = db.session.query(db.func.max(RecommendationRun.id)).filter_by(farm_id=farm.id).scalar()
+            assert current_runs == [(latest,)]
+
+
+def test_farms_locked_before_retiring(app, admin_id):
+    with app.app_context():
+        farm = FarmProfile(user_id=admin_id, latitude=10.0, longitude=76.0, soil_type='Loam')
+        db.session.add(farm)
+        db.session.commit()
+        _store([farm])
+
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(' '.join(statement.split()))
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            _store([farm], dict(CLIMATE, avg_temp_c=30.0))
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        lock = next(i for i, s in enumerate(statements) if s.startswith('SELECT farm_profiles.id AS farm_profiles_id FROM farm_profiles'))
+        retire = next(i for i, s in enumerate(statements) if s.startswith('UPDATE recommendations'))
+        insert = next(i for i, s in enumerate(statements) if s.startswith('INSERT INTO recommendation_runs'))
+        assert lock < retire < insert
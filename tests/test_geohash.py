@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from services.geohash import bbox_cells, cell_bounds, encode_geohash, haversine_km
+
+
+@pytest.mark.parametrize('lat, lon, precision, expected', [
+    # the reference examples of the geohash format
+    (57.64911, 10.40744, 11, 'u4pruydqqvj'),
+    (42.6, -5.6, 5, 'ezs42'),
+    (0.0, 0.0, 8, 's0000000'),
+    (40.7128, -74.0060, 9, 'dr5regw3p'),
+])
+def test_encode_reference_strings(lat, lon, precision, expected):
+    assert encode_geohash(lat, lon, precision) == expected
+
+
+def test_cell_bounds_contain_the_point():
+    min_lat, min_lon, max_lat, max_lon = cell_bounds('ezs42')
+    assert min_lat <= 42.6 <= max_lat and min_lon <= -5.6 <= max_lon
+    assert (round(min_lat, 6), round(min_lon, 6)) == (42.583008, -5.625)
+
+
+def test_bbox_inside_one_cell():
+    min_lat, min_lon, max_lat, max_lon = cell_bounds('ezs42')
+    margin = 1e-6
+    assert bbox_cells(min_lat + margin, min_lon + margin, max_lat - margin, max_lon - margin,
+                      precision=5) == ['ezs42']
+    assert bbox_cells(42.6, -5.6, 42.6, -5.6, precision=9) == [encode_geohash(42.6, -5.6)]
+
+
+@pytest.mark.parametrize('box', [(10.0, 76.0, 10.3, 76.4), (-0.2, -0.2, 0.2, 0.2), (51.4, -0.3, 51.6, 0.1)])
+def test_bbox_cover_holds_every_point(box):
+    cells = bbox_cells(*box, max_cells=32)
+    assert 1 <= len(cells) <= 32
+    assert len({len(cell) for cell in cells}) == 1
+    rng = random.Random(1)
+    for _ in range(500):
+        lat, lon = rng.uniform(box[0], box[2]), rng.uniform(box[1], box[3])
+        assert encode_geohash(lat, lon, len(cells[0])) in cells
+
+
+def test_haversine():
+    # one degree of latitude
+    assert haversine_km(10.0, 76.0, 11.0, 76.0) == pytest.approx(111.2, abs=0.1)
+    assert haversine_km(10.0, 76.0, 10.0, 76.0) == 0.0
@@ -0,0 +1,66 @@
+import datetime
+
+from migrations import _one_active_job_per_farm
+from models import db, FarmProfile, RecommendationJob
+
+
+def _farm(app, admin_id):
+    with app.app_context():
+        profile = FarmProfile(user_id=admin_id, latitude=10.0, longitude=76.0, soil_type='Loam')
+        db.session.add(profile)
+        db.session.commit()
+        return profile.id
+
+
+def test_insert_race_returns_existing_job(app, admin_id, monkeypatch):
+    farm_id = _farm(app, admin_id)
+    queue = app.extensions['recommendation_jobs']
+    monkeypatch.setattr(queue.executor, 'submit', lambda *args: None)
+    with app.test_request_context():
+        db.session.add(RecommendationJob(farm_id=farm_id, status='running'))
+        db.session.commit()
+        existing = RecommendationJob.query.one()
+        calls = []
+        real_active_job = type(queue).active_job
+
+        def stale_read(farm_id):
+            # the first check misses the job another request inserted a moment ago
+            calls.append(farm_id)
+            return None if len(calls) == 1 else real_active_job(farm_id)
+
+        monkeypatch.setattr(type(queue), 'active_job', staticmethod(stale_read))
+        job = queue.enqueue(db.session.get(FarmProfile, farm_id))
+        assert job.id == existing.id
+        assert RecommendationJob.query.count() == 1
+
+
+def test_orphaned_jobs_recovered_before_first_request(app, admin_id, monkeypatch):
+    farm_id = _farm(app, admin_id)
+    with app.app_context():
+        long_ago = datetime.datetime.utcnow() - datetime.timedelta(hours=2)
+        db.session.add(RecommendationJob(farm_id=farm_id, status='running', started_at=long_ago))
+        db.session.commit()
+    submitted = []
+    monkeypatch.setattr(app.extensions['recommendation_jobs'].executor, 'submit',
+                        lambda fn, job_id: submitted.append(job_id))
+
+    app.test_client().get('/')
+    app.test_client().get('/')
+    with app.app_context():
+        job = RecommendationJob.query.one()
+        assert job.status == 'pending'
+        assert submitted == [job.id]
+
+
+def test_migration_keeps_newest_active_job(app, admin_id):
+    farm_id = _farm(app, admin_id)
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('DROP INDEX ix_recommendation_jobs_active_farm_id')
+        db.session.add_all([RecommendationJob(farm_id=farm_id, status='running'),
+                            RecommendationJob(farm_id=farm_id, status='pending')])
+        db.session.commit()
+        with db.engine.begin() as conn:
+            _one_active_job_per_farm(conn)
+        statuses = [job.status for job in RecommendationJob.query.order_by(RecommendationJob.id)]
+        assert statuses == ['failed', 'pending']
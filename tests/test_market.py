@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from services import market
+from services.market import SimulatedMarketProvider, fetch_market_prices, set_market_provider
+
+
+class CountingProvider(SimulatedMarketProvider):
+    """Simulated prices, except for crops the feed does not carry."""
+
+    def __init__(self, unknown=()):
+        self.unknown = set(unknown)
+        self.calls = []
+
+    def daily_prices(self, crop_names, region, start, end):
+        self.calls.append(list(crop_names))
+        return super().daily_prices([c for c in crop_names if c not in self.unknown], region, start, end)
+
+
+@pytest.fixture
+def provider(app):
+    provider = CountingProvider(unknown={'Quinoa'})
+    set_market_provider(provider)
+    with app.app_context():
+        yield provider
+    set_market_provider(SimulatedMarketProvider())
+
+
+def test_crops_without_prices_are_looked_up_once_a_day(provider):
+    assert set(fetch_market_prices(['Wheat', 'Quinoa'])) == {'Wheat'}
+    assert len(provider.calls) == 1
+    for _ in range(3):
+        assert set(fetch_market_prices(['Wheat', 'Quinoa'])) == {'Wheat'}
+    assert len(provider.calls) == 1
+
+    # a crop not looked up yet still triggers a refresh, for that crop only
+    assert set(fetch_market_prices(['Wheat', 'Rice'])) == {'Wheat', 'Rice'}
+    assert provider.calls[1:] == [['Rice']]
+
+
+def test_failed_refresh_is_retried(provider, monkeypatch):
+    assert fetch_market_prices(['Wheat'])
+
+    def feed_down(*args):
+        raise ConnectionError('feed down')
+
+    monkeypatch.setattr(provider, 'daily_prices', feed_down)
+    with pytest.raises(ConnectionError):
+        fetch_market_prices(['Rice'])
+    monkeypatch.undo()
+    assert set(fetch_market_prices(['Rice'])) == {'Rice'}
+
+
+def test_snapshot_cache_is_safe_across_threads(app, provider):
+    crops = list(market.BASE_PRICES)
+    errors = []
+
+    def fetch(crop):
+        with app.app_context():
+            try:
+                for _ in range(20):
+                    fetch_market_prices([crop, 'Quinoa'])
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=fetch, args=(crop,)) for crop in crops]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert set(fetch_market_prices(crops)) == set(crops)
+
+
+def test_snapshot_rebuilt_when_another_process_changes_the_store(provider):
+    assert fetch_market_prices(['Wheat'])['Wheat']['latest_price'] != 9999.0
+
+    # stats recomputed elsewhere (e.g. a price CSV load from the CLI) never clear this
+    # process's cache, and may reuse the ids of the rows they replaced
+    stat = market.MarketStat.query.filter_by(crop='Wheat').one()
+    stat.latest_price = 9999.0
+    market.db.session.commit()
+
+    assert fetch_market_prices(['Wheat'])['Wheat']['latest_price'] == 9999.0
+    assert len(provider.calls) == 1
+
+
+def test_provider_must_implement_daily_prices():
+    class NoPrices(market.MarketDataProvider):
+        pass
+
+    with pytest.raises(TypeError):
+        NoPrices()
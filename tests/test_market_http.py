@@ -0,0 +1,75 @@
+import datetime
+
+import httpx
+import pytest
+
+from services.market_http import CircuitBreaker, CircuitOpenError, HttpMarketProvider
+
+
+START = datetime.date(2024, 1, 1)
+END = datetime.date(2024, 1, 2)
+
+
+def _provider(handler, breaker):
+    provider = HttpMarketProvider('http://feed.test', max_retries=0, backoff=0, breaker=breaker)
+    provider._client = httpx.AsyncClient(base_url=provider.base_url, transport=httpx.MockTransport(handler))
+    return provider
+
+
+def _half_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == 'half-open'
+    return breaker
+
+
+def _prices(request):
+    return httpx.Response(200, json={'prices': [{'crop': 'Wheat', 'date': '2024-01-01', 'price': 2200}]})
+
+
+@pytest.mark.parametrize('body', [{'rows': []}, {'prices': [{'crop': 'Wheat', 'date': 'yesterday', 'price': 1}]}])
+def test_malformed_payload_settles_half_open_trial(body):
+    breaker = _half_open_breaker()
+    provider = _provider(lambda request: httpx.Response(200, json=body), breaker)
+    try:
+        with pytest.raises((KeyError, ValueError)):
+            provider.daily_prices(['Wheat'], 'national', START, END)
+        assert not breaker._trial_in_flight
+        # the failed trial re-opens the breaker; once the timeout passes a new trial is let through
+        assert breaker.allow()
+    finally:
+        provider.close()
+
+
+def test_good_trial_closes_breaker():
+    breaker = _half_open_breaker()
+    provider = _provider(_prices, breaker)
+    try:
+        assert provider.daily_prices(['Wheat'], 'national', START, END) == [('Wheat', START, 2200.0)]
+        assert breaker.state == 'closed'
+    finally:
+        provider.close()
+
+
+def test_client_errors_do_not_trip_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    provider = _provider(lambda request: httpx.Response(404), breaker)
+    try:
+        for _ in range(3):
+            with pytest.raises(httpx.HTTPStatusError):
+                provider.daily_prices(['Wheat'], 'national', START, END)
+        assert breaker.state == 'closed'
+    finally:
+        provider.close()
+
+
+def test_server_errors_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    provider = _provider(lambda request: httpx.Response(503), breaker)
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            provider.daily_prices(['Wheat'], 'national', START, END)
+        with pytest.raises(CircuitOpenError):
+            provider.daily_prices(['Wheat'], 'national', START, END)
+    finally:
+        provider.close()
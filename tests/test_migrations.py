@@ -0,0 +1,47 @@
+from sqlalchemy import inspect
+
+from migrations import _geohash, _recommendation_rollups, apply_migrations, MIGRATIONS
+from models import db, FarmProfile, Recommendation, RecommendationRollup, RecommendationRun
+from services.geohash import encode_geohash
+
+
+def _schema(conn):
+    inspector = inspect(conn)
+    return {table: (sorted(column['name'] for column in inspector.get_columns(table)),
+                    sorted(index['name'] for index in inspector.get_indexes(table)))
+            for table in inspector.get_table_names()}
+
+
+def test_migrations_are_no_ops_on_current_schema(app):
+    with app.app_context():
+        with db.engine.connect() as conn:
+            before = _schema(conn)
+        assert apply_migrations() == [version for version, _, _ in MIGRATIONS]
+        assert apply_migrations() == []
+        with db.engine.connect() as conn:
+            after = _schema(conn)
+    assert after == before
+
+
+def test_frozen_geohash_matches_encoder():
+    for lat, lon in [(10.0, 76.0), (-33.8688, 151.2093), (51.5074, -0.1278), (0.0, 0.0), (89.9, -179.9)]:
+        for precision in (4, 9):
+            assert _geohash(lat, lon, precision) == encode_geohash(lat, lon, precision)
+
+
+def test_rollups_migration_reads_score_from_json(app, admin_id):
+    # before 0007 the score only lived in the recommendations' JSON
+    with app.app_context():
+        farm = FarmProfile(user_id=admin_id, latitude=10.0, longitude=76.0, soil_type='Loam')
+        db.session.add(farm)
+        db.session.flush()
+        run = RecommendationRun(farm_id=farm.id, soil_type='Loam', latitude=10.0, longitude=76.0)
+        db.session.add(run)
+        db.session.flush()
+        db.session.add_all([Recommendation(farm_id=farm.id, run_id=run.id, crop_name='Wheat',
+                                           data={'ai_score': score}) for score in (0.5, 0.75)])
+        db.session.commit()
+        with db.engine.begin() as conn:
+            _recommendation_rollups(conn)
+        rollup = RecommendationRollup.query.one()
+        assert (rollup.crop_name, rollup.recommendation_count, rollup.ai_score_sum) == ('Wheat', 2, 1.25)
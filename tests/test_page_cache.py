@@ -0,0 +1,83 @@
+import datetime
+
+import farm.context
+from models import db, FarmProfile
+from services.market import load_market_prices_csv
+
+
+def _climate(summary):
+    calls = []
+
+    def get_farm_climate_summary(profile):
+        calls.append(profile.id)
+        if summary is None:
+            raise TimeoutError('NASA POWER timed out')
+        return summary
+
+    return calls, get_farm_climate_summary
+
+
+def test_degraded_page_is_not_cached(app, admin_id, admin_client, monkeypatch):
+    with app.app_context():
+        profile = FarmProfile(user_id=admin_id, latitude=10.0, longitude=76.0, soil_type='Loam')
+        db.session.add(profile)
+        db.session.commit()
+        url = f'/farm/profile/{profile.id}/market-analysis'
+
+    # with no failure backoff every request retries, so each one renders degraded
+    monkeypatch.setattr(farm.context, '_backoff', farm.context.FailureBackoff(0))
+    calls, climate_down = _climate(None)
+    monkeypatch.setattr(farm.context, 'get_farm_climate_summary', climate_down)
+    for attempt in range(2):
+        response = admin_client.get(url)
+        assert response.status_code == 200
+        assert response.headers.get('ETag') is None
+    assert len(calls) == 2
+
+    calls, climate_up = _climate({'avg_temp_c': 25.0, 'total_precip_mm': 900.0, 'avg_rel_humidity': 60.0})
+    monkeypatch.setattr(farm.context, 'get_farm_climate_summary', climate_up)
+    first = admin_client.get(url)
+    assert first.status_code == 200 and first.headers.get('ETag')
+    assert admin_client.get(url).status_code == 200
+    assert admin_client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert len(calls) == 1
+
+
+def test_conditional_chart_request_skips_fetches(app, admin_id, admin_client, monkeypatch):
+    with app.app_context():
+        profile = FarmProfile(user_id=admin_id, latitude=10.0, longitude=76.0, soil_type='Loam')
+        db.session.add(profile)
+        db.session.commit()
+        url = f'/farm/api/profile/{profile.id}/market-analysis'
+
+    calls, climate_up = _climate({'avg_temp_c': 25.0, 'total_precip_mm': 900.0, 'avg_rel_humidity': 60.0})
+    monkeypatch.setattr(farm.context, 'get_farm_climate_summary', climate_up)
+    admin_client.get(url)  # fills the market store for today
+    first = admin_client.get(url)
+    assert first.status_code == 200 and first.headers.get('ETag')
+    assert len(calls) == 2
+
+    def unexpected(*args):
+        raise AssertionError('fetched data for a conditional request')
+
+    monkeypatch.setattr(farm.context, 'get_farm_climate_summary', unexpected)
+    monkeypatch.setattr(farm.context, 'fetch_market_prices', unexpected)
+    assert admin_client.get(url, headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+
+def test_market_reload_changes_page_version(app, admin_id, admin_client, tmp_path):
+    admin_client.get('/farm/market-data')  # fills the market store for today
+    first = admin_client.get('/farm/market-data')
+    assert first.status_code == 200 and first.headers.get('ETag')
+    assert admin_client.get('/farm/market-data', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    # a same-day price correction: the day's stats are dropped and recomputed
+    csv_path = tmp_path / 'prices.csv'
+    csv_path.write_text(f'crop,date,price\nWheat,{datetime.date.today().isoformat()},9999\n')
+    with app.app_context():
+        load_market_prices_csv(str(csv_path))
+
+    second = admin_client.get('/farm/market-data', headers={'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 200
+    assert second.headers.get('ETag') not in (None, first.headers['ETag'])
+    assert '9999' in second.get_data(as_text=True)
@@ -0,0 +1,67 @@
+import pytest
+
+from farm.generation import build_recommendation_runs, store_recommendation_runs
+from models import db, FarmProfile, User
+from query_profiles import assert_max_queries
+from services.market import fetch_market_prices
+from tests.conftest import login
+
+
+SOILS = ['Loam', 'Clay', 'Sandy']
+
+
+def _seed(app, admin_id, farms_per_user=4, runs=3):
+    """Farms for the admin and a second user, each with several recommendation runs."""
+    with app.app_context():
+        other = User(username='grower', email='grower@example.com')
+        other.set_password('growerpass')
+        db.session.add(other)
+        db.session.flush()
+        profiles = [FarmProfile(user_id=user_id, latitude=10.0 + i / 10, longitude=76.0 + i / 10,
+                                soil_type=SOILS[i % len(SOILS)], location_name=f'Farm {i}')
+                    for user_id in (admin_id, other.id) for i in range(farms_per_user)]
+        db.session.add_all(profiles)
+        db.session.commit()
+        market = fetch_market_prices(['Wheat', 'Maize', 'Rice', 'Millet', 'Soybean', 'Chickpea'])
+        for run in range(runs):
+            climate = {'avg_temp_c': 20.0 + run * 3, 'total_precip_mm': 600.0 + run * 200,
+                       'avg_rel_humidity': 60.0, 'growing_degree_days': 2000.0 + run * 100}
+            store_recommendation_runs(build_recommendation_runs(
+                [(p.id, p.soil_type, p.latitude, p.longitude, climate) for p in profiles], market))
+        return other.id, [p.id for p in profiles if p.user_id == other.id]
+
+
+# Budgets are per request (the logged-in user's load included) and must not grow with the
+# number of farms, runs or recommendations shown; a lazy load per row would blow them.
+@pytest.fixture
+def seeded(app, admin_id):
+    other_id, other_farm_ids = _seed(app, admin_id)
+    with app.app_context():
+        engine = db.engine
+    # the first request of a process also recovers orphaned recommendation jobs
+    app.test_client().get('/')
+    return engine, login(app, other_id), other_farm_ids
+
+
+@pytest.mark.parametrize('url, budget', [
+    ('/admin/farms', 2),
+    ('/admin/api/farms', 2),
+    ('/admin/recommendations', 2),
+    ('/admin/api/recommendations', 2),
+])
+def test_admin_listings_within_budget(seeded, admin_client, url, budget):
+    engine, _, _ = seeded
+    with assert_max_queries(budget, engine):
+        assert admin_client.get(url).status_code == 200
+
+
+@pytest.mark.parametrize('url, budget', [
+    ('/farm/profiles', 3),
+    ('/farm/profile/{farm_id}', 5),
+    ('/farm/api/profile/{farm_id}/recommendations', 5),
+    ('/farm/api/profile/{farm_id}/history', 4),
+])
+def test_profile_pages_within_budget(seeded, url, budget):
+    engine, client, farm_ids = seeded
+    with assert_max_queries(budget, engine):
+        assert client.get(url.format(farm_id=farm_ids[0])).status_code == 200
@@ -0,0 +1,102 @@
+import pytest
+
+from farm.generation import build_recommendation_runs, store_recommendation_runs
+from migrations import _rebuild_rollups, _recommendations
+from models import db, FarmProfile, RecommendationRollup
+from services.market import fetch_market_prices
+from services.rollups import apply_rollup_deltas, rebuild_rollups
+from tests.conftest import login
+
+
+SUMS = ('recommendation_count', 'ai_score_sum', 'profitability_sum', 'cost_sum', 'demand_sum')
+
+
+def _table():
+    """The rollup table as {key: sums}, rounded so float drift from add/subtract compares equal."""
+    return {(r.region, r.soil_type, r.month, r.crop_name): tuple(round(getattr(r, column), 6) for column in SUMS)
+            for r in RecommendationRollup.query}
+
+
+def _rebuilt():
+    """What rebuild_rollups makes of the current recommendations, leaving the table as it was."""
+    conn = db.session.connection()
+    nested = conn.begin_nested()
+    rebuild_rollups(conn)
+    rebuilt = _table()
+    nested.rollback()
+    return rebuilt
+
+
+def _store(farms, temp=24.0):
+    market = fetch_market_prices(['Wheat', 'Maize', 'Rice', 'Millet', 'Soybean', 'Chickpea'])
+    climate = {'avg_temp_c': temp, 'total_precip_mm': 900.0, 'avg_rel_humidity': 65.0,
+               'growing_degree_days': 2400.0}
+    store_recommendation_runs(build_recommendation_runs(
+        [(f.id, f.soil_type, f.latitude, f.longitude, climate) for f in farms], market))
+
+
+@pytest.fixture
+def farms(app, admin_id):
+    with app.app_context():
+        # two farms share a geohash-4 cell and soil, so their rows land on the same keys
+        profiles = [FarmProfile(user_id=admin_id, latitude=lat, longitude=lon, soil_type=soil)
+                    for lat, lon, soil in [(10.0, 76.0, 'Loam'), (10.01, 76.01, 'Loam'), (28.6, 77.2, 'Clay')]]
+        db.session.add_all(profiles)
+        db.session.commit()
+        return [p.id for p in profiles]
+
+
+def test_insert_adds_rows(app, farms):
+    with app.app_context():
+        _store([db.session.get(FarmProfile, farm_id) for farm_id in farms])
+        table = _table()
+        assert table and table == _rebuilt()
+        # the shared keys hold both farms' rows
+        assert max(sums[0] for sums in table.values()) == 2
+
+
+def test_retire_subtracts_previous_run(app, farms):
+    with app.app_context():
+        profiles = [db.session.get(FarmProfile, farm_id) for farm_id in farms]
+        _store(profiles)
+        before = _table()
+        for temp in (12.0, 32.0):
+            _store(profiles[:1], temp)
+            assert _table() == _rebuilt()
+        # the untouched farms' contribution is unchanged
+        assert sum(sums[0] for sums in _table().values()) == sum(sums[0] for sums in before.values())
+
+
+def test_farm_delete_removes_its_rows(app, admin_id, farms):
+    with app.app_context():
+        profiles = [db.session.get(FarmProfile, farm_id) for farm_id in farms]
+        _store(profiles)
+        _store(profiles, 31.0)
+    client = login(app, admin_id)
+    for farm_id in farms[1:]:
+        assert client.post(f'/farm/profile/{farm_id}/delete').status_code == 302
+    with app.app_context():
+        table = _table()
+        assert table == _rebuilt()
+        assert sum(sums[0] for sums in table.values()) == 5
+
+
+def test_upsert_adds_to_existing_keys_and_drops_empty_ones(app):
+    key = ('t9y0', 'Loam', '2026-01', 'Wheat')
+    other = ('t9y0', 'Loam', '2026-01', 'Rice')
+    with app.app_context():
+        conn = db.session.connection()
+        apply_rollup_deltas(conn, {key: [2, 1.5, 100.0, 40.0, 1.2], other: [1, 0.5, 10.0, 4.0, 0.6]})
+        apply_rollup_deltas(conn, {key: [1, 0.5, 50.0, 20.0, 0.6], other: [-1, -0.5, -10.0, -4.0, -0.6]})
+        assert _table() == {key: (3, 2.0, 150.0, 60.0, 1.8)}
+        assert RecommendationRollup.query.count() == 1
+
+
+def test_migration_rebuild_matches_rebuild_rollups(app, farms):
+    with app.app_context():
+        profiles = [db.session.get(FarmProfile, farm_id) for farm_id in farms]
+        _store(profiles)
+        _store(profiles[1:], 31.0)
+        expected = _rebuilt()
+        _rebuild_rollups(db.session.connection(), _recommendations.c.ai_score)
+        assert _table() == expected
@@ -0,0 +1,23 @@
+from models import db, FarmProfile
+
+
+def _farms(app, admin_id, count=3):
+    with app.app_context():
+        db.session.add_all([FarmProfile(user_id=admin_id, latitude=10.0 + i / 100, longitude=76.0,
+                                        soil_type='Loam') for i in range(count)])
+        db.session.commit()
+
+
+def test_near_rejects_k_below_one(app, admin_id, admin_client):
+    _farms(app, admin_id)
+    for k in (0, -1):
+        response = admin_client.get(f'/admin/api/farms/near?lat=10&lon=76&k={k}')
+        assert response.status_code == 400
+        assert 'k must be at least 1' in response.get_json()['error']
+
+
+def test_near_returns_k_nearest(app, admin_id, admin_client):
+    _farms(app, admin_id)
+    items = admin_client.get('/admin/api/farms/near?lat=10&lon=76&k=2').get_json()['items']
+    assert [item['distance_km'] for item in items] == sorted(item['distance_km'] for item in items)
+    assert len(items) == 2
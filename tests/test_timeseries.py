@@ -0,0 +1,79 @@
+import base64
+import datetime
+
+import numpy as np
+import pytest
+
+from services.timeseries import columnar_series, lttb_indices, minmax_indices
+
+
+def _series(days, start=datetime.date(2026, 1, 1)):
+    return [{'date': (start + datetime.timedelta(days=day)).isoformat(), 'price': 2000 + 50 * np.sin(day / 5) + day}
+            for day in days]
+
+
+def _decode(data, dtype):
+    return np.frombuffer(base64.b64decode(data), dtype=dtype)
+
+
+@pytest.mark.parametrize('points', [2, 3, 10, 50])
+def test_lttb_keeps_endpoints_and_point_count(points):
+    x = np.arange(200, dtype=float)
+    y = np.sin(x / 7) * 100
+    keep = lttb_indices(x, y, points)
+    assert len(keep) == points
+    assert keep[0] == 0 and keep[-1] == 199
+    assert (np.diff(keep) > 0).all()
+
+
+def test_lttb_keeps_spike():
+    y = np.zeros(100)
+    y[37] = 500.0
+    assert 37 in lttb_indices(np.arange(100, dtype=float), y, 10)
+
+
+@pytest.mark.parametrize('points', [4, 10, 51])
+def test_minmax_keeps_endpoints_and_extremes(points):
+    y = np.cos(np.arange(300) / 9) * 100
+    keep = minmax_indices(y, points)
+    assert len(keep) <= points
+    assert keep[0] == 0 and keep[-1] == 299
+    assert int(np.argmax(y)) in keep and int(np.argmin(y)) in keep
+
+
+def test_short_series_kept_whole():
+    assert lttb_indices(np.arange(5.0), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+    assert minmax_indices(np.arange(5.0), 5).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_base64_round_trip():
+    series = _series(range(31))
+    packed = columnar_series(series, encoding='base64')
+    assert (packed['start'], packed['count'], 'offsets' in packed) == ('2026-01-01', 31, False)
+    np.testing.assert_allclose(_decode(packed['prices'], '<f4'), [p['price'] for p in series], rtol=1e-6)
+    assert columnar_series(series)['prices'] == [round(p['price'], 2) for p in series]
+
+
+def test_gaps_carry_offsets():
+    days = [0, 1, 2, 5, 6, 10]
+    packed = columnar_series(_series(days), encoding='base64')
+    assert _decode(packed['offsets'], '<i4').tolist() == days
+    assert columnar_series(_series(days))['offsets'] == days
+
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_downsampled_series_respects_points(method):
+    series = _series(range(365))
+    packed = columnar_series(series, points=40, method=method, encoding='base64')
+    offsets = _decode(packed['offsets'], '<i4')
+    prices = _decode(packed['prices'], '<f4')
+    assert packed['count'] == len(prices) == len(offsets) <= 40
+    assert offsets[0] == 0 and offsets[-1] == 364
+    np.testing.assert_allclose(prices, [series[day]['price'] for day in offsets], rtol=1e-6)
+
+
+def test_rejects_unknown_options():
+    with pytest.raises(ValueError):
+        columnar_series(_series(range(3)), encoding='csv')
+    with pytest.raises(ValueError):
+        columnar_series(_series(range(3)), method='average')